@@ -1,60 +1,32 @@
 import streamlit as st
-from .database import AuthDB
+from .database import get_auth_db
 from .session import SessionManager
-import psycopg2
-from psycopg2.extras import DictCursor
-from typing import List, Dict
-from passlib.context import CryptContext
 import os
+import instrumentation
+import query_log
 
-# Password hashing configuration
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# The admin account only needs to be synced with the environment once per process
+_admin_initialized = False
 
 def create_initial_admin():
     """Create or update admin user with environment credentials"""
-    auth_db = AuthDB()
-
-    try:
-        with psycopg2.connect(auth_db.conn_string) as conn:
-            with conn.cursor() as cur:
-                # Get admin credentials from environment variables
-                admin_username = os.environ.get('ADMIN_USERNAME')
-                admin_password = os.environ.get('ADMIN_PASSWORD')
-                admin_email = os.environ.get('ADMIN_EMAIL')
-
-                if not all([admin_username, admin_password, admin_email]):
-                    st.error("Admin credentials not found in environment variables")
-                    return
-
-                # Get admin role ID
-                cur.execute("SELECT id FROM roles WHERE name = 'admin'")
-                admin_role_id = cur.fetchone()[0]
-
-                # Check if admin user exists
-                cur.execute("SELECT id FROM users WHERE role_id = %s", (admin_role_id,))
-                admin_exists = cur.fetchone()
-
-                # Create password hash
-                password_hash = pwd_context.hash(admin_password)
-
-                if admin_exists:
-                    # Update existing admin
-                    cur.execute("""
-                        UPDATE users 
-                        SET username = %s, password_hash = %s, email = %s, status = 'active'
-                        WHERE id = %s
-                    """, (admin_username, password_hash, admin_email, admin_exists[0]))
-                else:
-                    # Create new admin user
-                    cur.execute("""
-                        INSERT INTO users (username, password_hash, email, role_id, status)
-                        VALUES (%s, %s, %s, %s, 'active')
-                    """, (admin_username, password_hash, admin_email, admin_role_id))
+    global _admin_initialized
+    if _admin_initialized:
+        return
 
-                conn.commit()
+    # Get admin credentials from environment variables
+    admin_username = os.environ.get('ADMIN_USERNAME')
+    admin_password = os.environ.get('ADMIN_PASSWORD')
+    admin_email = os.environ.get('ADMIN_EMAIL')
 
-    except Exception as e:
-        st.error(f"Error setting up admin user: {str(e)}")
+    if not all([admin_username, admin_password, admin_email]):
+        st.error("Admin credentials not found in environment variables")
+        return
+
+    if get_auth_db().sync_admin(admin_username, admin_password, admin_email):
+        _admin_initialized = True
+    else:
+        st.error("Error setting up admin user")
 
 def show_user_management():
     """Show user management interface for admins"""
@@ -66,15 +38,18 @@ def show_user_management():
 
     st.title("Brugeradministration")
 
-    # Initialize AuthDB
-    auth_db = AuthDB()
+    # Initialize the account store
+    auth_db = get_auth_db()
 
     # Tabs for different admin functions
-    tab1, tab2, tab3 = st.tabs(["Brugere", "Godkendelser", "Brugeradgang"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["Brugere", "Godkendelser", "Brugeradgang", "Sletninger", "Ydelse"])
 
     with tab1:
         # Get list of all active users
-        users = get_all_users(auth_db)
+        users = auth_db.get_active_users()
+        if users is None:
+            st.error("Kunne ikke hente brugerliste")
+            users = []
 
         # Show existing users in a table
         if users:
@@ -155,7 +130,7 @@ def show_user_management():
                         )
 
                         if st.form_submit_button("Opdater"):
-                            if update_user(auth_db, selected_user, new_email, new_password, role_map[new_role]):
+                            if auth_db.update_user(selected_user, new_email, new_password, role_map[new_role]):
                                 st.success("Bruger opdateret!")
                                 st.rerun()
                             else:
@@ -172,7 +147,7 @@ def show_user_management():
                             st.warning(f"Er du sikker på, at du vil slette brugeren '{selected_user}'?")
                         with confirm_col2:
                             if st.button("Ja, slet bruger"):
-                                if delete_user(auth_db, selected_user):
+                                if auth_db.delete_user(selected_user):
                                     st.success("Bruger slettet!")
                                     st.rerun()
                                 else:
@@ -246,61 +221,93 @@ def show_user_management():
                 del st.session_state.impersonated_user
                 st.rerun()
 
-def get_all_users(auth_db: AuthDB) -> List[Dict]:
-    """Get all users with their roles"""
-    try:
-        with psycopg2.connect(auth_db.conn_string) as conn:
-            with conn.cursor(cursor_factory=DictCursor) as cur:
-                cur.execute("""
-                    SELECT u.username, u.email, u.created_at, r.name as role_name
-                    FROM users u
-                    JOIN roles r ON u.role_id = r.id
-                    WHERE u.status = 'active'
-                    ORDER BY u.created_at DESC
-                """)
-                return [dict(row) for row in cur.fetchall()]
-    except psycopg2.Error:
-        st.error("Kunne ikke hente brugerliste")
-        return []
-
-def update_user(auth_db: AuthDB, username: str, email: str, password: str, role: str) -> bool:
-    """Update user details"""
-    try:
-        with psycopg2.connect(auth_db.conn_string) as conn:
-            with conn.cursor() as cur:
-                # Get role ID
-                cur.execute("SELECT id FROM roles WHERE name = %s", (role,))
-                role_id = cur.fetchone()
-                if not role_id:
-                    return False
-
-                # Update user
-                if password:
-                    password_hash = pwd_context.hash(password)
-                    cur.execute("""
-                        UPDATE users 
-                        SET email = %s, password_hash = %s, role_id = %s
-                        WHERE username = %s
-                    """, (email, password_hash, role_id[0], username))
-                else:
-                    cur.execute("""
-                        UPDATE users 
-                        SET email = %s, role_id = %s
-                        WHERE username = %s
-                    """, (email, role_id[0], username))
-
-                conn.commit()
-                return True
-    except psycopg2.Error:
-        return False
-
-def delete_user(auth_db: AuthDB, username: str) -> bool:
-    """Delete a user"""
-    try:
-        with psycopg2.connect(auth_db.conn_string) as conn:
-            with conn.cursor() as cur:
-                cur.execute("DELETE FROM users WHERE username = %s AND username != 'admin'", (username,))
-                conn.commit()
-                return True
-    except psycopg2.Error:
-        return False
\ No newline at end of file
+    with tab4:
+        show_purge_status()
+
+    with tab5:
+        show_performance()
+
+def show_purge_status():
+    """Show progress of the background removal of deleted players"""
+    from data_manager import DataManager
+    status = DataManager().get_purge_status()
+
+    st.subheader("Slettede spillere")
+    if status is None:
+        st.info("Med den indbyggede database slettes spillernes kampdata med det samme")
+        return
+    col1, col2 = st.columns(2)
+    col1.metric("Kamprækker fjernet", status['rows_deleted'])
+    col2.metric("Spillere fjernet helt", status['players_purged'])
+
+    if status['pending']:
+        st.dataframe(
+            [
+                {
+                    "Spiller": row['name'],
+                    "Slettet": row['deleted_at'].strftime('%Y-%m-%d %H:%M'),
+                    "Kamprækker tilbage": row['remaining_rows']
+                }
+                for row in status['pending']
+            ],
+            use_container_width=True
+        )
+    else:
+        st.info("Ingen sletninger i gang")
+
+    if not status['running']:
+        st.warning("Oprydningsjobbet kører ikke")
+    if status['last_error']:
+        st.caption(f"Seneste fejl: {status['last_error']}")
+    if st.button("Opdater", key="refresh_purge_status"):
+        st.rerun()
+
+def show_performance():
+    """Show call counts and latency percentiles of the instrumented code in this process"""
+    st.subheader("Svartider")
+    st.caption("Målt i denne proces siden start eller seneste nulstilling. Tider i millisekunder.")
+
+    rows = instrumentation.snapshot()
+    if rows:
+        st.dataframe(
+            [
+                {
+                    "Måling": row['name'],
+                    "Kald": row['count'],
+                    "p50": round(row['p50_ms'], 1),
+                    "p95": round(row['p95_ms'], 1),
+                    "p99": round(row['p99_ms'], 1),
+                    "Maks": round(row['max_ms'], 1),
+                    "Total": round(row['total_ms'], 1)
+                }
+                for row in rows
+            ],
+            use_container_width=True
+        )
+    else:
+        st.info("Ingen målinger endnu")
+
+    if st.button("Nulstil målinger", key="reset_timings"):
+        instrumentation.reset()
+        st.rerun()
+
+    st.subheader("Langsomme forespørgsler")
+    st.caption(f"Forespørgsler over {query_log.SLOW_QUERY_MS:g} ms. Planen gemmes første gang en forespørgsel ses.")
+    slow_queries = query_log.entries()
+    if slow_queries:
+        for entry in reversed(slow_queries):
+            status = " - afbrudt" if entry.get('failed') else ""
+            with st.expander(f"{entry['duration_ms']:.0f} ms{status} - {entry['caller'] or 'ukendt'} - {entry['time']}"):
+                st.code(entry['sql'], language="sql")
+                st.write(f"Parametre: {entry['params']}")
+                plan = entry['plan'] or query_log.get_plan(entry['fingerprint'])
+                if plan:
+                    st.code(plan)
+        st.download_button(
+            "Eksportér (JSON lines)",
+            query_log.to_jsonl(),
+            file_name="slow_queries.jsonl",
+            mime="application/jsonl"
+        )
+    else:
+        st.info("Ingen langsomme forespørgsler registreret")
@@ -1,11 +1,18 @@
 import os
+import time
 import psycopg2
+from abc import ABC, abstractmethod
 from psycopg2.extras import DictCursor
 from datetime import datetime, timedelta
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from typing import Optional, Dict, List
 import streamlit as st
+import db_pool
+import metrics
+from instrumentation import instrument_class
+from cache_events import notify
+from storage import backend_name
 
 # Password hashing configuration
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -15,14 +22,97 @@ SECRET_KEY = os.environ.get("SECRET_KEY", "your-secret-key")  # In production, u
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-class AuthDB:
+@instrument_class
+class AuthBackend(ABC):
+    """Users, roles and login tokens; subclasses store the accounts in a database.
+
+    Lookups return None or [] and writes return False on database errors.
+    """
+
+    @abstractmethod
+    def create_user(self, username: str, password: str, email: str, role: str) -> bool:
+        """Create a new user with active status"""
+
+    @abstractmethod
+    def register_user(self, username: str, password: str, email: str, role: str) -> bool:
+        """Register a new user with pending status"""
+
+    @abstractmethod
+    def get_pending_users(self) -> List[Dict]:
+        """Get list of users pending approval"""
+
+    @abstractmethod
+    def get_active_users(self) -> Optional[List[Dict]]:
+        """Get all active users with their roles, newest first; None on error"""
+
+    @abstractmethod
+    def approve_user(self, username: str) -> bool:
+        """Approve a pending user"""
+
+    @abstractmethod
+    def reject_user(self, username: str) -> bool:
+        """Reject a pending user"""
+
+    @abstractmethod
+    def update_user(self, username: str, email: str, password: str, role: str) -> bool:
+        """Update a user's email, role and (when given) password"""
+
+    @abstractmethod
+    def delete_user(self, username: str) -> bool:
+        """Delete a user (never the admin account)"""
+
+    @abstractmethod
+    def sync_admin(self, username: str, password: str, email: str) -> bool:
+        """Create the admin account, or update it to the given credentials"""
+
+    @abstractmethod
+    def verify_user(self, username: str, password: str) -> Optional[Dict]:
+        """Verify user credentials and return user info if valid"""
+
+    @abstractmethod
+    def get_user_role(self, username: str) -> Optional[str]:
+        """Get user's role"""
+
+    def _check_password(self, user: Optional[Dict], password: str) -> Optional[Dict]:
+        """Return the user if password matches their hash, counting the login attempt"""
+        verified = False
+        if user:
+            start = time.perf_counter()
+            verified = pwd_context.verify(password, user['password_hash'])
+            metrics.PASSWORD_HASH_SECONDS.observe(time.perf_counter() - start)
+        metrics.LOGINS.inc(result='success' if verified else 'failure')
+        return user if verified else None
+
+    def create_access_token(self, data: dict) -> str:
+        """Create JWT access token"""
+        to_encode = data.copy()
+        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        to_encode.update({"exp": expire})
+        return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+    def verify_token(self, token: str) -> Optional[Dict]:
+        """Verify JWT token and return payload if valid"""
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            return payload
+        except JWTError:
+            return None
+
+@instrument_class
+class AuthDB(AuthBackend):
+    """Accounts in Postgres"""
+    # Schema setup runs once per process rather than on every AuthDB()
+    _tables_initialized = False
+
     def __init__(self):
         self.conn_string = os.environ['DATABASE_URL']
-        self._initialize_tables()
+        if not AuthDB._tables_initialized:
+            self._initialize_tables()
+            AuthDB._tables_initialized = True
 
     def _initialize_tables(self):
         """Create necessary tables if they don't exist"""
-        with psycopg2.connect(self.conn_string) as conn:
+        with db_pool.connection(self.conn_string) as conn:
             with conn.cursor() as cur:
                 # Create roles table
                 cur.execute("""
@@ -61,7 +151,7 @@ class AuthDB:
         try:
             password_hash = pwd_context.hash(password)
 
-            with psycopg2.connect(self.conn_string) as conn:
+            with db_pool.connection(self.conn_string) as conn:
                 with conn.cursor() as cur:
                     # Get role ID
                     cur.execute("SELECT id FROM roles WHERE name = %s", (role,))
@@ -74,6 +164,7 @@ class AuthDB:
                         INSERT INTO users (username, password_hash, email, role_id, status)
                         VALUES (%s, %s, %s, %s, 'active')
                     """, (username, password_hash, email, role_id[0]))
+                    notify(cur, 'users', 'insert', username)
 
                     conn.commit()
                     return True
@@ -86,7 +177,7 @@ class AuthDB:
         try:
             password_hash = pwd_context.hash(password)
 
-            with psycopg2.connect(self.conn_string) as conn:
+            with db_pool.connection(self.conn_string) as conn:
                 with conn.cursor() as cur:
                     # Get role ID
                     cur.execute("SELECT id FROM roles WHERE name = %s", (role,))
@@ -99,6 +190,7 @@ class AuthDB:
                         INSERT INTO users (username, password_hash, email, role_id, status)
                         VALUES (%s, %s, %s, %s, 'pending')
                     """, (username, password_hash, email, role_id[0]))
+                    notify(cur, 'users', 'insert', username)
 
                     conn.commit()
                     return True
@@ -109,7 +201,7 @@ class AuthDB:
     def get_pending_users(self) -> List[Dict]:
         """Get list of users pending approval"""
         try:
-            with psycopg2.connect(self.conn_string) as conn:
+            with db_pool.connection(self.conn_string) as conn:
                 with conn.cursor(cursor_factory=DictCursor) as cur:
                     cur.execute("""
                         SELECT u.username, u.email, u.created_at, r.name as role_name
@@ -122,16 +214,33 @@ class AuthDB:
         except psycopg2.Error:
             return []
 
+    def get_active_users(self) -> Optional[List[Dict]]:
+        """Get all active users with their roles, newest first; None on error"""
+        try:
+            with db_pool.connection(self.conn_string) as conn:
+                with conn.cursor(cursor_factory=DictCursor) as cur:
+                    cur.execute("""
+                        SELECT u.username, u.email, u.created_at, r.name as role_name
+                        FROM users u
+                        JOIN roles r ON u.role_id = r.id
+                        WHERE u.status = 'active'
+                        ORDER BY u.created_at DESC
+                    """)
+                    return [dict(row) for row in cur.fetchall()]
+        except psycopg2.Error:
+            return None
+
     def approve_user(self, username: str) -> bool:
         """Approve a pending user"""
         try:
-            with psycopg2.connect(self.conn_string) as conn:
+            with db_pool.connection(self.conn_string) as conn:
                 with conn.cursor() as cur:
                     cur.execute("""
                         UPDATE users
                         SET status = 'active'
                         WHERE username = %s AND status = 'pending'
                     """, (username,))
+                    notify(cur, 'users', 'update', username)
                     conn.commit()
                     return True
         except psycopg2.Error:
@@ -140,21 +249,103 @@ class AuthDB:
     def reject_user(self, username: str) -> bool:
         """Reject a pending user"""
         try:
-            with psycopg2.connect(self.conn_string) as conn:
+            with db_pool.connection(self.conn_string) as conn:
                 with conn.cursor() as cur:
                     cur.execute("""
                         DELETE FROM users
                         WHERE username = %s AND status = 'pending'
                     """, (username,))
+                    notify(cur, 'users', 'delete', username)
                     conn.commit()
                     return True
         except psycopg2.Error:
             return False
 
+    def update_user(self, username: str, email: str, password: str, role: str) -> bool:
+        """Update a user's email, role and (when given) password"""
+        try:
+            with db_pool.connection(self.conn_string) as conn:
+                with conn.cursor() as cur:
+                    # Get role ID
+                    cur.execute("SELECT id FROM roles WHERE name = %s", (role,))
+                    role_id = cur.fetchone()
+                    if not role_id:
+                        return False
+
+                    # Update user
+                    if password:
+                        password_hash = pwd_context.hash(password)
+                        cur.execute("""
+                            UPDATE users
+                            SET email = %s, password_hash = %s, role_id = %s
+                            WHERE username = %s
+                        """, (email, password_hash, role_id[0], username))
+                    else:
+                        cur.execute("""
+                            UPDATE users
+                            SET email = %s, role_id = %s
+                            WHERE username = %s
+                        """, (email, role_id[0], username))
+                    notify(cur, 'users', 'update', username)
+
+                    conn.commit()
+                    return True
+        except psycopg2.Error:
+            return False
+
+    def delete_user(self, username: str) -> bool:
+        """Delete a user (never the admin account)"""
+        try:
+            with db_pool.connection(self.conn_string) as conn:
+                with conn.cursor() as cur:
+                    cur.execute("DELETE FROM users WHERE username = %s AND username != 'admin'", (username,))
+                    notify(cur, 'users', 'delete', username)
+                    conn.commit()
+                    return True
+        except psycopg2.Error:
+            return False
+
+    def sync_admin(self, username: str, password: str, email: str) -> bool:
+        """Create the admin account, or update it to the given credentials"""
+        try:
+            # Create password hash
+            password_hash = pwd_context.hash(password)
+
+            with db_pool.connection(self.conn_string) as conn:
+                with conn.cursor() as cur:
+                    # Get admin role ID
+                    cur.execute("SELECT id FROM roles WHERE name = 'admin'")
+                    admin_role_id = cur.fetchone()[0]
+
+                    # Check if admin user exists
+                    cur.execute("SELECT id FROM users WHERE role_id = %s", (admin_role_id,))
+                    admin_exists = cur.fetchone()
+
+                    if admin_exists:
+                        # Update existing admin
+                        cur.execute("""
+                            UPDATE users
+                            SET username = %s, password_hash = %s, email = %s, status = 'active'
+                            WHERE id = %s
+                        """, (username, password_hash, email, admin_exists[0]))
+                    else:
+                        # Create new admin user
+                        cur.execute("""
+                            INSERT INTO users (username, password_hash, email, role_id, status)
+                            VALUES (%s, %s, %s, %s, 'active')
+                        """, (username, password_hash, email, admin_role_id))
+                    notify(cur, 'users', 'update', username)
+
+                    conn.commit()
+                    return True
+        except psycopg2.Error as e:
+            print(f"Error setting up admin user: {e}")
+            return False
+
     def verify_user(self, username: str, password: str) -> Optional[Dict]:
         """Verify user credentials and return user info if valid"""
         try:
-            with psycopg2.connect(self.conn_string) as conn:
+            with db_pool.connection(self.conn_string) as conn:
                 with conn.cursor(cursor_factory=DictCursor) as cur:
                     cur.execute("""
                         SELECT u.*, r.name as role_name
@@ -163,33 +354,16 @@ class AuthDB:
                         WHERE u.username = %s AND u.status = 'active'
                     """, (username,))
                     user = cur.fetchone()
-
-                    if user and pwd_context.verify(password, user['password_hash']):
-                        return dict(user)
-                    return None
+            return self._check_password(dict(user) if user else None, password)
 
         except psycopg2.Error:
-            return None
-
-    def create_access_token(self, data: dict) -> str:
-        """Create JWT access token"""
-        to_encode = data.copy()
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        to_encode.update({"exp": expire})
-        return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-
-    def verify_token(self, token: str) -> Optional[Dict]:
-        """Verify JWT token and return payload if valid"""
-        try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-            return payload
-        except JWTError:
+            metrics.LOGINS.inc(result='error')
             return None
 
     def get_user_role(self, username: str) -> Optional[str]:
         """Get user's role"""
         try:
-            with psycopg2.connect(self.conn_string) as conn:
+            with db_pool.connection(self.conn_string) as conn:
                 with conn.cursor() as cur:
                     cur.execute("""
                         SELECT r.name
@@ -200,4 +374,11 @@ class AuthDB:
                     role = cur.fetchone()
                     return role[0] if role else None
         except psycopg2.Error:
-            return None
\ No newline at end of file
+            return None
+
+def get_auth_db() -> AuthBackend:
+    """The AuthBackend selected by STORAGE_BACKEND"""
+    if backend_name() == 'sqlite':
+        from .sqlite_database import SQLiteAuthDB
+        return SQLiteAuthDB()
+    return AuthDB()
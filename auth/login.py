@@ -1,6 +1,6 @@
 import streamlit as st
 from auth.session import SessionManager
-from auth.database import AuthDB
+from auth.database import get_auth_db
 
 def show_login_page():
     """Show login page with registration option"""
@@ -75,7 +75,7 @@ def show_login_page():
                 }
 
                 if st.form_submit_button("Registrer"):
-                    auth_db = AuthDB()
+                    auth_db = get_auth_db()
                     if auth_db.register_user(new_username, new_password, new_email, role_map[role]):
                         st.success("Registrering gennemført! Vent venligst på administrator godkendelse.")
                     else:
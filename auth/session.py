@@ -1,10 +1,10 @@
 import streamlit as st
 from typing import Optional
-from .database import AuthDB
+from .database import get_auth_db
 
 class SessionManager:
     def __init__(self):
-        self.auth_db = AuthDB()
+        self.auth_db = get_auth_db()
 
     def login_user(self, username: str, password: str) -> bool:
         """Log in a user and store their session"""
@@ -0,0 +1,197 @@
+import sqlite3
+from typing import Optional, Dict, List
+import metrics
+from instrumentation import instrument_class
+from storage import sqlite_connection, sqlite_path
+from .database import AuthBackend, pwd_context
+
+ROLES = ['admin', 'coach', 'assistant_coach', 'observer']
+
+@instrument_class
+class SQLiteAuthDB(AuthBackend):
+    """Accounts in the embedded SQLite database (STORAGE_BACKEND=sqlite)"""
+    # Database files whose schema exists, so setup runs once per file and process
+    _initialized_paths = set()
+
+    def __init__(self, path=None):
+        self.path = path or sqlite_path()
+        if self.path not in SQLiteAuthDB._initialized_paths:
+            self._initialize_tables()
+            SQLiteAuthDB._initialized_paths.add(self.path)
+
+    def _initialize_tables(self):
+        """Create necessary tables if they don't exist"""
+        with sqlite_connection(self.path) as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS roles (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT UNIQUE NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY,
+                    username TEXT UNIQUE NOT NULL,
+                    password_hash TEXT NOT NULL,
+                    email TEXT UNIQUE NOT NULL,
+                    role_id INTEGER REFERENCES roles(id),
+                    status TEXT DEFAULT 'pending' CHECK (status IN ('pending', 'active', 'inactive')),
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+            """)
+            conn.executemany(
+                "INSERT INTO roles (name) VALUES (?) ON CONFLICT (name) DO NOTHING",
+                [(role,) for role in ROLES]
+            )
+
+    def _add_user(self, username: str, password: str, email: str, role: str, status: str) -> bool:
+        """Insert a user with the given status; False if the role is unknown or the user exists"""
+        try:
+            password_hash = pwd_context.hash(password)
+            with sqlite_connection(self.path) as conn:
+                role_id = conn.execute("SELECT id FROM roles WHERE name = ?", (role,)).fetchone()
+                if not role_id:
+                    return False
+                conn.execute("""
+                    INSERT INTO users (username, password_hash, email, role_id, status)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (username, password_hash, email, role_id[0], status))
+                return True
+        except sqlite3.Error:
+            return False
+
+    def create_user(self, username: str, password: str, email: str, role: str) -> bool:
+        """Create a new user with active status"""
+        return self._add_user(username, password, email, role, 'active')
+
+    def register_user(self, username: str, password: str, email: str, role: str) -> bool:
+        """Register a new user with pending status"""
+        return self._add_user(username, password, email, role, 'pending')
+
+    def _list_users(self, status: str) -> Optional[List[Dict]]:
+        """Users with the given status and their roles, newest first; None on error"""
+        try:
+            with sqlite_connection(self.path) as conn:
+                conn.row_factory = sqlite3.Row
+                rows = conn.execute("""
+                    SELECT u.username, u.email, u.created_at, r.name as role_name
+                    FROM users u
+                    JOIN roles r ON u.role_id = r.id
+                    WHERE u.status = ?
+                    ORDER BY u.created_at DESC, u.id DESC
+                """, (status,)).fetchall()
+                return [dict(row) for row in rows]
+        except sqlite3.Error:
+            return None
+
+    def get_pending_users(self) -> List[Dict]:
+        """Get list of users pending approval"""
+        return self._list_users('pending') or []
+
+    def get_active_users(self) -> Optional[List[Dict]]:
+        """Get all active users with their roles, newest first; None on error"""
+        return self._list_users('active')
+
+    def approve_user(self, username: str) -> bool:
+        """Approve a pending user"""
+        try:
+            with sqlite_connection(self.path) as conn:
+                conn.execute(
+                    "UPDATE users SET status = 'active' WHERE username = ? AND status = 'pending'",
+                    (username,)
+                )
+                return True
+        except sqlite3.Error:
+            return False
+
+    def reject_user(self, username: str) -> bool:
+        """Reject a pending user"""
+        try:
+            with sqlite_connection(self.path) as conn:
+                conn.execute("DELETE FROM users WHERE username = ? AND status = 'pending'", (username,))
+                return True
+        except sqlite3.Error:
+            return False
+
+    def update_user(self, username: str, email: str, password: str, role: str) -> bool:
+        """Update a user's email, role and (when given) password"""
+        try:
+            with sqlite_connection(self.path) as conn:
+                role_id = conn.execute("SELECT id FROM roles WHERE name = ?", (role,)).fetchone()
+                if not role_id:
+                    return False
+                if password:
+                    conn.execute("""
+                        UPDATE users SET email = ?, password_hash = ?, role_id = ?
+                        WHERE username = ?
+                    """, (email, pwd_context.hash(password), role_id[0], username))
+                else:
+                    conn.execute(
+                        "UPDATE users SET email = ?, role_id = ? WHERE username = ?",
+                        (email, role_id[0], username)
+                    )
+                return True
+        except sqlite3.Error:
+            return False
+
+    def delete_user(self, username: str) -> bool:
+        """Delete a user (never the admin account)"""
+        try:
+            with sqlite_connection(self.path) as conn:
+                conn.execute("DELETE FROM users WHERE username = ? AND username != 'admin'", (username,))
+                return True
+        except sqlite3.Error:
+            return False
+
+    def sync_admin(self, username: str, password: str, email: str) -> bool:
+        """Create the admin account, or update it to the given credentials"""
+        try:
+            password_hash = pwd_context.hash(password)
+            with sqlite_connection(self.path) as conn:
+                admin_role_id = conn.execute("SELECT id FROM roles WHERE name = 'admin'").fetchone()[0]
+                admin_exists = conn.execute(
+                    "SELECT id FROM users WHERE role_id = ?", (admin_role_id,)
+                ).fetchone()
+                if admin_exists:
+                    conn.execute("""
+                        UPDATE users
+                        SET username = ?, password_hash = ?, email = ?, status = 'active'
+                        WHERE id = ?
+                    """, (username, password_hash, email, admin_exists[0]))
+                else:
+                    conn.execute("""
+                        INSERT INTO users (username, password_hash, email, role_id, status)
+                        VALUES (?, ?, ?, ?, 'active')
+                    """, (username, password_hash, email, admin_role_id))
+                return True
+        except sqlite3.Error as e:
+            print(f"Error setting up admin user: {e}")
+            return False
+
+    def verify_user(self, username: str, password: str) -> Optional[Dict]:
+        """Verify user credentials and return user info if valid"""
+        try:
+            with sqlite_connection(self.path) as conn:
+                conn.row_factory = sqlite3.Row
+                user = conn.execute("""
+                    SELECT u.*, r.name as role_name
+                    FROM users u
+                    JOIN roles r ON u.role_id = r.id
+                    WHERE u.username = ? AND u.status = 'active'
+                """, (username,)).fetchone()
+            return self._check_password(dict(user) if user else None, password)
+        except sqlite3.Error:
+            metrics.LOGINS.inc(result='error')
+            return None
+
+    def get_user_role(self, username: str) -> Optional[str]:
+        """Get user's role"""
+        try:
+            with sqlite_connection(self.path) as conn:
+                role = conn.execute("""
+                    SELECT r.name
+                    FROM users u
+                    JOIN roles r ON u.role_id = r.id
+                    WHERE u.username = ?
+                """, (username,)).fetchone()
+                return role[0] if role else None
+        except sqlite3.Error:
+            return None
@@ -0,0 +1,130 @@
+import json
+import os
+import select
+import socket
+import threading
+import time
+import uuid
+
+import psycopg2
+import psycopg2.extensions
+
+# Postgres channel carrying cache invalidation events between instances
+CHANNEL = 'stt_cache'
+
+# Identifies events emitted by this process so the listener can skip them
+ORIGIN = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+_subscribers = {}
+_subscribers_lock = threading.Lock()
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def notify(cur, entity, action, key=None):
+    """Emit a cache invalidation event from within the writer's transaction.
+
+    The event is delivered to listeners only if the transaction commits. Its
+    data version is the writing transaction's id, which increases with every
+    write.
+    """
+    cur.execute("SELECT txid_current()")
+    version = cur.fetchone()[0]
+    payload = json.dumps({
+        'entity': entity,
+        'action': action,
+        'key': key,
+        'version': version,
+        'origin': ORIGIN
+    }, ensure_ascii=False)
+    cur.execute("SELECT pg_notify(%s, %s)", (CHANNEL, payload))
+    return version
+
+
+def subscribe(entity, callback):
+    """Call callback(event) for every event about entity ('*' for all)"""
+    with _subscribers_lock:
+        _subscribers.setdefault(entity, []).append(callback)
+
+
+def dispatch(event):
+    """Deliver an event to the subscribers of its entity"""
+    with _subscribers_lock:
+        callbacks = list(_subscribers.get(event['entity'], [])) + list(_subscribers.get('*', []))
+    for callback in callbacks:
+        try:
+            callback(event)
+        except Exception as e:
+            print(f"Error handling cache event {event}: {e}")
+
+
+class CacheEventListener(threading.Thread):
+    """Background thread that LISTENs for cache events and dispatches them"""
+
+    def __init__(self, conn_string, poll_interval=5.0, retry_interval=5.0):
+        super().__init__(name="cache-event-listener", daemon=True)
+        self.conn_string = conn_string
+        self.poll_interval = poll_interval
+        self.retry_interval = retry_interval
+        self._stop_event = threading.Event()
+        self._connected_before = False
+
+    def stop(self):
+        """Ask the listener to exit after the current poll"""
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self._listen()
+            except psycopg2.Error as e:
+                print(f"Cache event listener disconnected: {e}")
+                self._stop_event.wait(self.retry_interval)
+
+    def _listen(self):
+        conn = psycopg2.connect(self.conn_string)
+        try:
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {CHANNEL}")
+
+            # Events may have been missed while disconnected
+            if self._connected_before:
+                dispatch({'entity': 'all', 'action': 'reconnect', 'key': None, 'version': None, 'origin': None})
+            self._connected_before = True
+
+            while not self._stop_event.is_set():
+                if select.select([conn], [], [], self.poll_interval) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notification = conn.notifies.pop(0)
+                    try:
+                        event = json.loads(notification.payload)
+                    except ValueError:
+                        continue
+                    if event.get('origin') != ORIGIN:
+                        dispatch(event)
+        finally:
+            conn.close()
+
+
+def start_listener(conn_string):
+    """Start the process-wide listener thread once"""
+    global _listener
+    with _listener_lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = CacheEventListener(conn_string)
+            _listener.start()
+        return _listener
+
+
+if __name__ == "__main__":
+    # Print every event on the channel, e.g. to check NOTIFY against a local Postgres
+    subscribe('*', lambda event: print(json.dumps(event, ensure_ascii=False), flush=True))
+    listener = start_listener(os.environ['DATABASE_URL'])
+    try:
+        while listener.is_alive():
+            time.sleep(1)
+    except KeyboardInterrupt:
+        listener.stop()
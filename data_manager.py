@@ -1,47 +1,272 @@
-from postgres_data_manager import PostgresDataManager
+import os
+from functools import partial
+import pandas as pd
+import cache_events
+from match_queue import get_match_queue
+from player_purge import start_purge_worker
+from query_budget import QueryBudgetExceeded
+from query_cache import get_query_cache
+from ratings_store import get_shared_store
+from storage import get_data_backend
+
+
+def _apply_queued_match(submission):
+    """Write one queued match submission to the database"""
+    db = get_data_backend()
+    added = db.add_match_record(
+        submission['date'],
+        submission['time'],
+        submission['opponent'],
+        pd.DataFrame({'Name': submission['players']}),
+        submission['ratings'],
+        idempotency_key=submission['key']
+    )
+    if added and db.last_match_write['updated']:
+        # Changed ratings are not picked up by an incremental refresh
+        cache_events.dispatch({'entity': 'matches', 'action': 'update', 'key': submission['players'],
+                               'version': None, 'origin': cache_events.ORIGIN})
+    return added
+
+
+def _after_queued_matches(cache, store, keys):
+    """Evict match results once the queue worker has applied submissions"""
+    cache.evict('matches')
+    if store:
+        store.mark_dirty()
+
 
 class DataManager:
-    def __init__(self):
-        self.db = PostgresDataManager()
+    def __init__(self, use_store=None, session=None):
+        # Postgres or embedded SQLite, chosen by STORAGE_BACKEND
+        self.db = get_data_backend(session)
+        # Optional in-memory columnar store for analysis reads (RATINGS_STORE=1),
+        # started from the on-disk snapshot in RATINGS_SNAPSHOT_DIR when present
+        if use_store is None:
+            use_store = os.environ.get('RATINGS_STORE', '').lower() in ('1', 'true', 'yes')
+        self.snapshot_dir = os.environ.get('RATINGS_SNAPSHOT_DIR')
+        self.store = get_shared_store(get_data_backend(), self.snapshot_dir) if use_store else None
+        # Season list and first roster page are shared between sessions and
+        # evicted by local writes or NOTIFY events from other instances
+        self.cache = get_query_cache()
+        if self.db.shared:
+            cache_events.start_listener(self.db.conn_string)
+        # Match rows of deleted players are removed in the background
+        self.purge_worker = start_purge_worker(self.db.conn_string) if self.db.soft_delete else None
+        # Optional durable outbox for match saves (MATCH_QUEUE_PATH): a save is
+        # acknowledged once it is on local disk and flushed to the database in the background
+        queue_path = os.environ.get('MATCH_QUEUE_PATH')
+        self.match_queue = get_match_queue(
+            queue_path, _apply_queued_match, partial(_after_queued_matches, self.cache, self.store)
+        ) if queue_path else None
+        # What the page could not show fresh because a query ran out of its
+        # latency budget: 'stale' (last good result shown), 'missing', 'write'
+        self.degraded = set()
         self.rating_order = ['D', 'C', 'B', 'A']
         self.rating_map = {'A': 4, 'B': 3, 'C': 2, 'D': 1}
         self.reverse_rating_map = {4: 'A', 3: 'B', 2: 'C', 1: 'D'}
 
+    def _load(self, loader):
+        """Call a backend read; raises QueryBudgetExceeded if it ran out of its budget"""
+        self.db.budget_exceeded = None
+        result = loader()
+        if self.db.budget_exceeded:
+            raise QueryBudgetExceeded(self.db.budget_exceeded, result)
+        return result
+
+    def _read(self, entity, key, loader, cached=False):
+        """Run a backend read, falling back to its last good result when it exceeds its budget.
+
+        cached reads are also served from the query cache while fresh.
+        """
+        try:
+            if cached:
+                return self.cache.get(entity, key, lambda: self._load(loader))
+            result = self._load(loader)
+        except QueryBudgetExceeded as e:
+            print(f"Serving last good result: {e}")
+            stale = self.cache.last_good(entity, key)
+            self.degraded.add('missing' if stale is None else 'stale')
+            return e.result if stale is None else stale
+        self.cache.remember(entity, key, result)
+        return result
+
+    def _write(self, writer):
+        """Call a backend write, noting when it was cancelled for exceeding its budget"""
+        self.db.budget_exceeded = None
+        result = writer()
+        if self.db.budget_exceeded:
+            self.degraded.add('write')
+        return result
+
     def add_player(self, name, position="Not specified"):
         """Add a new player to the system"""
-        return self.db.add_player(name, position)
+        added = self._write(lambda: self.db.add_player(name, position))
+        if added:
+            self._after_write('players')
+        return added
+
+    def add_players(self, rows):
+        """Add many (name, position) players; returns (added names, existing names)"""
+        added, existing = self._write(lambda: self.db.add_players(rows))
+        if added:
+            self._after_write('players')
+        return added, existing
 
     def delete_player(self, name):
-        """Delete a player from the system"""
-        return self.db.delete_player(name)
+        """Hide a player at once and let the purge worker remove their match history"""
+        deleted = self._write(lambda: self.db.delete_player(name))
+        if deleted:
+            self._after_write('players', 'matches')
+            if self.purge_worker:
+                self.purge_worker.wake()
+        return deleted
+
+    def get_purge_status(self):
+        """Purge worker counters plus the deleted players still being purged.
+
+        None when the backend deletes match history at once.
+        """
+        if not self.purge_worker:
+            return None
+        pending = self._read('players', 'pending_deletions', self.db.get_pending_deletions)
+        return {**self.purge_worker.status(), 'pending': pending}
 
     def get_players(self):
         """Get list of all players"""
-        return self.db.get_players()
+        return self._read('players', 'all', self.db.get_players)
+
+    def get_players_page(self, search="", after=None, limit=25):
+        """Get one page of the roster, see DataBackend.get_players_page"""
+        load = partial(self.db.get_players_page, search, after, limit)
+        if search or after is not None:
+            return self._read('players', ('page', search, after, limit), load)
+        return self._read('players', ('first_page', limit), load, cached=True)
+
+    def search_players(self, query="", limit=20):
+        """Get the names of the players best matching a search text"""
+        return self._read('players', ('search', query, limit), lambda: self.db.search_players(query, limit))
+
+    def add_match_record(self, date, time, opponent, players_df, ratings, idempotency_key=None):
+        """Add match performance records for selected players.
+
+        With the match queue enabled the submission is only queued locally and
+        True means it is stored durably, not yet written to the database.
+        """
+        if self.match_queue:
+            try:
+                self.match_queue.enqueue(
+                    date, time, opponent, players_df['Name'].tolist(), ratings, idempotency_key
+                )
+                return True
+            except Exception as e:
+                print(f"Error queuing match record: {e}")
+                return False
+        added = self._write(
+            lambda: self.db.add_match_record(date, time, opponent, players_df, ratings, idempotency_key)
+        )
+        if added:
+            self._after_write('matches')
+            # Changed ratings are not picked up by an incremental refresh
+            if self.store and self.db.last_match_write['updated']:
+                self.store.invalidate()
+        return added
+
+    def list_matches(self, limit=50):
+        """Get the most recent fixtures with the number of rated players"""
+        return self._read('matches', ('list', limit), lambda: self.db.list_matches(limit))
 
-    def add_match_record(self, date, time, opponent, players_df, ratings):
-        """Add match performance records for selected players"""
-        return self.db.add_match_record(date, time, opponent, players_df, ratings)
+    def get_match_ratings(self, date, time, opponent):
+        """Get every rating row of one fixture, indexed by player name"""
+        return self._read('matches', ('ratings', date, time, opponent),
+                          lambda: self.db.get_match_ratings(date, time, opponent))
+
+    def update_match_ratings(self, changes):
+        """Apply corrected ratings; returns the number of rows updated or None on error"""
+        updated = self._write(lambda: self.db.update_match_ratings(changes))
+        if updated:
+            self._after_write('matches')
+            # Changed ratings are not picked up by an incremental refresh
+            if self.store:
+                self.store.invalidate()
+        return updated
+
+    def retry_failed_matches(self):
+        """Give queued match submissions that kept failing a fresh set of attempts"""
+        if not self.match_queue:
+            return 0
+        try:
+            return self.match_queue.requeue_failed()
+        except Exception as e:
+            print(f"Error requeuing match submissions: {e}")
+            return 0
+
+    def get_match_queue_status(self):
+        """Pending/applied/failed counts of the local match queue, or None when it is disabled"""
+        if not self.match_queue:
+            return None
+        try:
+            return self.match_queue.stats()
+        except Exception as e:
+            print(f"Error reading match queue: {e}")
+            return None
+
+    def _after_write(self, *entities):
+        """Evict cached results for the written entities and let the ratings store pick up the write"""
+        for entity in entities:
+            self.cache.evict(entity)
+        # Reads prefetched for this session's next rerun may predate the write
+        self.db.session.pop('prefetch', None)
+        if not self.store:
+            return
+        # The store reads from the primary until the replica has the write
+        last_write_lsn = self.db.session.get('last_write_lsn')
+        if last_write_lsn:
+            self.store.db.session['last_write_lsn'] = last_write_lsn
+        self.store.mark_dirty()
 
     def get_player_performance(self, player_name, start_date=None, end_date=None):
         """Get performance history for a specific player within date range"""
-        return self.db.get_player_performance(player_name, start_date, end_date)
+        if self.store:
+            return self.store.get_player_performance(player_name, start_date, end_date)
+        return self._read('matches', ('player', player_name, start_date, end_date),
+                          lambda: self.db.get_player_performance(player_name, start_date, end_date))
 
     def get_team_performance(self, start_date=None, end_date=None):
         """Get team's overall performance history within date range"""
-        return self.db.get_team_performance(start_date, end_date)
+        if self.store:
+            return self.store.get_team_performance(start_date, end_date)
+        return self._read('matches', ('team', start_date, end_date),
+                          lambda: self.db.get_team_performance(start_date, end_date))
 
     def get_available_seasons(self):
         """Get list of available seasons (years) from match data"""
-        return self.db.get_available_seasons()
+        if self.store:
+            return self.store.get_available_seasons()
+        return self._read('matches', 'seasons', self.db.get_available_seasons, cached=True)
 
     def generate_test_data(self, username):
         """Generate test data for a specific user"""
-        return self.db.generate_test_data(username)
+        result = self.db.generate_test_data(username)
+        self.cache.evict('all')
+        if self.store:
+            self.store.invalidate()
+        return result
 
     def reset_data(self):
         """Reset all data in the system"""
-        return self.db.reset_data()
+        reset = self.db.reset_data()
+        self.cache.evict('all')
+        if reset and self.store:
+            self.store.invalidate()
+        return reset
+
+    def write_snapshot(self, directory=None):
+        """Write a memory-mappable snapshot of the ratings store to disk"""
+        directory = directory or self.snapshot_dir
+        if not self.store or not directory:
+            return None
+        self.store.ensure_fresh()
+        return self.store.save_snapshot(directory)
 
     def _convert_to_numeric(self, rating):
         """Convert letter rating to numeric value"""
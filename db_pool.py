@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import errors
+
+import metrics
+import query_budget
+from instrumentation import timer
+from query_log import TimedConnection
+from psycopg2.pool import ThreadedConnectionPool
+
+# Upper bound of open connections per database URL in this process
+POOL_MAX_CONNECTIONS = int(os.environ.get('DB_POOL_MAX_CONNECTIONS', '10'))
+
+class _PooledConnection(TimedConnection):
+    """Connection that counts itself as opened"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        metrics.DB_CONNECTIONS_OPENED.inc()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """Thread-safe psycopg2 connection pool that waits instead of failing when exhausted"""
+
+    def __init__(self, conn_string, maxconn=POOL_MAX_CONNECTIONS):
+        self.conn_string = conn_string
+        self.maxconn = maxconn
+        # Cursors of pooled connections feed the slow-query log
+        self._pool = ThreadedConnectionPool(0, maxconn, conn_string, connection_factory=_PooledConnection)
+        # Connections are opened lazily, but psycopg2 closes returned
+        # connections beyond minconn; keep up to maxconn of them idle
+        self._pool.minconn = maxconn
+        self._slots = threading.BoundedSemaphore(maxconn)
+
+    def getconn(self, timeout=None):
+        """Borrow a connection, waiting up to timeout seconds for a free slot"""
+        start = time.perf_counter()
+        with timer('db_pool.wait'):
+            acquired = self._slots.acquire(timeout=timeout if timeout is not None else -1)
+        metrics.DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - start)
+        if not acquired:
+            raise psycopg2.pool.PoolError("Timed out waiting for a database connection")
+        try:
+            # Includes psycopg2.connect when the pool has no idle connection
+            with timer('db_pool.getconn'):
+                return self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, close=False):
+        """Return a borrowed connection; broken connections are discarded"""
+        try:
+            self._pool.putconn(conn, close=close or bool(conn.closed))
+        finally:
+            self._slots.release()
+
+    def warm(self, count=1):
+        """Open up to count connections ahead of the first request"""
+        conns = []
+        try:
+            for _ in range(min(count, self.maxconn)):
+                conns.append(self.getconn())
+        finally:
+            for conn in conns:
+                self.putconn(conn)
+        return len(conns)
+
+    def closeall(self):
+        """Close every pooled connection"""
+        self._pool.closeall()
+
+
+def get_pool(conn_string):
+    """Get the process-wide pool for a database URL"""
+    with _pools_lock:
+        pool = _pools.get(conn_string)
+        if pool is None:
+            pool = _pools[conn_string] = ConnectionPool(conn_string)
+        return pool
+
+
+@contextmanager
+def connection(conn_string, query_class=None):
+    """Borrow a pooled connection; commits on success and rolls back on error.
+
+    With a query_class its budget applies to the transaction (SET LOCAL).
+    """
+    pool = get_pool(conn_string)
+    conn = pool.getconn()
+    broken = False
+    try:
+        if query_class:
+            statement_ms, lock_ms = query_budget.budget(query_class)
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT set_config('statement_timeout', %s, true), set_config('lock_timeout', %s, true)",
+                    (str(statement_ms), str(lock_ms))
+                )
+        yield conn
+        conn.commit()
+    except (errors.QueryCanceled, errors.LockNotAvailable):
+        # Timeouts are OperationalErrors, but the connection is still usable
+        conn.rollback()
+        raise
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn, close=broken)
@@ -0,0 +1,161 @@
+"""Startup warm-up and readiness/liveness probes.
+
+    python health.py           run the warm-up once and report (exit 1 on failure)
+    python health.py --serve   run the warm-up, then serve the probes until stopped
+
+The probe server also serves Prometheus metrics at /metrics.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import db_pool
+import metrics
+import storage
+
+# Port for the probe server, separate from the Streamlit port
+HEALTH_PORT = int(os.environ.get('HEALTH_PORT', '8502'))
+# Connections opened per pool ahead of the first request
+WARM_CONNECTIONS = int(os.environ.get('WARM_CONNECTIONS', '2'))
+# Seconds between warm-up retries after a failure, doubled per attempt up to the cap
+WARM_UP_RETRY_DELAY = 2.0
+WARM_UP_RETRY_MAX_DELAY = 60.0
+
+_state = {
+    'ready': False,
+    'started_at': time.time(),
+    'warmed_at': None,
+    'steps': {},
+    'error': None,
+    'attempts': 0,
+}
+_state_lock = threading.Lock()
+_server = None
+_server_lock = threading.Lock()
+
+
+def warm_up():
+    """Prepare this process for its first user and mark it ready.
+
+    Opens pooled connections, verifies the auth and data schema, syncs the
+    admin account and primes the season list and first roster page caches
+    (and the ratings store when enabled). Returns True on success.
+    """
+    from auth.admin import create_initial_admin
+    from auth.database import get_auth_db
+    from data_manager import DataManager
+
+    steps = [
+        ('connections', _warm_connections),
+        ('auth_schema', get_auth_db),
+        ('admin_bootstrap', create_initial_admin),
+        ('data_schema', lambda: DataManager()),
+        ('seasons', lambda: DataManager().get_available_seasons()),
+        ('roster', lambda: DataManager().get_players_page()),
+    ]
+    timings = {}
+    with _state_lock:
+        _state['attempts'] += 1
+    try:
+        for name, step in steps:
+            start = time.perf_counter()
+            step()
+            timings[name] = round((time.perf_counter() - start) * 1000, 1)
+    except Exception as e:
+        with _state_lock:
+            _state.update(ready=False, steps=timings, error=f"{type(e).__name__}: {e}")
+        print(f"Warm-up failed: {e}")
+        return False
+
+    with _state_lock:
+        _state.update(ready=True, warmed_at=time.time(), steps=timings, error=None)
+    return True
+
+
+def warm_up_until_ready(delay=WARM_UP_RETRY_DELAY, max_delay=WARM_UP_RETRY_MAX_DELAY):
+    """Retry warm_up with exponential backoff until it succeeds"""
+    while not warm_up():
+        time.sleep(delay)
+        delay = min(max_delay, delay * 2)
+
+
+def start_warm_up_retries():
+    """Keep retrying warm_up in a daemon thread, so /readyz recovers once the database is back"""
+    thread = threading.Thread(target=warm_up_until_ready, name='warm-up-retry', daemon=True)
+    thread.start()
+    return thread
+
+
+def _warm_connections():
+    """Open connections to the primary and, if configured, the read replica"""
+    if storage.backend_name() != 'postgres':
+        return
+    urls = {os.environ['DATABASE_URL'], os.environ.get('DATABASE_READ_URL') or os.environ['DATABASE_URL']}
+    for url in urls:
+        db_pool.get_pool(url).warm(WARM_CONNECTIONS)
+
+
+def is_ready():
+    """Readiness: warm-up finished and the database answers"""
+    with _state_lock:
+        if not _state['ready']:
+            return False
+    return storage.ping()
+
+
+def status():
+    """Snapshot of the warm-up state for the probe responses"""
+    with _state_lock:
+        return dict(_state, uptime=round(time.time() - _state['started_at'], 1))
+
+
+class _ProbeHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/healthz':
+            # Liveness: the process is up and serving requests
+            self._respond(200, {'status': 'alive'})
+        elif self.path == '/readyz':
+            ready = is_ready()
+            self._respond(200 if ready else 503, dict(status(), status='ready' if ready else 'not ready'))
+        elif self.path == '/metrics':
+            payload = metrics.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        else:
+            self._respond(404, {'status': 'not found'})
+
+    def _respond(self, code, body):
+        payload = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass  # Probes are polled constantly; keep them out of the logs
+
+
+def start_health_server(port=HEALTH_PORT):
+    """Serve /healthz, /readyz and /metrics from a daemon thread (once per process)"""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer(('0.0.0.0', port), _ProbeHandler)
+            threading.Thread(target=_server.serve_forever, name='health-server', daemon=True).start()
+        return _server
+
+
+if __name__ == '__main__':
+    ok = warm_up()
+    print(json.dumps(status(), indent=2))
+    if '--serve' in sys.argv:
+        start_health_server()
+        threading.Event().wait()
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,126 @@
+import functools
+import inspect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import metrics
+
+# Durations kept per timer for the percentiles; older samples fall out
+WINDOW_SIZE = 1000
+
+# Name of the instrumented method currently running in this thread/context
+current_method = ContextVar('current_method', default=None)
+
+_timers = {}
+_timers_lock = threading.Lock()
+
+
+class Histogram:
+    """Call count, total time and a sliding window of recent durations"""
+
+    def __init__(self, window=WINDOW_SIZE):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+            self._samples.append(seconds)
+
+    def percentiles(self, *quantiles):
+        """Durations at the given quantiles (0-1) over the recent window"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return [0.0] * len(quantiles)
+        return [samples[min(len(samples) - 1, int(q * len(samples)))] for q in quantiles]
+
+
+def record(name, seconds):
+    """Add one duration to the named timer (and its Prometheus histogram)"""
+    histogram = _timers.get(name)
+    if histogram is None:
+        with _timers_lock:
+            histogram = _timers.setdefault(name, Histogram())
+    histogram.observe(seconds)
+    metrics.METHOD_SECONDS.observe(seconds, method=name)
+
+
+@contextmanager
+def timer(name):
+    """Time the enclosed block under name"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def timed(name):
+    """Decorator timing every call of a function under name"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            token = current_method.set(name)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+                current_method.reset(token)
+        return wrapper
+    return decorator
+
+
+def instrument_class(cls=None, exclude=()):
+    """Class decorator timing every method as 'ClassName.method'.
+
+    Dunder methods other than __init__, generators and names in exclude
+    (e.g. context-manager helpers, whose call returns immediately) are left
+    as they are.
+    """
+    def decorate(cls):
+        for attr, value in list(vars(cls).items()):
+            if attr in exclude or (attr.startswith('__') and attr != '__init__'):
+                continue
+            if isinstance(value, (staticmethod, classmethod)):
+                func = value.__func__
+                if inspect.isfunction(func) and not inspect.isgeneratorfunction(func):
+                    setattr(cls, attr, type(value)(timed(f"{cls.__name__}.{attr}")(func)))
+            elif inspect.isfunction(value) and not inspect.isgeneratorfunction(value):
+                setattr(cls, attr, timed(f"{cls.__name__}.{attr}")(value))
+        return cls
+    return decorate(cls) if cls is not None else decorate
+
+
+def snapshot():
+    """Summary rows for every timer, slowest total first (durations in milliseconds)"""
+    with _timers_lock:
+        timers = list(_timers.items())
+    rows = []
+    for name, histogram in timers:
+        p50, p95, p99 = histogram.percentiles(0.5, 0.95, 0.99)
+        rows.append({
+            'name': name,
+            'count': histogram.count,
+            'p50_ms': p50 * 1000,
+            'p95_ms': p95 * 1000,
+            'p99_ms': p99 * 1000,
+            'max_ms': histogram.max * 1000,
+            'total_ms': histogram.total * 1000,
+        })
+    return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+
+def reset():
+    """Forget all recorded timings"""
+    with _timers_lock:
+        _timers.clear()
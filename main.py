@@ -1,13 +1,12 @@
 import streamlit as st
-import pandas as pd
-from data_manager import DataManager
-from visualizations import Visualizer
-from utils import initialize_session_state
+from utils import initialize_session_state, parse_roster_text
 from auth.session import SessionManager
 from auth.database import AuthDB
 from auth.admin import create_initial_admin, show_user_management
 from auth.login import show_login_page, show_logout_button
 from datetime import datetime
+import uuid
+from instrumentation import timer
 
 def handle_streamlit_error():
     """Global error handler for unhandled exceptions"""
@@ -24,6 +23,73 @@ def handle_streamlit_error():
             with st.expander("Tekniske detaljer"):
                 st.code(error_details)
 
+def show_player_picker(dm, state_key, label, max_selections=None):
+    """Searchable player multi-select that only loads the top matches for the search text"""
+    widget_key = f"{state_key}_select"
+    selected = st.session_state.get(widget_key, st.session_state.get(state_key, []))
+    search = st.text_input("Søg spiller", key=f"{state_key}_search", placeholder="Skriv navn...")
+    matches = dm.search_players(search)
+    options = selected + [name for name in matches if name not in selected]
+
+    # The options change with every pick and search, which makes Streamlit
+    # build a new widget; hand it the selection through its key
+    st.session_state[widget_key] = selected
+    selected = st.multiselect(label, options, key=widget_key, max_selections=max_selections)
+    st.session_state[state_key] = selected
+    if search and not matches:
+        st.caption("Ingen spillere matcher søgningen")
+    return selected
+
+def show_match_editor(dm):
+    """Load all ratings of a saved fixture into the grid and save corrected cells in one update"""
+    matches = dm.list_matches()
+    if not matches:
+        st.info("Der er ingen gemte kampe endnu")
+        return
+
+    def match_label(match):
+        time = match['time'].strftime('%H:%M') if match['time'] else '--:--'
+        return f"{match['date']} {time} - {match['opponent'] or 'Ikke angivet'} ({match['players']} spillere)"
+
+    match = st.selectbox("Vælg kamp", matches, format_func=match_label)
+    original = dm.get_match_ratings(match['date'], match['time'], match['opponent'])
+    if original.empty:
+        st.warning("Kampen har ingen vurderinger")
+        return
+
+    categories = ["Boldholder", "Medspiller", "Presspiller", "Støttespiller"]
+    grades = ["A", "B", "C", "D"]
+
+    with st.form("edit_match"):
+        edited = st.data_editor(
+            original,
+            column_config={
+                "id": None,
+                **{
+                    category: st.column_config.SelectboxColumn(category, options=grades, required=True)
+                    for category in categories
+                }
+            },
+            num_rows="fixed",
+            use_container_width=True,
+            # A fresh editor per fixture so edits never carry over between matches
+            key=f"edit_match_{match['date']}_{match['time']}_{match['opponent']}"
+        )
+
+        if st.form_submit_button("Gem rettelser"):
+            if not edited[categories].isin(grades).all().all():
+                st.error("Alle spillere skal have en vurdering (A-D) i hver rolle")
+                return
+            changed = edited[(edited[categories] != original[categories]).any(axis=1)]
+            if changed.empty:
+                st.info("Ingen ændringer at gemme")
+                return
+            updated = dm.update_match_ratings(changed)
+            if updated is None:
+                st.error("Rettelserne kunne ikke gemmes. Prøv igen.")
+            else:
+                st.success(f"{updated} spilleres vurderinger rettet")
+
 # Must be the first Streamlit command
 st.set_page_config(
     page_title="Sorø-Freja Spiller Udviklingsværktøj",
@@ -74,6 +140,25 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+def season_dates(selected_season):
+    """(start, end) dates of a season option, or (None, None) for all seasons"""
+    if selected_season == "Alle sæsoner":
+        return None, None
+    year = int(selected_season)
+    return f"{year}-01-01", f"{year}-12-31"
+
+def show_degraded_notice(placeholder, dm):
+    """Explain data that could not be read or saved within the database time budget"""
+    messages = []
+    if 'stale' in dm.degraded:
+        messages.append("Databasen svarede ikke i tide, så nogle tal er de senest hentede og kan være forældede.")
+    if 'missing' in dm.degraded:
+        messages.append("Databasen svarede ikke i tide, så nogle data mangler. Prøv igen om lidt.")
+    if 'write' in dm.degraded:
+        messages.append("Databasen var optaget, så ændringen blev ikke gemt. Prøv igen om lidt.")
+    if messages:
+        placeholder.warning("\n\n".join(messages))
+
 def main():
     # Initialize session state
     try:
@@ -90,9 +175,13 @@ def main():
         show_login_page()
         return
 
-    # Initialize data manager and visualizer
-    dm = DataManager()
-    viz = Visualizer()
+    # Heavy modules (pandas/NumPy, plotly) are only imported once a user is
+    # logged in, so the login page of a cold instance renders faster
+    import pandas as pd
+    from data_manager import DataManager
+
+    # Initialize data manager
+    dm = DataManager(session=st.session_state)
 
     # Create top navigation bar with account info
     _, _, account_col = st.columns([1, 2, 1])
@@ -119,6 +208,8 @@ def main():
         show_logout_button()
 
     st.title("Sorø-Freja Spiller Udviklingsværktøj")
+    # Filled in once the page has run, if a query ran out of its time budget
+    degraded_notice = st.empty()
 
     # Show navigation and content
     with st.sidebar:
@@ -170,12 +261,60 @@ def main():
                     else:
                         st.error("Indtast venligst et spillernavn")
 
+            with st.expander("Importér spillerliste"):
+                with st.form("import_players", clear_on_submit=True):
+                    roster_text = st.text_area(
+                        "Én spiller pr. linje",
+                        placeholder="Navn\nNavn, Position"
+                    )
+                    roster_file = st.file_uploader("Eller upload fil", type=["csv", "txt"])
+
+                    if st.form_submit_button("Importér"):
+                        if roster_file is not None:
+                            roster_text = "\n".join([roster_text, roster_file.getvalue().decode("utf-8-sig")])
+                        rows, invalid = parse_roster_text(roster_text)
+                        if not rows:
+                            st.error("Ingen spillere fundet i listen")
+                        else:
+                            added, existing = dm.add_players(rows)
+                            if added:
+                                st.success(f"{len(added)} nye spillere tilføjet")
+                            if existing:
+                                st.info("Findes allerede: " + ", ".join(existing))
+                        if invalid:
+                            st.warning("Sprunget over (for lange navne): " + ", ".join(invalid))
+
         with col2:
             st.subheader("Aktive Spillere")
-            players_df = dm.get_players()
+            roster_search = st.text_input("Søg spiller", key="roster_search")
+
+            # Keyset pagination: remember the last name of every previous page
+            if st.session_state.get('roster_search_last') != roster_search:
+                st.session_state.roster_search_last = roster_search
+                st.session_state.roster_cursors = [None]
+            cursors = st.session_state.roster_cursors
+            page_size = 25
+
+            players_df, next_after, total_players = dm.get_players_page(
+                roster_search, cursors[-1], page_size
+            )
             if not players_df.empty:
                 st.dataframe(players_df[['Name']])  # Only show name column
 
+                first = (len(cursors) - 1) * page_size + 1
+                last = first + len(players_df) - 1
+                # The estimate can lag behind recent inserts
+                st.caption(f"Viser {first}-{last} af ca. {max(total_players, last)}")
+                prev_col, next_col = st.columns(2)
+                with prev_col:
+                    if len(cursors) > 1 and st.button("◀ Forrige"):
+                        cursors.pop()
+                        st.rerun()
+                with next_col:
+                    if next_after is not None and st.button("Næste ▶"):
+                        cursors.append(next_after)
+                        st.rerun()
+
                 # Delete player option
                 player_to_delete = st.selectbox("Vælg spiller fra listen der skal slettes", players_df['Name'].tolist())
 
@@ -204,6 +343,8 @@ def main():
                                 st.session_state.delete_confirmation = False
                                 st.session_state.player_to_delete = None
                                 st.rerun()
+                            else:
+                                st.error("Spilleren kunne ikke slettes. Den er måske allerede slettet.")
                     with col2:
                         if st.button("Nej, behold spiller"):
                             # Reset deletion state
@@ -218,113 +359,129 @@ def main():
 
         st.header("Kampe")
 
-        # Initialize session state for match recording
-        if 'match_step' not in st.session_state:
-            st.session_state.match_step = 1
-        if 'selected_players' not in st.session_state:
-            st.session_state.selected_players = []
-        if 'match_date' not in st.session_state:
-            st.session_state.match_date = None
-        if 'match_time' not in st.session_state:
-            st.session_state.match_time = None
-        if 'opponent' not in st.session_state:
-            st.session_state.opponent = None
-
-        # Step 1: Select match details and players
-        if st.session_state.match_step == 1:
-            with st.form("select_players"):
+        queue_status = dm.get_match_queue_status()
+        if queue_status and queue_status['pending']:
+            st.info(f"{queue_status['pending']} kamp(e) venter på at blive gemt i databasen")
+        if queue_status and queue_status['failed']:
+            st.error(f"{queue_status['failed']} kamp(e) kunne ikke gemmes i databasen efter gentagne forsøg")
+            if st.button("Prøv igen", key="retry_failed_matches"):
+                dm.retry_failed_matches()
+                st.rerun()
+        if queue_status and queue_status['last_error'] and (queue_status['pending'] or queue_status['failed']):
+            st.caption(f"Seneste fejl: {queue_status['last_error']}")
+
+        mode = st.radio("Handling", ["Registrér kamp", "Ret kamp"], horizontal=True, label_visibility="collapsed")
+
+        if mode == "Registrér kamp":
+            # Initialize session state for match recording
+            if 'match_step' not in st.session_state:
+                st.session_state.match_step = 1
+            if 'selected_players' not in st.session_state:
+                st.session_state.selected_players = []
+            if 'match_date' not in st.session_state:
+                st.session_state.match_date = None
+            if 'match_time' not in st.session_state:
+                st.session_state.match_time = None
+            if 'opponent' not in st.session_state:
+                st.session_state.opponent = None
+
+            # Step 1: Select match details and players
+            if st.session_state.match_step == 1:
                 st.subheader("Vælg kampdetaljer og spillere")
 
-                match_date = st.date_input("Dato")
-                match_time = st.time_input("Tidspunkt")
-                opponent = st.text_input("Modstander (valgfrit)")
-
-                players_df = dm.get_players()
-                if not players_df.empty:
-                    st.subheader("Vælg spillere der deltog i kampen")
+                # Player search sits outside the form so results update while typing
+                selected_players_list = show_player_picker(
+                    dm, "selected_players", "Vælg spillere der deltog i kampen"
+                )
 
-                    # Create checkboxes for player selection
-                    selected_players = {}
-                    cols = st.columns(3)  # Display checkboxes in 3 columns
-                    for idx, player in players_df.iterrows():
-                        col_idx = idx % 3
-                        with cols[col_idx]:
-                            # Pre-select players that were previously selected
-                            default_value = player['Name'] in st.session_state.selected_players
-                            selected_players[player['Name']] = st.checkbox(player['Name'], value=default_value)
+                with st.form("select_players"):
+                    match_date = st.date_input("Dato")
+                    match_time = st.time_input("Tidspunkt")
+                    opponent = st.text_input("Modstander (valgfrit)")
 
                     if st.form_submit_button("Fortsæt til vurdering"):
-                        selected_players_list = [name for name, selected in selected_players.items() if selected]
                         if len(selected_players_list) > 0:
-                            st.session_state.selected_players = selected_players_list
                             st.session_state.match_date = match_date
                             st.session_state.match_time = match_time
                             st.session_state.opponent = opponent
+                            # Identifies this submission so a repeated save is not stored twice
+                            st.session_state.match_submission_key = uuid.uuid4().hex
                             st.session_state.match_step = 2
                             st.rerun()
                         else:
                             st.error("Vælg mindst én spiller")
 
-        # Step 2: Enter ratings for selected players
-        elif st.session_state.match_step == 2:
-            with st.form("player_ratings"):
-                st.subheader("Spillervurdering")
-                st.write(f"Dato: {st.session_state.match_date}")
-                st.write(f"Tidspunkt: {st.session_state.match_time}")
-                st.write(f"Modstander: {st.session_state.opponent or 'Ikke angivet'}")
-
-                categories = ["Boldholder", "Medspiller", "Presspiller", "Støttespiller"]
-                ratings = {}
-
-                # Show ratings input for selected players
-                for player_name in st.session_state.selected_players:
-                    st.write(f"### {player_name}")
-                    cols = st.columns(4)
-
-                    for i, category in enumerate(categories):
-                        with cols[i]:
-                            ratings[f"{player_name}_{category}"] = st.selectbox(
-                                f"{category}",
-                                ["A", "B", "C", "D"],
-                                key=f"{player_name}_{category}"
-                            )
-
-                col1, col2 = st.columns([1, 5])
-                with col1:
-                    if st.form_submit_button("Tilbage"):
-                        st.session_state.match_step = 1
-                        # Keep the selected players in session state
-                        st.rerun()
+            # Step 2: Enter ratings for selected players
+            elif st.session_state.match_step == 2:
+                with st.form("player_ratings"):
+                    st.subheader("Spillervurdering")
+                    st.write(f"Dato: {st.session_state.match_date}")
+                    st.write(f"Tidspunkt: {st.session_state.match_time}")
+                    st.write(f"Modstander: {st.session_state.opponent or 'Ikke angivet'}")
+
+                    categories = ["Boldholder", "Medspiller", "Presspiller", "Støttespiller"]
+                    grades = ["A", "B", "C", "D"]
+
+                    # One editable grid (players x roles) instead of a selectbox per cell
+                    ratings_grid = st.data_editor(
+                        pd.DataFrame(
+                            "A",
+                            index=pd.Index(st.session_state.selected_players, name="Spiller"),
+                            columns=categories
+                        ),
+                        column_config={
+                            category: st.column_config.SelectboxColumn(category, options=grades, required=True)
+                            for category in categories
+                        },
+                        num_rows="fixed",
+                        use_container_width=True
+                    )
+
+                    col1, col2 = st.columns([1, 5])
+                    with col1:
+                        if st.form_submit_button("Tilbage"):
+                            st.session_state.match_step = 1
+                            # Keep the selected players in session state
+                            st.rerun()
 
-                with col2:
-                    if st.form_submit_button("Gem Kampdata"):
-                        # Prepare player ratings
-                        player_ratings = {}
-                        for category in categories:
-                            player_ratings[category] = {
-                                player_name: ratings[f"{player_name}_{category}"]
-                                for player_name in st.session_state.selected_players
-                            }
-
-                        # Save match record with date and time
-                        players_df = dm.get_players()
-                        selected_players_df = players_df[players_df['Name'].isin(st.session_state.selected_players)]
-                        dm.add_match_record(
-                            st.session_state.match_date,
-                            st.session_state.match_time,
-                            st.session_state.opponent or "Ikke angivet",
-                            selected_players_df,
-                            player_ratings
-                        )
-
-                        # Reset state and show success message
-                        st.session_state.match_step = 1
-                        st.session_state.selected_players = []
-                        st.session_state.match_date = None
-                        st.session_state.match_time = None
-                        st.session_state.opponent = None
-                        st.success("Kampdata gemt!")
-                        st.rerun()
+                    with col2:
+                        if st.form_submit_button("Gem Kampdata"):
+                            if not ratings_grid.isin(grades).all().all():
+                                st.error("Alle spillere skal have en vurdering (A-D) i hver rolle")
+                            else:
+                                # Prepare player ratings
+                                player_ratings = {
+                                    category: ratings_grid[category].to_dict()
+                                    for category in categories
+                                }
+
+                                # Save match record with date and time
+                                selected_players_df = pd.DataFrame({'Name': st.session_state.selected_players})
+                                saved = dm.add_match_record(
+                                    st.session_state.match_date,
+                                    st.session_state.match_time,
+                                    st.session_state.opponent or "Ikke angivet",
+                                    selected_players_df,
+                                    player_ratings,
+                                    idempotency_key=st.session_state.get('match_submission_key')
+                                )
+
+                                if saved:
+                                    # Reset state and show success message
+                                    st.session_state.match_step = 1
+                                    st.session_state.selected_players = []
+                                    st.session_state.pop('selected_players_select', None)
+                                    st.session_state.match_date = None
+                                    st.session_state.match_time = None
+                                    st.session_state.opponent = None
+                                    st.session_state.match_submission_key = None
+                                    st.success("Kampdata gemt!")
+                                    st.rerun()
+                                else:
+                                    st.error("Kampdata kunne ikke gemmes. Prøv igen.")
+
+        else:
+            show_match_editor(dm)
 
     elif st.session_state.page == "Udviklingsanalyse":
         # All roles can view analysis
@@ -333,6 +490,11 @@ def main():
 
         st.header("Udviklingsanalyse")
 
+        from prefetch import Prefetcher
+        from visualizations import Visualizer
+        viz = Visualizer()
+        prefetch = Prefetcher(st.session_state)
+
         # Add date range filtering
         col1, col2 = st.columns([1, 2])
         with col1:
@@ -341,38 +503,55 @@ def main():
                 ["Individuel Spilleranalyse", "Holdanalyse", "Spillersammenligning"]
             )
 
+        # Start every read of this page at once, using the previous run's
+        # choices for the performance query; a changed choice is read below
+        prefetch.submit(dm.get_available_seasons)
+        start_date, end_date = season_dates(st.session_state.get("analysis_season", "Alle sæsoner"))
+        if analysis_type == "Individuel Spilleranalyse":
+            prefetch.submit(dm.get_players)
+            if st.session_state.get("analysis_player"):
+                prefetch.submit(dm.get_player_performance, st.session_state.analysis_player, start_date, end_date)
+        elif analysis_type == "Holdanalyse":
+            prefetch.submit(dm.get_team_performance, start_date, end_date)
+        else:
+            for player_name in st.session_state.get("comparison_players", []):
+                prefetch.submit(dm.get_player_performance, player_name, start_date, end_date)
+
+        next_season = None
         with col2:
             # Get available seasons
-            available_seasons = dm.get_available_seasons()
+            available_seasons = prefetch.result(dm.get_available_seasons)
             if available_seasons:
-                selected_season = st.selectbox(
-                    "Vælg sæson",
-                    ["Alle sæsoner"] + [str(year) for year in available_seasons]
-                )
+                season_options = ["Alle sæsoner"] + [str(year) for year in available_seasons]
+                selected_season = st.selectbox("Vælg sæson", season_options, key="analysis_season")
 
                 # Set date range based on selected season
-                if selected_season != "Alle sæsoner":
-                    year = int(selected_season)
-                    start_date = f"{year}-01-01"
-                    end_date = f"{year}-12-31"
-                else:
-                    start_date = None
-                    end_date = None
+                start_date, end_date = season_dates(selected_season)
+                season_index = season_options.index(selected_season)
+                if season_index + 1 < len(season_options):
+                    next_season = season_options[season_index + 1]
             else:
                 st.info("Ingen kampdata tilgængelig")
                 start_date = None
                 end_date = None
 
         if analysis_type == "Individuel Spilleranalyse":
-            players_df = dm.get_players()
+            players_df = prefetch.result(dm.get_players)
             if not players_df.empty:
-                player = st.selectbox("Vælg Spiller", players_df['Name'].tolist())
+                player_names = players_df['Name'].tolist()
+                player = st.selectbox("Vælg Spiller", player_names, key="analysis_player")
                 category = st.selectbox(
                     "Vælg rolle",
                     ["Alle roller", "Boldholder", "Medspiller", "Presspiller", "Støttespiller"]
                 )
 
-                player_data = dm.get_player_performance(player, start_date, end_date)
+                player_data = prefetch.result(dm.get_player_performance, player, start_date, end_date)
+                # The next player in the list is the likeliest next pick
+                player_index = player_names.index(player)
+                if player_index + 1 < len(player_names):
+                    prefetch.speculate(
+                        dm.get_player_performance, player_names[player_index + 1], start_date, end_date
+                    )
                 if not player_data.empty:
                     if category == "Alle roller":
                         fig = viz.plot_player_all_categories(player_data, player)
@@ -396,7 +575,9 @@ def main():
                 ["Alle roller", "Boldholder", "Medspiller", "Presspiller", "Støttespiller"]
             )
 
-            team_data = dm.get_team_performance(start_date, end_date)
+            team_data = prefetch.result(dm.get_team_performance, start_date, end_date)
+            if next_season:
+                prefetch.speculate(dm.get_team_performance, *season_dates(next_season))
             if not team_data.empty:
                 if category == "Alle roller":
                     fig = viz.plot_team_all_categories(team_data)
@@ -415,61 +596,40 @@ def main():
                 st.info("Ingen holddata tilgængelig")
 
         else:  # Spillersammenligning
-            players_df = dm.get_players()
-            if not players_df.empty:
-                st.write("### Vælg spillere at sammenligne")
-                st.write("Vælg op til 4 spillere at sammenligne ved at markere afkrydsningsfelterne nedenfor.")
-
-                # Create a grid layout for player selection checkboxes
-                cols_per_row = 3
-                all_players = players_df['Name'].tolist()
-
-                # Calculate number of rows needed
-                num_rows = (len(all_players) + cols_per_row - 1) // cols_per_row
-
-                # Initialize selected players list
-                selected_players = []
-
-                # Create checkbox grid
-                for row in range(num_rows):
-                    cols = st.columns(cols_per_row)
-                    for col in range(cols_per_row):
-                        player_idx = row * cols_per_row + col
-                        if player_idx < len(all_players):
-                            player_name = all_players[player_idx]
-                            # Only allow selection if less than 4 players are selected
-                            disabled = len(selected_players) >= 4 and player_name not in selected_players
-                            with cols[col]:
-                                if st.checkbox(
-                                    player_name,
-                                    key=f"player_check_{player_name}",
-                                    disabled=disabled
-                                ):
-                                    selected_players.append(player_name)
-
-                if selected_players:
-                    # Get data for all selected players
-                    player_data_dict = {}
-                    for player_name in selected_players:
-                        player_data = dm.get_player_performance(player_name, start_date, end_date)
-                        if not player_data.empty:
-                            player_data_dict[player_name] = player_data
-
-                    if player_data_dict:
-                        fig = viz.plot_player_comparison(player_data_dict)
-                        st.plotly_chart(fig, config={
-                            'displayModeBar': False,  # Hide the modebar completely
-                            'scrollZoom': False,      # Disable scroll zoom
-                            'doubleClick': False,     # Disable double click actions
-                            'showTips': False,        # Disable hover tips
-                            'displaylogo': False,     # Hide Plotly logo
-                            'responsive': True,       # Make the plot responsive to window size
-                            'staticPlot': True        # Make the plot completely static
-                        }, use_container_width=True)  # Use full container width
-                    else:
-                        st.info("Ingen data tilgængelig for de valgte spillere")
+            st.write("### Vælg spillere at sammenligne")
+            st.write("Søg og vælg op til 4 spillere at sammenligne.")
+            selected_players = show_player_picker(
+                dm, "comparison_players", "Spillere", max_selections=4
+            )
+
+            if selected_players:
+                # Get data for all selected players
+                player_data_dict = {}
+                for player_name in selected_players:
+                    prefetch.submit(dm.get_player_performance, player_name, start_date, end_date)
+                for player_name in selected_players:
+                    player_data = prefetch.result(dm.get_player_performance, player_name, start_date, end_date)
+                    if not player_data.empty:
+                        player_data_dict[player_name] = player_data
+
+                if player_data_dict:
+                    fig = viz.plot_player_comparison(player_data_dict)
+                    st.plotly_chart(fig, config={
+                        'displayModeBar': False,  # Hide the modebar completely
+                        'scrollZoom': False,      # Disable scroll zoom
+                        'doubleClick': False,     # Disable double click actions
+                        'showTips': False,        # Disable hover tips
+                        'displaylogo': False,     # Hide Plotly logo
+                        'responsive': True,       # Make the plot responsive to window size
+                        'staticPlot': True        # Make the plot completely static
+                    }, use_container_width=True)  # Use full container width
                 else:
-                    st.info("Vælg mindst én spiller at sammenligne")
+                    st.info("Ingen data tilgængelig for de valgte spillere")
+            else:
+                st.info("Vælg mindst én spiller at sammenligne")
+
+    show_degraded_notice(degraded_notice, dm)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with timer('script_run'):
+        main()
\ No newline at end of file
@@ -0,0 +1,283 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import date, datetime, time as dt_time
+
+# Seconds before retrying a failed submission, doubled per attempt up to the cap
+RETRY_BASE_DELAY = 2.0
+RETRY_MAX_DELAY = 300.0
+# Attempts (about 25 minutes of retries) before a submission is set aside as
+# failed, e.g. because a player was deleted before it was flushed
+MAX_ATTEMPTS = 12
+# How often the worker removes applied submissions older than purge_done's cutoff
+PURGE_INTERVAL = 3600.0
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def _encode_value(value):
+    """JSON encoder for match dates and times"""
+    if isinstance(value, (date, datetime, dt_time)):
+        return value.isoformat()
+    raise TypeError(f"Cannot queue value of type {type(value).__name__}")
+
+
+class MatchQueue:
+    """Durable local outbox for match submissions.
+
+    Submissions are committed to a SQLite database in WAL mode, so a save is
+    acknowledged as soon as it is on local disk. A MatchQueueWorker applies
+    them to Postgres afterwards; each carries an idempotency key so a retry
+    of an already applied submission is skipped. After MAX_ATTEMPTS failed
+    attempts a submission is marked 'failed' until requeue_failed is called.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._wakeup = threading.Event()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS match_outbox (
+                    idempotency_key TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    next_attempt_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS match_outbox_due_idx
+                ON match_outbox (status, next_attempt_at)
+            """)
+
+    def _connect(self):
+        """Open a connection; FULL sync makes an acknowledged submission survive power loss"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=FULL")
+        return _ClosingConnection(conn)
+
+    def enqueue(self, date, time, opponent, player_names, ratings, idempotency_key=None):
+        """Store a submission durably and return its idempotency key.
+
+        Enqueuing a key that is already queued or applied is a no-op.
+        """
+        key = idempotency_key or uuid.uuid4().hex
+        payload = json.dumps({
+            'date': date,
+            'time': time,
+            'opponent': opponent,
+            'players': list(player_names),
+            'ratings': ratings,
+        }, default=_encode_value, ensure_ascii=False)
+        now = _now()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT OR IGNORE INTO match_outbox
+                (idempotency_key, payload, created_at, next_attempt_at)
+                VALUES (?, ?, ?, ?)
+                """,
+                (key, payload, now, now)
+            )
+        self._wakeup.set()
+        return key
+
+    def due(self, limit=20):
+        """Pending submissions whose next attempt is due, oldest first"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT idempotency_key, payload, attempts FROM match_outbox
+                WHERE status = 'pending' AND next_attempt_at <= ?
+                ORDER BY created_at
+                LIMIT ?
+                """,
+                (_now(), limit)
+            ).fetchall()
+        return [
+            {'key': key, 'attempts': attempts, **_decode_payload(payload)}
+            for key, payload, attempts in rows
+        ]
+
+    def mark_done(self, keys):
+        """Mark submissions as applied to the database"""
+        if not keys:
+            return
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE match_outbox SET status = 'done', last_error = NULL WHERE idempotency_key = ?",
+                [(key,) for key in keys]
+            )
+
+    def mark_failed(self, key, attempts, error):
+        """Record a failed attempt and schedule the next one with exponential backoff.
+
+        The last allowed attempt sets the submission aside as 'failed'.
+        """
+        delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempts)
+        status = 'failed' if attempts + 1 >= MAX_ATTEMPTS else 'pending'
+        with self._connect() as conn:
+            conn.execute(
+                """
+                UPDATE match_outbox
+                SET attempts = ?, last_error = ?, next_attempt_at = ?, status = ?
+                WHERE idempotency_key = ?
+                """,
+                (attempts + 1, str(error), _now() + delay, status, key)
+            )
+
+    def requeue_failed(self):
+        """Give failed submissions a fresh set of attempts; returns how many"""
+        with self._connect() as conn:
+            cur = conn.execute(
+                """
+                UPDATE match_outbox SET status = 'pending', attempts = 0, next_attempt_at = ?
+                WHERE status = 'failed'
+                """,
+                (_now(),)
+            )
+            requeued = cur.rowcount
+        self._wakeup.set()
+        return requeued
+
+    def purge_done(self, older_than=7 * 24 * 3600):
+        """Delete applied submissions older than the given number of seconds"""
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM match_outbox WHERE status = 'done' AND created_at < ?",
+                (_now() - older_than,)
+            )
+
+    def stats(self):
+        """Count submissions per status plus the most recent error"""
+        with self._connect() as conn:
+            counts = dict(conn.execute(
+                "SELECT status, COUNT(*) FROM match_outbox GROUP BY status"
+            ).fetchall())
+            last_error = conn.execute(
+                """
+                SELECT last_error FROM match_outbox
+                WHERE status IN ('pending', 'failed') AND last_error IS NOT NULL
+                ORDER BY next_attempt_at DESC LIMIT 1
+                """
+            ).fetchone()
+        return {
+            'pending': counts.get('pending', 0),
+            'done': counts.get('done', 0),
+            'failed': counts.get('failed', 0),
+            'last_error': last_error[0] if last_error else None,
+        }
+
+    def wait(self, timeout):
+        """Block until a new submission arrives or the timeout passes"""
+        woken = self._wakeup.wait(timeout)
+        self._wakeup.clear()
+        return woken
+
+
+class _ClosingConnection:
+    """sqlite3 connection context that commits (or rolls back) and then closes"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+        finally:
+            self.conn.close()
+
+
+class MatchQueueWorker(threading.Thread):
+    """Background thread that applies due submissions to the database, one transaction each.
+
+    It also removes old applied submissions from the outbox every PURGE_INTERVAL seconds.
+    """
+
+    def __init__(self, queue, apply, on_applied=None, batch_size=20, poll_interval=5.0):
+        super().__init__(name="match-queue-worker", daemon=True)
+        self.queue = queue
+        self.apply = apply
+        self.on_applied = on_applied
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+        self._purged_at = 0.0
+
+    def stop(self):
+        """Ask the worker to exit after the current flush"""
+        self._stop_event.set()
+        self.queue._wakeup.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                flushed = self.flush()
+                if time.monotonic() - self._purged_at > PURGE_INTERVAL:
+                    self.queue.purge_done()
+                    self._purged_at = time.monotonic()
+            except sqlite3.Error as e:
+                print(f"Error reading match queue: {e}")
+                flushed = 0
+            # Keep draining while full reads come back
+            if flushed < self.batch_size:
+                self.queue.wait(self.poll_interval)
+
+    def flush(self):
+        """Apply up to batch_size due submissions; returns how many were attempted"""
+        batch = self.queue.due(self.batch_size)
+        applied = []
+        for submission in batch:
+            try:
+                ok = self.apply(submission)
+            except Exception as e:
+                ok, error = False, e
+            else:
+                error = "Database write failed"
+            if ok:
+                applied.append(submission['key'])
+            else:
+                print(f"Error flushing match submission {submission['key']}: {error}")
+                self.queue.mark_failed(submission['key'], submission['attempts'], error)
+        self.queue.mark_done(applied)
+        if applied and self.on_applied:
+            self.on_applied(applied)
+        return len(batch)
+
+
+def _now():
+    return time.time()
+
+
+def _decode_payload(payload):
+    """Turn a stored payload back into add_match_record arguments"""
+    data = json.loads(payload)
+    data['date'] = date.fromisoformat(data['date']) if data['date'] else None
+    data['time'] = dt_time.fromisoformat(data['time']) if data['time'] else None
+    return data
+
+
+def get_match_queue(path, apply, on_applied=None):
+    """Get the process-wide queue for path, starting its flush worker once"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = MatchQueue(path)
+            _queue.worker = MatchQueueWorker(_queue, apply, on_applied)
+            _queue.worker.start()
+        return _queue
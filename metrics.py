@@ -0,0 +1,183 @@
+"""Process metrics in the Prometheus text exposition format.
+
+Metrics are served at /metrics by the health server and, with METRICS_FILE
+set, also written periodically to that file (e.g. for a textfile collector).
+"""
+import math
+import os
+import threading
+
+# Seconds; covers fast cache hits up to slow analysis queries
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_metrics = []
+_metrics_lock = threading.Lock()
+_file_writer = None
+
+
+def _escape(value):
+    """Escape a label value (backslash, double quote and newline)"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        with _metrics_lock:
+            _metrics.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    type_name = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        if not self.label_names:
+            self._values[()] = 0
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that goes up and down, or is computed at scrape time by a callback"""
+    type_name = 'gauge'
+
+    def __init__(self, name, help_text, labels=(), callback=None):
+        super().__init__(name, help_text, labels)
+        self.callback = callback
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def render(self):
+        if self.callback:
+            try:
+                value = self.callback()
+            except Exception:
+                value = None
+            if value is None:
+                return []
+            self.set(value)
+        return super().render()
+
+
+class Histogram(_Metric):
+    """Bucketed distribution of observed values"""
+    type_name = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in values:
+            for bound, count in zip(self.buckets, counts):
+                labels = _format_labels(self.label_names, key, [('le', _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {total!r}")
+            lines.append(f"{self.name}_count{labels} {counts[-1]}")
+        return lines
+
+
+def render():
+    """All metrics in the Prometheus text format"""
+    with _metrics_lock:
+        metrics = list(_metrics)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def write_file(path):
+    """Write the metrics to path atomically"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(render())
+    os.replace(tmp_path, path)
+
+
+def start_file_writer(path, interval=15.0):
+    """Rewrite the metrics file every interval seconds from a daemon thread (once per process)"""
+    global _file_writer
+
+    def run():
+        stop = threading.Event()
+        while not stop.wait(interval):
+            try:
+                write_file(path)
+            except OSError as e:
+                print(f"Error writing metrics file: {e}")
+
+    with _metrics_lock:
+        if _file_writer is None:
+            _file_writer = threading.Thread(target=run, name='metrics-file-writer', daemon=True)
+            _file_writer.start()
+        return _file_writer
+
+
+def _active_sessions():
+    """Open Streamlit sessions, or None outside a running Streamlit server"""
+    from streamlit.runtime import Runtime
+    if not Runtime.exists():
+        return None
+    return Runtime.instance()._session_mgr.num_active_sessions()
+
+
+LOGINS = Counter('stt_logins_total', 'Login attempts by result', ['result'])
+PASSWORD_HASH_SECONDS = Histogram('stt_password_verify_seconds', 'Time spent verifying bcrypt password hashes')
+DB_CONNECTIONS_OPENED = Counter('stt_db_connections_opened_total', 'Database connections opened by the pool')
+DB_POOL_WAIT_SECONDS = Histogram('stt_db_pool_wait_seconds', 'Time waiting for a free pooled connection')
+METHOD_SECONDS = Histogram('stt_method_duration_seconds', 'Duration of instrumented methods', ['method'])
+CACHE_REQUESTS = Counter('stt_query_cache_requests_total', 'Query cache lookups by result', ['result'])
+MATCH_ROWS_WRITTEN = Counter('stt_match_rows_written_total', 'Match rating rows written by action', ['action'])
+QUERY_BUDGET_EXCEEDED = Counter('stt_query_budget_exceeded_total', 'Statements cancelled for exceeding their latency budget', ['query_class'])
+ACTIVE_SESSIONS = Gauge('stt_active_sessions', 'Open Streamlit sessions in this process', callback=_active_sessions)
@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+
+import psycopg2
+
+import db_pool
+from storage import SUBMISSION_KEEP_DAYS
+
+# Match rows removed per transaction; small batches keep row locks short
+PURGE_BATCH_SIZE = int(os.environ.get('PURGE_BATCH_SIZE', '1000'))
+# Seconds between removals of old match submission idempotency keys
+SUBMISSION_PRUNE_INTERVAL = 3600
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+class PlayerPurgeWorker(threading.Thread):
+    """Background thread that physically removes soft-deleted players.
+
+    Match rows of deleted players are removed in bounded batches, each in its
+    own short transaction, and a player row is removed once no matches are
+    left. Concurrent match entry only ever waits for one batch. Every
+    SUBMISSION_PRUNE_INTERVAL seconds it also removes match_submissions keys
+    older than SUBMISSION_KEEP_DAYS.
+    """
+
+    def __init__(self, conn_string, batch_size=PURGE_BATCH_SIZE, pause=0.2, poll_interval=60.0):
+        super().__init__(name="player-purge-worker", daemon=True)
+        self.conn_string = conn_string
+        self.batch_size = batch_size
+        self.pause = pause
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+        self.rows_deleted = 0
+        self.players_purged = 0
+        self.submissions_pruned = 0
+        self._pruned_at = 0.0
+        self.last_run = None
+        self.last_error = None
+
+    def wake(self):
+        """Start purging now instead of at the next poll"""
+        self._wakeup.set()
+
+    def stop(self):
+        """Ask the worker to exit after the current batch"""
+        self._stop_event.set()
+        self._wakeup.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                # Keep going while batches come back full
+                while self.purge_batch() and not self._stop_event.is_set():
+                    self._stop_event.wait(self.pause)
+                if time.monotonic() - self._pruned_at > SUBMISSION_PRUNE_INTERVAL:
+                    self.prune_submissions()
+                    self._pruned_at = time.monotonic()
+                self.last_error = None
+            except psycopg2.Error as e:
+                self.last_error = str(e)
+                print(f"Error purging deleted players: {e}")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def purge_batch(self):
+        """Delete one batch of match rows; returns True if more may be left"""
+        with db_pool.connection(self.conn_string, 'maintenance') as conn:
+            with conn.cursor() as cur:
+                # Skip this round rather than queue behind a long-running writer
+                cur.execute("SET LOCAL lock_timeout = '2s'")
+                # ANY(ARRAY(...)) deletes the batch by primary key; IN (...)
+                # lets the planner hash it against a full scan of matches
+                cur.execute("""
+                    DELETE FROM matches WHERE id = ANY(ARRAY(
+                        SELECT m.id
+                        FROM matches m
+                        JOIN players p ON p.id = m.player_id
+                        WHERE p.deleted_at IS NOT NULL
+                        LIMIT %s
+                    ))
+                """, (self.batch_size,))
+                deleted = cur.rowcount
+
+                purged = 0
+                if deleted < self.batch_size:
+                    cur.execute("""
+                        DELETE FROM players p
+                        WHERE p.deleted_at IS NOT NULL
+                        AND NOT EXISTS (SELECT 1 FROM matches m WHERE m.player_id = p.id)
+                    """)
+                    purged = cur.rowcount
+                conn.commit()
+
+        self.rows_deleted += deleted
+        self.players_purged += purged
+        self.last_run = time.time()
+        return deleted >= self.batch_size
+
+    def prune_submissions(self):
+        """Delete idempotency keys of match submissions applied more than SUBMISSION_KEEP_DAYS ago"""
+        with db_pool.connection(self.conn_string, 'maintenance') as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "DELETE FROM match_submissions WHERE applied_at < LOCALTIMESTAMP - make_interval(days => %s)",
+                    (SUBMISSION_KEEP_DAYS,)
+                )
+                self.submissions_pruned += cur.rowcount
+
+    def status(self):
+        """Counters for the admin panel"""
+        return {
+            'running': self.is_alive(),
+            'rows_deleted': self.rows_deleted,
+            'players_purged': self.players_purged,
+            'last_run': self.last_run,
+            'last_error': self.last_error,
+        }
+
+
+def start_purge_worker(conn_string):
+    """Start the process-wide purge worker once"""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = PlayerPurgeWorker(conn_string)
+            _worker.start()
+        return _worker
@@ -1,40 +1,251 @@
 import psycopg2
-from psycopg2.extras import DictCursor
+from psycopg2.extras import DictCursor, execute_values
 import os
-from datetime import datetime
+from contextlib import ExitStack, contextmanager
 import pandas as pd
+import db_pool
+import metrics
+from instrumentation import instrument_class
+from storage import DataBackend, like_prefix
+from synthetic_data import load_dataset
+from cache_events import notify
+from rating_frames import (
+    RATING_CATEGORIES,
+    build_player_frame,
+    build_players_frame,
+    build_team_frame,
+    empty_player_frame,
+    rating_columns_from_rows,
+)
 
-class PostgresDataManager:
-    def __init__(self):
+# Every method is timed; _connect only hands out a context manager
+@instrument_class(exclude=('_connect',))
+class PostgresDataManager(DataBackend):
+    soft_delete = True
+    shared = True
+    # Schema setup runs once per process rather than on every rerun
+    _tables_initialized = False
+    # Whether the pg_trgm extension (and its name index) is available
+    has_trigram = False
+
+    def __init__(self, session=None):
+        super().__init__(session)
         self.conn_string = os.environ['DATABASE_URL']
+        # Optional read replica for analytics queries; writes stay on the primary
+        self.read_conn_string = os.environ.get('DATABASE_READ_URL') or self.conn_string
         self.rating_order = ['D', 'C', 'B', 'A']
         self.rating_map = {'A': 4, 'B': 3, 'C': 2, 'D': 1}
         self.reverse_rating_map = {4: 'A', 3: 'B', 2: 'C', 1: 'D'}
+        if not PostgresDataManager._tables_initialized:
+            self._initialize_tables()
+
+    def _initialize_tables(self):
+        """Create tables and indexes if they don't exist"""
+        try:
+            with self._connect(query_class='maintenance') as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        CREATE TABLE IF NOT EXISTS players (
+                            id SERIAL PRIMARY KEY,
+                            name VARCHAR(100) NOT NULL,
+                            position VARCHAR(50) DEFAULT 'Not specified',
+                            deleted_at TIMESTAMP
+                        )
+                    """)
+                    # Deleted players are hidden at once and removed later by
+                    # the purge worker; their names are free for new players.
+                    # The ALTERs lock players exclusively, so only run them once
+                    cur.execute("SELECT to_regclass('players_active_name_idx') IS NULL")
+                    if cur.fetchone()[0]:
+                        cur.execute("ALTER TABLE players ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP")
+                        cur.execute("""
+                            CREATE UNIQUE INDEX IF NOT EXISTS players_active_name_idx
+                            ON players (name) WHERE deleted_at IS NULL
+                        """)
+                        cur.execute("ALTER TABLE players DROP CONSTRAINT IF EXISTS players_name_key")
+                    cur.execute("""
+                        CREATE TABLE IF NOT EXISTS matches (
+                            id SERIAL PRIMARY KEY,
+                            date DATE,
+                            time TIME,
+                            opponent VARCHAR(100),
+                            player_id INTEGER REFERENCES players(id) ON DELETE CASCADE,
+                            boldholder VARCHAR(1),
+                            medspiller VARCHAR(1),
+                            presspiller VARCHAR(1),
+                            stottespiller VARCHAR(1)
+                        )
+                    """)
+                    # Idempotency keys of applied match submissions, so a
+                    # retried submission is not inserted twice
+                    cur.execute("""
+                        CREATE TABLE IF NOT EXISTS match_submissions (
+                            idempotency_key VARCHAR(64) PRIMARY KEY,
+                            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        )
+                    """)
+
+                    # One row per player per match; older trees may hold
+                    # duplicates from double submissions, keep the latest
+                    cur.execute("SELECT to_regclass('matches_natural_key_idx') IS NULL")
+                    if cur.fetchone()[0]:
+                        cur.execute("""
+                            DELETE FROM matches m
+                            USING matches newer
+                            WHERE newer.player_id = m.player_id
+                              AND newer.date = m.date
+                              AND newer.time = m.time
+                              AND newer.opponent = m.opponent
+                              AND newer.id > m.id
+                        """)
+                        if cur.rowcount:
+                            print(f"Removed {cur.rowcount} duplicate match rows")
+                        cur.execute("""
+                            CREATE UNIQUE INDEX IF NOT EXISTS matches_natural_key_idx
+                            ON matches (player_id, date, time, opponent)
+                        """)
+
+                    # Fixture lookups and date-range filters across all players
+                    cur.execute("CREATE INDEX IF NOT EXISTS matches_date_idx ON matches (date)")
+
+                    # Case-insensitive prefix search on player names
+                    cur.execute("""
+                        CREATE INDEX IF NOT EXISTS players_name_prefix_idx
+                        ON players (lower(name) text_pattern_ops)
+                    """)
+                    conn.commit()
+
+                    # Trigram similarity search is optional (needs pg_trgm)
+                    try:
+                        cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+                        cur.execute("""
+                            CREATE INDEX IF NOT EXISTS players_name_trgm_idx
+                            ON players USING gin (name gin_trgm_ops)
+                        """)
+                        conn.commit()
+                        PostgresDataManager.has_trigram = True
+                    except psycopg2.Error as e:
+                        conn.rollback()
+                        print(f"Trigram player search unavailable: {e}")
+            PostgresDataManager._tables_initialized = True
+        except psycopg2.Error as e:
+            print(f"Error initializing tables: {e}")
+
+    @contextmanager
+    def _connect(self, read=False, query_class='interactive'):
+        """Borrow a pooled connection, routing analytics reads to the replica when configured.
+
+        Reads fall back to the primary when the replica cannot be reached. Commits on success and rolls back on error. Statements run within the
+        latency budget of query_class.
+        """
+        conn_string = self.conn_string
+        if read and self.read_conn_string != self.conn_string and self._replica_caught_up():
+            conn_string = self.read_conn_string
+        try:
+            with ExitStack() as stack:
+                try:
+                    conn = stack.enter_context(db_pool.connection(conn_string, query_class))
+                except psycopg2.OperationalError as e:
+                    if conn_string == self.conn_string:
+                        raise
+                    print(f"Error connecting to read replica, reading from the primary: {e}")
+                    conn = stack.enter_context(db_pool.connection(self.conn_string, query_class))
+                yield conn
+        except psycopg2.Error as e:
+            self._check_budget(e, query_class)
+            raise
+
+    def _replica_caught_up(self):
+        """Check the replica has replayed this session's last write"""
+        last_write_lsn = self.session.get('last_write_lsn')
+        if not last_write_lsn:
+            return True
+        try:
+            with db_pool.connection(self.read_conn_string) as conn:
+                with conn.cursor() as cur:
+                    # NULL replay position means the read URL is not a standby
+                    cur.execute(
+                        "SELECT COALESCE(pg_last_wal_replay_lsn() >= %s::pg_lsn, true)",
+                        (last_write_lsn,)
+                    )
+                    caught_up = cur.fetchone()[0]
+        except psycopg2.Error as e:
+            print(f"Error connecting to read replica: {e}")
+            return False
+        if caught_up:
+            self.session.pop('last_write_lsn', None)
+        return caught_up
+
+    def _record_write(self, cur):
+        """Remember the primary's WAL position for read-your-writes on the replica"""
+        if self.read_conn_string != self.conn_string:
+            cur.execute("SELECT pg_current_wal_lsn()::text")
+            self.session['last_write_lsn'] = cur.fetchone()[0]
 
     def add_player(self, name, position="Not specified"):
         """Add a new player to the system"""
         try:
-            with psycopg2.connect(self.conn_string) as conn:
+            with self._connect(query_class='write') as conn:
                 with conn.cursor() as cur:
                     cur.execute("""
                         INSERT INTO players (name, position)
                         VALUES (%s, %s)
-                        ON CONFLICT (name) DO NOTHING
+                        ON CONFLICT (name) WHERE deleted_at IS NULL DO NOTHING
                         RETURNING id
                     """, (name, position))
+                    added = cur.fetchone() is not None
+                    if added:
+                        notify(cur, 'players', 'insert', name)
+                    self._record_write(cur)
                     conn.commit()
-                    return cur.fetchone() is not None
+                    return added
         except psycopg2.Error as e:
             print(f"Error adding player: {e}")
             return False
 
+    def add_players(self, rows):
+        """Add many (name, position) players in one statement.
+
+        Returns the names that were added and the names that already existed.
+        """
+        if not rows:
+            return [], []
+        try:
+            with self._connect(query_class='write') as conn:
+                with conn.cursor() as cur:
+                    inserted = execute_values(cur, """
+                        INSERT INTO players (name, position)
+                        VALUES %s
+                        ON CONFLICT (name) WHERE deleted_at IS NULL DO NOTHING
+                        RETURNING name
+                    """, rows, page_size=len(rows), fetch=True)
+                    added = {row[0] for row in inserted}
+                    if added:
+                        notify(cur, 'players', 'insert', sorted(added))
+                    self._record_write(cur)
+                    conn.commit()
+        except psycopg2.Error as e:
+            print(f"Error adding players: {e}")
+            return [], []
+        names = [name for name, _ in rows]
+        return [name for name in names if name in added], [name for name in names if name not in added]
+
     def delete_player(self, name):
-        """Delete a player and their matches"""
+        """Delete a player; their matches are removed in the background by the purge worker.
+
+        False if there is no such (not yet deleted) player.
+        """
         try:
-            with psycopg2.connect(self.conn_string) as conn:
+            with self._connect(query_class='write') as conn:
                 with conn.cursor() as cur:
-                    # Player's matches will be deleted automatically due to CASCADE
-                    cur.execute("DELETE FROM players WHERE name = %s", (name,))
+                    cur.execute("""
+                        UPDATE players SET deleted_at = CURRENT_TIMESTAMP
+                        WHERE name = %s AND deleted_at IS NULL
+                    """, (name,))
+                    if cur.rowcount == 0:
+                        return False
+                    notify(cur, 'players', 'delete', name)
+                    self._record_write(cur)
                     conn.commit()
                     return True
         except psycopg2.Error as e:
@@ -44,62 +255,276 @@ class PostgresDataManager:
     def get_players(self):
         """Get list of all players"""
         try:
-            with psycopg2.connect(self.conn_string) as conn:
-                df = pd.read_sql_query("SELECT name, position FROM players ORDER BY name", conn)
-                # Rename columns to match expected format
-                df = df.rename(columns={'name': 'Name', 'position': 'Position'})
-                return df
+            with self._connect() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT name, position FROM players WHERE deleted_at IS NULL ORDER BY name")
+                    rows = cur.fetchall()
+            names, positions = zip(*rows) if rows else ((), ())
+            return build_players_frame(names, positions)
         except psycopg2.Error as e:
             print(f"Error getting players: {e}")
-            return pd.DataFrame(columns=['Name', 'Position'])
+            return build_players_frame([], [])
+
+    def get_players_page(self, search="", after=None, limit=25, count_cap=1000):
+        """Get one page of the roster ordered by name using keyset pagination.
+
+        Returns (players_df, next_after, total_estimate); next_after is the
+        name to pass as after for the next page, or None on the last page.
+        """
+        conditions = ["deleted_at IS NULL"]
+        params = []
+        search = search.strip()
+        if search:
+            conditions.append("lower(name) LIKE %s")
+            params.append(like_prefix(search))
+        filter_sql = f"WHERE {' AND '.join(conditions)}"
+
+        page_conditions = conditions + (["name > %s"] if after is not None else [])
+        page_params = params + ([after] if after is not None else [])
+        page_sql = f"WHERE {' AND '.join(page_conditions)}"
 
-    def add_match_record(self, date, time, opponent, players_df, ratings):
-        """Add match performance records for selected players"""
         try:
-            with psycopg2.connect(self.conn_string) as conn:
+            with self._connect() as conn:
                 with conn.cursor() as cur:
-                    for _, player in players_df.iterrows():
-                        player_name = player['Name']
-                        # Get player ID
-                        cur.execute("SELECT id FROM players WHERE name = %s", (player_name,))
-                        player_id = cur.fetchone()[0]
+                    cur.execute(f"""
+                        SELECT name, position FROM players
+                        {page_sql}
+                        ORDER BY name
+                        LIMIT %s
+                    """, page_params + [limit + 1])
+                    rows = cur.fetchall()
+
+                    total = None
+                    if not search:
+                        # Planner statistics; -1/0 until the table has been analyzed
+                        cur.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = 'players'::regclass")
+                        total = cur.fetchone()[0]
+                    if not total or total <= 0:
+                        cur.execute(f"""
+                            SELECT count(*) FROM (
+                                SELECT 1 FROM players {filter_sql} LIMIT %s
+                            ) capped
+                        """, params + [count_cap])
+                        total = cur.fetchone()[0]
 
-                        # Insert match record
+            next_after = rows[limit - 1][0] if len(rows) > limit else None
+            rows = rows[:limit]
+            names, positions = zip(*rows) if rows else ((), ())
+            return build_players_frame(names, positions), next_after, total
+        except psycopg2.Error as e:
+            print(f"Error getting players page: {e}")
+            return build_players_frame([], []), None, 0
+
+    def search_players(self, query="", limit=20):
+        """Get the names of the players best matching query (top matches only)"""
+        query = query.strip()
+        prefix = like_prefix(query)
+        if query and self.has_trigram:
+            sql = """
+                SELECT name FROM players
+                WHERE deleted_at IS NULL AND (lower(name) LIKE %s OR name %% %s)
+                ORDER BY lower(name) LIKE %s DESC, similarity(name, %s) DESC, name
+                LIMIT %s
+            """
+            params = (prefix, query, prefix, query, limit)
+        else:
+            # Without pg_trgm, also match the start of later words (e.g. surnames)
+            sql = """
+                SELECT name FROM players
+                WHERE deleted_at IS NULL AND (lower(name) LIKE %s OR lower(name) LIKE %s)
+                ORDER BY lower(name) LIKE %s DESC, name
+                LIMIT %s
+            """
+            params = (prefix, '% ' + prefix, prefix, limit)
+        try:
+            with self._connect() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, params)
+                    return [row[0] for row in cur.fetchall()]
+        except psycopg2.Error as e:
+            print(f"Error searching players: {e}")
+            return []
+
+    def add_match_record(self, date, time, opponent, players_df, ratings, idempotency_key=None):
+        """Add or update match performance records for selected players.
+
+        Rows are upserted on (player, date, time, opponent), so saving the same
+        match again updates changed ratings instead of adding duplicates. A
+        submission whose idempotency key was already applied is skipped.
+        The inserted/updated row counts are kept in last_match_write.
+        """
+        names = players_df['Name'].tolist()
+        self.last_match_write = {'inserted': 0, 'updated': 0}
+        try:
+            with self._connect(query_class='write') as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT name FROM players WHERE name = ANY(%s) AND deleted_at IS NULL", (names,))
+                    missing = set(names) - {row[0] for row in cur.fetchall()}
+                    if missing:
+                        print(f"Error adding match record: unknown players {sorted(missing)}")
+                        conn.rollback()
+                        return False
+
+                    if idempotency_key:
                         cur.execute("""
-                            INSERT INTO matches 
-                            (date, time, opponent, player_id, 
-                             boldholder, medspiller, presspiller, stottespiller)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                        """, (
-                            date,
-                            time,
-                            opponent,
-                            player_id,
-                            ratings['Boldholder'][player_name],
-                            ratings['Medspiller'][player_name],
-                            ratings['Presspiller'][player_name],
-                            ratings['Støttespiller'][player_name]
-                        ))
+                            INSERT INTO match_submissions (idempotency_key) VALUES (%s)
+                            ON CONFLICT DO NOTHING
+                        """, (idempotency_key,))
+                        if cur.rowcount == 0:
+                            return True
+
+                    # One statement for the whole squad; unchanged rows are left alone
+                    cur.execute("""
+                        INSERT INTO matches
+                        (date, time, opponent, player_id,
+                         boldholder, medspiller, presspiller, stottespiller)
+                        SELECT %s, %s, %s, p.id, r.boldholder, r.medspiller, r.presspiller, r.stottespiller
+                        FROM unnest(%s::text[], %s::text[], %s::text[], %s::text[], %s::text[])
+                             AS r(name, boldholder, medspiller, presspiller, stottespiller)
+                        JOIN players p ON p.name = r.name AND p.deleted_at IS NULL
+                        ON CONFLICT (player_id, date, time, opponent) DO UPDATE SET
+                            boldholder = EXCLUDED.boldholder,
+                            medspiller = EXCLUDED.medspiller,
+                            presspiller = EXCLUDED.presspiller,
+                            stottespiller = EXCLUDED.stottespiller
+                        WHERE (matches.boldholder, matches.medspiller, matches.presspiller, matches.stottespiller)
+                              IS DISTINCT FROM
+                              (EXCLUDED.boldholder, EXCLUDED.medspiller, EXCLUDED.presspiller, EXCLUDED.stottespiller)
+                        RETURNING xmax = 0
+                    """, (
+                        date,
+                        time,
+                        opponent,
+                        names,
+                        *([ratings[category][name] for name in names] for category in RATING_CATEGORIES)
+                    ))
+                    inserted = [row[0] for row in cur.fetchall()]
+                    self.last_match_write = {
+                        'inserted': inserted.count(True),
+                        'updated': inserted.count(False)
+                    }
+
+                    metrics.MATCH_ROWS_WRITTEN.inc(self.last_match_write['inserted'], action='insert')
+                    metrics.MATCH_ROWS_WRITTEN.inc(self.last_match_write['updated'], action='update')
+                    if self.last_match_write['inserted']:
+                        notify(cur, 'matches', 'insert', names)
+                    if self.last_match_write['updated']:
+                        notify(cur, 'matches', 'update', names)
+                    self._record_write(cur)
                     conn.commit()
                     return True
         except psycopg2.Error as e:
             print(f"Error adding match record: {e}")
             return False
 
+    def list_matches(self, limit=50):
+        """Get the most recent fixtures with the number of rated players"""
+        try:
+            with self._connect(read=True) as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT m.date, m.time, m.opponent, COUNT(*)
+                        FROM matches m
+                        JOIN players p ON p.id = m.player_id AND p.deleted_at IS NULL
+                        GROUP BY m.date, m.time, m.opponent
+                        ORDER BY m.date DESC, m.time DESC NULLS LAST, m.opponent
+                        LIMIT %s
+                    """, (limit,))
+                    return [
+                        {'date': date, 'time': time, 'opponent': opponent, 'players': players}
+                        for date, time, opponent, players in cur.fetchall()
+                    ]
+        except psycopg2.Error as e:
+            print(f"Error listing matches: {e}")
+            return []
+
+    def get_match_ratings(self, date, time, opponent):
+        """Get every rating row of one fixture, indexed by player name.
+
+        The id column identifies the rows for update_match_ratings.
+        """
+        try:
+            # Read from the primary so a correction is always made on current data
+            with self._connect() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT p.name, m.id, m.boldholder, m.medspiller, m.presspiller, m.stottespiller
+                        FROM matches m
+                        JOIN players p ON p.id = m.player_id AND p.deleted_at IS NULL
+                        WHERE m.date = %s
+                          AND m.time IS NOT DISTINCT FROM %s
+                          AND m.opponent IS NOT DISTINCT FROM %s
+                        ORDER BY p.name
+                    """, (date, time, opponent))
+                    rows = cur.fetchall()
+        except psycopg2.Error as e:
+            print(f"Error fetching match ratings: {e}")
+            rows = []
+        frame = pd.DataFrame(rows, columns=['Spiller', 'id'] + RATING_CATEGORIES)
+        return frame.set_index('Spiller')
+
+    def update_match_ratings(self, changes):
+        """Apply corrected ratings in one statement.
+
+        changes is a frame with an id column and the rating categories; rows
+        whose ratings are unchanged are left alone. Returns the number of rows
+        updated, or None on error.
+        """
+        values = [
+            (int(row['id']), *(row[category] for category in RATING_CATEGORIES))
+            for _, row in changes.iterrows()
+        ]
+        if not values:
+            return 0
+        try:
+            with self._connect(query_class='write') as conn:
+                with conn.cursor() as cur:
+                    updated = execute_values(cur, """
+                        UPDATE matches m SET
+                            boldholder = v.boldholder,
+                            medspiller = v.medspiller,
+                            presspiller = v.presspiller,
+                            stottespiller = v.stottespiller
+                        FROM (VALUES %s) AS v(id, boldholder, medspiller, presspiller, stottespiller)
+                        WHERE m.id = v.id
+                          AND (m.boldholder, m.medspiller, m.presspiller, m.stottespiller)
+                              IS DISTINCT FROM
+                              (v.boldholder, v.medspiller, v.presspiller, v.stottespiller)
+                        RETURNING m.id
+                    """, values, page_size=len(values), fetch=True)
+                    metrics.MATCH_ROWS_WRITTEN.inc(len(updated), action='update')
+                    if updated:
+                        notify(cur, 'matches', 'update', [row[0] for row in updated])
+                    self._record_write(cur)
+                    conn.commit()
+                    return len(updated)
+        except psycopg2.Error as e:
+            print(f"Error updating match ratings: {e}")
+            return None
+
     def get_player_performance(self, player_name, start_date=None, end_date=None):
         """Get performance history for a specific player within date range"""
-        query = """
+        conditions = ["p.name = %s", "p.deleted_at IS NULL"]
+        params = [player_name]
+        if start_date:
+            conditions.append("m.date >= %s")
+            params.append(start_date)
+        if end_date:
+            conditions.append("m.date <= %s")
+            params.append(end_date)
+
+        query = f"""
             SELECT 
-                m.date::date as date,
-                m.time::time as time,
+                m.date::date,
+                EXTRACT(EPOCH FROM m.time::time)::integer,
                 m.opponent,
-                m.boldholder as "Boldholder",
-                m.medspiller as "Medspiller",
-                m.presspiller as "Presspiller",
-                m.stottespiller as "Støttespiller"
+                m.boldholder,
+                m.medspiller,
+                m.presspiller,
+                m.stottespiller
             FROM matches m
             JOIN players p ON m.player_id = p.id
-            WHERE p.name = %s
+            WHERE {' AND '.join(conditions)}
             AND m.date IS NOT NULL 
             AND m.date != '1970-01-01'::date
             AND m.boldholder IN ('A', 'B', 'C', 'D')
@@ -108,36 +533,33 @@ class PostgresDataManager:
             AND m.stottespiller IN ('A', 'B', 'C', 'D')
             ORDER BY m.date::date, m.time::time
         """
-        params = [player_name]
-
-        if start_date:
-            query = query.replace("ORDER BY m.date::date, m.time::time", 
-                                "AND m.date >= %s ORDER BY m.date::date, m.time::time")
-            params.append(start_date)
-        if end_date:
-            query = query.replace("ORDER BY m.date::date, m.time::time", 
-                                "AND m.date <= %s ORDER BY m.date::date, m.time::time")
-            params.append(end_date)
 
         try:
-            with psycopg2.connect(self.conn_string) as conn:
-                df = pd.read_sql_query(query, conn, params=params)
-                if not df.empty:
-                    # Convert ratings to numeric values
-                    for category in ['Boldholder', 'Medspiller', 'Presspiller', 'Støttespiller']:
-                        df[category] = df[category].map(self.rating_map)
-                    # Keep date and time as is since they're already properly formatted by Postgres
-                    df['Date'] = df['date']
-                    df['Time'] = df['time']
-                    df = df.drop(['date', 'time'], axis=1)
-                return df
+            with self._connect(read=True, query_class='analytics') as conn:
+                with conn.cursor() as cur:
+                    cur.execute(query, params)
+                    rows = cur.fetchall()
+            if not rows:
+                return empty_player_frame()
+            # Transpose the row tuples into one column per field
+            dates, seconds, opponents, *letters = zip(*rows)
+            return build_player_frame(dates, seconds, opponents, dict(zip(RATING_CATEGORIES, letters)))
         except psycopg2.Error as e:
             print(f"Error getting player performance: {e}")
-            return pd.DataFrame()
+            return empty_player_frame()
 
     def get_team_performance(self, start_date=None, end_date=None):
         """Get team's overall performance history within date range"""
-        query = """
+        conditions = []
+        params = []
+        if start_date:
+            conditions.append("AND date >= %s")
+            params.append(start_date)
+        if end_date:
+            conditions.append("AND date <= %s")
+            params.append(end_date)
+
+        query = f"""
             WITH valid_matches AS (
                 SELECT 
                     date::date as date,
@@ -153,123 +575,173 @@ class PostgresDataManager:
                 AND medspiller IN ('A', 'B', 'C', 'D')
                 AND presspiller IN ('A', 'B', 'C', 'D')
                 AND stottespiller IN ('A', 'B', 'C', 'D')
+                AND NOT EXISTS (
+                    SELECT 1 FROM players p
+                    WHERE p.id = matches.player_id AND p.deleted_at IS NOT NULL
+                )
+                {' '.join(conditions)}
             )
             SELECT 
                 v.date,
-                v.time,
+                EXTRACT(EPOCH FROM v.time)::integer,
                 ROUND(AVG(
                     CASE v.boldholder 
                         WHEN 'A' THEN 4.0 
                         WHEN 'B' THEN 3.0 
                         WHEN 'C' THEN 2.0 
                         WHEN 'D' THEN 1.0 
-                    END)::numeric, 2) as "Boldholder",
+                    END)::numeric, 2)::float8,
                 ROUND(AVG(
                     CASE v.medspiller 
                         WHEN 'A' THEN 4.0 
                         WHEN 'B' THEN 3.0 
                         WHEN 'C' THEN 2.0 
                         WHEN 'D' THEN 1.0 
-                    END)::numeric, 2) as "Medspiller",
+                    END)::numeric, 2)::float8,
                 ROUND(AVG(
                     CASE v.presspiller 
                         WHEN 'A' THEN 4.0 
                         WHEN 'B' THEN 3.0 
                         WHEN 'C' THEN 2.0 
                         WHEN 'D' THEN 1.0 
-                    END)::numeric, 2) as "Presspiller",
+                    END)::numeric, 2)::float8,
                 ROUND(AVG(
                     CASE v.stottespiller 
                         WHEN 'A' THEN 4.0 
                         WHEN 'B' THEN 3.0 
                         WHEN 'C' THEN 2.0 
                         WHEN 'D' THEN 1.0 
-                    END)::numeric, 2) as "Støttespiller"
+                    END)::numeric, 2)::float8
             FROM valid_matches v
             GROUP BY v.date, v.time
             HAVING COUNT(*) > 0
             ORDER BY v.date, v.time
         """
-        params = []
-
-        if start_date:
-            query = query.replace("ORDER BY v.date, v.time", "AND v.date >= %s ORDER BY v.date, v.time")
-            params.append(start_date)
-        if end_date:
-            query = query.replace("ORDER BY v.date, v.time", "AND v.date <= %s ORDER BY v.date, v.time")
-            params.append(end_date)
 
         try:
-            with psycopg2.connect(self.conn_string) as conn:
-                df = pd.read_sql_query(query, conn, params=params)
-                if not df.empty:
-                    # Set MultiIndex with date and time
-                    df.set_index(['date', 'time'], inplace=True)
-                return df
+            with self._connect(read=True, query_class='analytics') as conn:
+                with conn.cursor() as cur:
+                    cur.execute(query, params)
+                    rows = cur.fetchall()
+            if not rows:
+                return pd.DataFrame()
+            dates, seconds, *averages = zip(*rows)
+            return build_team_frame(dates, seconds, dict(zip(RATING_CATEGORIES, averages)))
         except psycopg2.Error as e:
             print(f"Error getting team performance: {e}")
             return pd.DataFrame()
 
+    def get_player_index(self):
+        """Get (id, name) pairs for all players that are not deleted"""
+        try:
+            with self._connect(read=True, query_class='analytics') as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT id, name FROM players WHERE deleted_at IS NULL ORDER BY id")
+                    return cur.fetchall()
+        except psycopg2.Error as e:
+            print(f"Error getting player index: {e}")
+            return []
+
+    def get_pending_deletions(self):
+        """Get deleted players whose match rows are still being purged"""
+        try:
+            with self._connect(query_class='maintenance') as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT p.name, p.deleted_at,
+                               (SELECT COUNT(*) FROM matches m WHERE m.player_id = p.id)
+                        FROM players p
+                        WHERE p.deleted_at IS NOT NULL
+                        ORDER BY p.deleted_at
+                    """)
+                    return [
+                        {'name': name, 'deleted_at': deleted_at, 'remaining_rows': remaining}
+                        for name, deleted_at, remaining in cur.fetchall()
+                    ]
+        except psycopg2.Error as e:
+            print(f"Error getting pending deletions: {e}")
+            return []
+
+    def get_max_match_id(self):
+        """Get the highest match row id, 0 if there are no matches or None on error"""
+        try:
+            # Always ask the primary so a lagging replica is not mistaken for a reset
+            with self._connect() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT COALESCE(MAX(id), 0) FROM matches")
+                    return cur.fetchone()[0]
+        except psycopg2.Error as e:
+            print(f"Error getting max match id: {e}")
+            return None
+
+    def get_rating_columns(self, after_id=0):
+        """Get all valid rating rows with id > after_id as NumPy columns"""
+        query = """
+            SELECT 
+                m.id,
+                m.player_id,
+                m.date::date,
+                EXTRACT(EPOCH FROM m.time::time)::integer,
+                m.opponent,
+                m.boldholder,
+                m.medspiller,
+                m.presspiller,
+                m.stottespiller
+            FROM matches m
+            WHERE m.id > %s
+            AND m.date IS NOT NULL 
+            AND m.date != '1970-01-01'::date
+            AND m.boldholder IN ('A', 'B', 'C', 'D')
+            AND m.medspiller IN ('A', 'B', 'C', 'D')
+            AND m.presspiller IN ('A', 'B', 'C', 'D')
+            AND m.stottespiller IN ('A', 'B', 'C', 'D')
+            ORDER BY m.id
+        """
+        try:
+            with self._connect(read=True, query_class='analytics') as conn:
+                with conn.cursor() as cur:
+                    cur.execute(query, (after_id,))
+                    rows = cur.fetchall()
+            return rating_columns_from_rows(rows)
+        except psycopg2.Error as e:
+            print(f"Error getting rating columns: {e}")
+            return None
+
     def get_available_seasons(self):
         """Get list of available seasons (years) from match data"""
         try:
-            with psycopg2.connect(self.conn_string) as conn:
+            with self._connect(read=True, query_class='analytics') as conn:
                 with conn.cursor() as cur:
-                    cur.execute("SELECT DISTINCT EXTRACT(YEAR FROM date) FROM matches ORDER BY 1")
+                    cur.execute("""
+                        SELECT DISTINCT EXTRACT(YEAR FROM m.date)
+                        FROM matches m
+                        JOIN players p ON p.id = m.player_id AND p.deleted_at IS NULL
+                        ORDER BY 1
+                    """)
                     return [int(year[0]) for year in cur.fetchall()]
         except psycopg2.Error as e:
             print(f"Error getting available seasons: {e}")
             return []
 
-    def generate_test_data(self, username):
-        """Generate test data for a specific user"""
-        # Generate 10 test players
-        test_players = [f"Test{i}" for i in range(1, 11)]
-        for player in test_players:
-            self.add_player(player, "Not specified")
-
-        # Generate 5 matches
-        match_data = [
-            # Two matches on the same day
-            (datetime(2025, 2, 25, 9, 0), "Morning Team"),
-            (datetime(2025, 2, 25, 15, 0), "Afternoon Team"),
-            # Three matches on different days
-            (datetime(2025, 2, 23, 12, 0), "Team Alpha"),
-            (datetime(2025, 2, 24, 14, 0), "Team Beta"),
-            (datetime(2025, 2, 26, 10, 0), "Team Gamma")
-        ]
-
-        # Performance ratings (A, B, C, D) for each role
-        roles = ['Boldholder', 'Medspiller', 'Presspiller', 'Støttespiller']
-        ratings = ['A', 'B', 'C', 'D']
-
-        players_df = self.get_players()
-
-        for match_date, opponent in match_data:
-            # Generate random ratings for each player
-            player_ratings = {}
-            for role in roles:
-                player_ratings[role] = {
-                    player: ratings[hash(f"{player}{role}{match_date}") % len(ratings)]
-                    for player in test_players[:5]  # Use 5 players per match
-                }
-
-            # Add match record
-            self.add_match_record(
-                match_date.date(),
-                match_date.time(),
-                opponent,
-                players_df[players_df['Name'].isin(test_players[:5])],
-                player_ratings
-            )
+    def load_dataset(self, dataset):
+        """Insert a synthetic_data dataset with COPY; returns (players added, rows added) or None on error"""
+        try:
+            with self._connect(query_class='maintenance') as conn:
+                return load_dataset(conn, dataset)
+        except psycopg2.Error as e:
+            print(f"Error loading dataset: {e}")
+            return None
 
     def reset_data(self):
         """Reset all data in the system"""
         try:
-            with psycopg2.connect(self.conn_string) as conn:
+            with self._connect(query_class='maintenance') as conn:
                 with conn.cursor() as cur:
                     cur.execute("TRUNCATE TABLE matches CASCADE")
+                    cur.execute("TRUNCATE TABLE match_submissions")
                     cur.execute("TRUNCATE TABLE players CASCADE")
+                    notify(cur, 'all', 'reset')
+                    self._record_write(cur)
                     conn.commit()
                     return True
         except psycopg2.Error as e:
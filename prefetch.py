@@ -0,0 +1,110 @@
+"""Run the independent reads of a page render concurrently.
+
+A page submits the reads it will need up front, then asks for each result
+where it renders it, so the render waits roughly as long as its slowest
+read instead of their sum. A read that has not started by the time it is
+needed runs in the calling thread instead, so a busy pool never makes a page
+slower than reading one query after another.
+
+With PREFETCH_ADJACENT=1 a page may also speculate on what the user picks
+next (the next player or season). Those reads are kept in the session for
+SPECULATION_MAX_AGE seconds and picked up by the next rerun.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Reads run concurrently across all sessions of this process; 0 disables prefetching
+PREFETCH_WORKERS = int(os.environ.get('PREFETCH_WORKERS', '4'))
+PREFETCH_ADJACENT = os.environ.get('PREFETCH_ADJACENT', '').lower() in ('1', 'true', 'yes')
+SPECULATION_MAX_AGE = 30
+SPECULATION_MAX_ENTRIES = 8
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Get the process-wide prefetch thread pool, or None when disabled"""
+    global _executor
+    if PREFETCH_WORKERS <= 0:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix='prefetch')
+        return _executor
+
+
+def _in_script_context(fn):
+    """Wrap fn to run with the calling script's context, so st.session_state works in the pool"""
+    try:
+        from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+    except ImportError:
+        return fn
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is None:
+        return fn
+
+    def run(*args):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(*args)
+    return run
+
+
+class Prefetcher:
+    """Reads of one page render, keyed by method name and arguments"""
+
+    def __init__(self, session=None):
+        # Holds speculative reads between reruns (e.g. st.session_state)
+        self.session = session if session is not None else {}
+        self._futures = {}
+
+    def _start(self, fn, args):
+        executor = get_executor()
+        if executor is None:
+            return None
+        return executor.submit(_in_script_context(fn), *args)
+
+    def _speculated(self, key):
+        """Take a speculative read of an earlier rerun, unless it is too old"""
+        started, future = self.session.get('prefetch', {}).pop(key, (0, None))
+        if future is not None and time.monotonic() - started <= SPECULATION_MAX_AGE:
+            return future
+        return None
+
+    def submit(self, fn, *args):
+        """Start fn(*args) in the background for a later result(fn, *args)"""
+        key = (fn.__name__, args)
+        if key not in self._futures:
+            future = self._speculated(key) or self._start(fn, args)
+            if future is not None:
+                self._futures[key] = future
+
+    def speculate(self, fn, *args):
+        """Start fn(*args) for a later rerun, if PREFETCH_ADJACENT is on"""
+        if not PREFETCH_ADJACENT:
+            return
+        speculated = self.session.setdefault('prefetch', {})
+        key = (fn.__name__, args)
+        now = time.monotonic()
+        for old_key in [k for k, (started, _) in speculated.items() if now - started > SPECULATION_MAX_AGE]:
+            del speculated[old_key]
+        if key in speculated:
+            return
+        future = self._start(fn, args)
+        if future is None:
+            return
+        speculated[key] = (now, future)
+        while len(speculated) > SPECULATION_MAX_ENTRIES:
+            oldest = min(speculated, key=lambda k: speculated[k][0])
+            speculated.pop(oldest)[1].cancel()
+
+    def result(self, fn, *args):
+        """Join the prefetched fn(*args), or call it here if it was not started"""
+        key = (fn.__name__, args)
+        future = self._futures.pop(key, None) or self._speculated(key)
+        # cancel() only succeeds while the read is still queued
+        if future is None or future.cancel():
+            return fn(*args)
+        return future.result()
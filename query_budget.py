@@ -0,0 +1,49 @@
+"""Latency budgets per query class.
+
+Every data layer call belongs to a class: interactive page reads, analytics
+(development charts, season lists, the ratings store), writes and admin
+maintenance. A class's budget is a statement timeout and a lock wait timeout,
+applied to the borrowed connection (Postgres statement_timeout/lock_timeout,
+a progress handler and busy timeout on SQLite). Override them in milliseconds
+with STATEMENT_TIMEOUT_<CLASS>_MS and LOCK_TIMEOUT_<CLASS>_MS; 0 disables.
+"""
+import os
+import sqlite3
+
+# (statement timeout ms, lock timeout ms)
+DEFAULT_BUDGETS = {
+    'interactive': (2_000, 1_000),
+    'analytics': (10_000, 1_000),
+    'write': (5_000, 2_000),
+    'maintenance': (600_000, 5_000),
+}
+
+# Postgres query_canceled and lock_not_available
+_CANCEL_SQLSTATES = ('57014', '55P03')
+# What SQLite reports when the progress handler or the busy timeout gives up
+_SQLITE_MESSAGES = ('interrupted', 'database is locked')
+
+
+def budget(query_class):
+    """(statement timeout ms, lock timeout ms) of a query class"""
+    statement_ms, lock_ms = DEFAULT_BUDGETS[query_class]
+    name = query_class.upper()
+    statement_ms = int(os.environ.get(f'STATEMENT_TIMEOUT_{name}_MS', statement_ms))
+    lock_ms = int(os.environ.get(f'LOCK_TIMEOUT_{name}_MS', lock_ms))
+    return statement_ms, lock_ms
+
+
+def exceeded(error):
+    """Whether a database error means a statement ran out of its budget"""
+    if getattr(error, 'pgcode', None) in _CANCEL_SQLSTATES:
+        return True
+    return isinstance(error, sqlite3.OperationalError) and str(error) in _SQLITE_MESSAGES
+
+
+class QueryBudgetExceeded(Exception):
+    """A read was cancelled for exceeding its budget; result is what the backend returned instead"""
+
+    def __init__(self, query_class, result=None):
+        super().__init__(f"{query_class} query exceeded its latency budget")
+        self.query_class = query_class
+        self.result = result
@@ -0,0 +1,86 @@
+import threading
+import time
+from collections import OrderedDict
+
+import cache_events
+import metrics
+
+
+class QueryCache:
+    """Process-wide TTL cache for small, frequently read query results.
+
+    Entries are grouped by the database entity they depend on ('players',
+    'matches', ...) so a write only evicts the results it can affect.
+
+    Separately, the last good result of up to max_stale reads is kept through
+    writes and expiry, to show when a read runs out of its latency budget.
+    """
+
+    def __init__(self, ttl=60, max_stale=256):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self._entries = {}
+        self._last_good = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, entity, key, loader):
+        """Return the cached value for (entity, key), calling loader on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((entity, key))
+        if entry and now - entry[0] < self.ttl:
+            metrics.CACHE_REQUESTS.inc(result='hit')
+            return entry[1]
+        metrics.CACHE_REQUESTS.inc(result='miss')
+        value = loader()
+        with self._lock:
+            self._entries[(entity, key)] = (now, value)
+        self.remember(entity, key, value)
+        return value
+
+    def remember(self, entity, key, value):
+        """Keep value as the last good result for (entity, key)"""
+        with self._lock:
+            self._last_good[(entity, key)] = value
+            self._last_good.move_to_end((entity, key))
+            while len(self._last_good) > self.max_stale:
+                self._last_good.popitem(last=False)
+
+    def last_good(self, entity, key):
+        """The last good result for (entity, key), however old, or None"""
+        with self._lock:
+            value = self._last_good.get((entity, key))
+        if value is not None:
+            metrics.CACHE_REQUESTS.inc(result='stale')
+        return value
+
+    def evict(self, entity):
+        """Drop all entries depending on entity ('all' drops everything)"""
+        with self._lock:
+            if entity == 'all':
+                self._entries.clear()
+                self._last_good.clear()
+            else:
+                for cache_key in [k for k in self._entries if k[0] == entity]:
+                    del self._entries[cache_key]
+
+    def handle_event(self, event):
+        """Evict entries affected by a cache event from another instance"""
+        self.evict(event['entity'])
+        # Deleting a player cascades to their match rows
+        if event['entity'] == 'players' and event['action'] == 'delete':
+            self.evict('matches')
+
+
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache():
+    """Get the process-wide query cache, subscribed to cache events"""
+    global _query_cache
+    with _query_cache_lock:
+        if _query_cache is None:
+            _query_cache = QueryCache()
+            cache_events.subscribe('*', _query_cache.handle_event)
+        return _query_cache
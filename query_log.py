@@ -0,0 +1,226 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime
+
+import psycopg2
+import psycopg2.extensions
+
+import instrumentation
+
+# Statements slower than this are logged (milliseconds)
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))
+# Number of slow statements and captured plans kept in memory
+SLOW_QUERY_LOG_SIZE = int(os.environ.get('SLOW_QUERY_LOG_SIZE', '200'))
+# Plans are estimates (plain EXPLAIN) unless this is set; EXPLAIN ANALYZE runs
+# the slow statement a second time
+SLOW_QUERY_EXPLAIN_ANALYZE = os.environ.get('SLOW_QUERY_EXPLAIN_ANALYZE', '').lower() in ('1', 'true', 'yes')
+
+_entries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+_plans = {}
+_lock = threading.Lock()
+
+# Statements run in this context while capture() is active
+_captured = ContextVar('query_log_captured', default=None)
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"%\(\w+\)s|%s")
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ROWS_RE = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    """Reduce a statement to its shape: literals and placeholders become ?, lists (...)"""
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    sql = _STRING_RE.sub('?', sql)
+    sql = _PLACEHOLDER_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _LIST_RE.sub('(...)', sql)
+    sql = _ROWS_RE.sub('(...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def _value_shape(value):
+    if isinstance(value, (list, tuple)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+
+def param_shape(params):
+    """Describe parameters by type (and length for sequences) without their values"""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: _value_shape(value) for key, value in params.items()}
+    return [_value_shape(value) for value in params]
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+class TimedCursorMixin:
+    """Times execute/executemany and logs statements over SLOW_QUERY_MS"""
+
+    def execute(self, query, vars=None):
+        captured = _captured.get()
+        if captured is not None:
+            captured.append((instrumentation.current_method.get(), query, vars))
+        start = time.perf_counter()
+        try:
+            result = super().execute(query, vars)
+        except Exception:
+            self._check(query, vars, time.perf_counter() - start, failed=True)
+            raise
+        self._check(query, vars, time.perf_counter() - start)
+        return result
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            result = super().executemany(query, vars_list)
+        except Exception:
+            self._check(query, None, time.perf_counter() - start, failed=True)
+            raise
+        self._check(query, None, time.perf_counter() - start)
+        return result
+
+    def _check(self, query, vars, seconds, failed=False):
+        if seconds * 1000 >= SLOW_QUERY_MS:
+            _record(self.connection, query, vars, seconds, failed)
+
+
+class TimedCursor(TimedCursorMixin, psycopg2.extensions.cursor):
+    """Default cursor of pooled connections"""
+
+
+_timed_factories = {}
+
+
+class TimedConnection(psycopg2.extensions.connection):
+    """Connection whose cursors (including DictCursor) feed the slow-query log"""
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get('cursor_factory') or TimedCursor
+        if not issubclass(factory, TimedCursorMixin):
+            timed = _timed_factories.get(factory)
+            if timed is None:
+                timed = _timed_factories[factory] = type(f"Timed{factory.__name__}", (TimedCursorMixin, factory), {})
+            factory = timed
+        kwargs['cursor_factory'] = factory
+        return super().cursor(*args, **kwargs)
+
+
+def _explain(conn, query, vars):
+    """EXPLAIN a read statement inside a savepoint; None if it fails"""
+    sql = query.decode('utf-8', 'replace') if isinstance(query, bytes) else query
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    in_transaction = not conn.autocommit and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    # A plain cursor so the EXPLAIN itself is not logged
+    cur = psycopg2.extensions.cursor(conn)
+    try:
+        if in_transaction:
+            cur.execute("SAVEPOINT query_log_explain")
+        explain = "EXPLAIN (ANALYZE, BUFFERS) " if SLOW_QUERY_EXPLAIN_ANALYZE else "EXPLAIN "
+        cur.execute(explain + sql, vars)
+        plan = "\n".join(row[0] for row in cur.fetchall())
+        if in_transaction:
+            cur.execute("RELEASE SAVEPOINT query_log_explain")
+        return plan
+    except psycopg2.Error as e:
+        if in_transaction:
+            try:
+                cur.execute("ROLLBACK TO SAVEPOINT query_log_explain")
+            except psycopg2.Error:
+                pass
+        print(f"Error explaining slow query: {e}")
+        return None
+    finally:
+        cur.close()
+
+
+def _record(conn, query, vars, seconds, failed=False):
+    normalized = normalize_sql(query)
+    fingerprint = hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:12]
+
+    with _lock:
+        first = fingerprint not in _plans
+    # A failed statement leaves its transaction aborted; its shape is
+    # explained the next time it is slow and succeeds
+    plan = _explain(conn, query, vars) if first and not failed else None
+    if plan:
+        with _lock:
+            _plans[fingerprint] = plan
+            if len(_plans) > SLOW_QUERY_LOG_SIZE:
+                _plans.pop(next(iter(_plans)))
+
+    entry = {
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'fingerprint': fingerprint,
+        'duration_ms': round(seconds * 1000, 2),
+        'caller': instrumentation.current_method.get(),
+        'sql': normalized,
+        'params': param_shape(vars),
+        'plan': plan,
+        'failed': failed,
+    }
+    with _lock:
+        _entries.append(entry)
+
+
+@contextmanager
+def capture():
+    """Collect every statement run on pooled connections in this context as (caller, sql, vars)"""
+    statements = []
+    token = _captured.set(statements)
+    try:
+        yield statements
+    finally:
+        _captured.reset(token)
+
+
+def entries():
+    """Logged slow statements, oldest first"""
+    with _lock:
+        return list(_entries)
+
+
+def get_plan(fingerprint):
+    """The plan captured for a statement shape, if any"""
+    return _plans.get(fingerprint)
+
+
+def to_jsonl():
+    """The log as JSON lines"""
+    return "".join(
+        json.dumps(entry, ensure_ascii=False, default=_json_default) + "\n"
+        for entry in entries()
+    )
+
+
+def export_jsonl(path):
+    """Append the log to a JSON lines file; returns the number of entries written"""
+    logged = entries()
+    with open(path, 'a', encoding='utf-8') as f:
+        for entry in logged:
+            f.write(json.dumps(entry, ensure_ascii=False, default=_json_default) + "\n")
+    return len(logged)
+
+
+def clear():
+    """Forget logged statements and captured plans"""
+    with _lock:
+        _entries.clear()
+        _plans.clear()
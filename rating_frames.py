@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+from instrumentation import timed
+
+RATING_CATEGORIES = ['Boldholder', 'Medspiller', 'Presspiller', 'Støttespiller']
+
+# Lookup table from the byte value of a grade letter to its numeric rating
+_RATING_LOOKUP = np.zeros(256, dtype=np.int8)
+for _letter, _value in {'A': 4, 'B': 3, 'C': 2, 'D': 1}.items():
+    _RATING_LOOKUP[ord(_letter)] = _value
+
+
+def ratings_to_int8(letters):
+    """Convert a sequence of letter grades (A-D) to an int8 array of 4-1"""
+    codes = np.asarray(letters, dtype='S1').view(np.uint8)
+    return _RATING_LOOKUP[codes]
+
+
+def dates_to_datetime64(dates):
+    """Convert a sequence of datetime.date values to datetime64[ns]"""
+    return np.asarray(dates, dtype='datetime64[D]').astype('datetime64[ns]')
+
+
+def seconds_to_timedelta64(seconds):
+    """Convert seconds since midnight to timedelta64[ns] times of day (None becomes NaT)"""
+    return pd.to_timedelta(np.asarray(seconds, dtype=np.float64), unit='s').to_numpy()
+
+
+def empty_player_frame():
+    """Empty player performance frame with the same dtypes as a filled one"""
+    return build_player_frame([], [], [], {category: [] for category in RATING_CATEGORIES})
+
+
+@timed('rating_frames.build_player_frame')
+def build_player_frame(dates, seconds, opponents, ratings):
+    """Build a compact player performance frame.
+
+    ratings maps each category to either letter grades or numeric int8 values.
+    """
+    data = {'opponent': pd.Categorical(opponents)}
+    for category in RATING_CATEGORIES:
+        values = ratings[category]
+        if not isinstance(values, np.ndarray):
+            values = ratings_to_int8(values) if len(values) else np.empty(0, dtype=np.int8)
+        data[category] = values.astype(np.int8, copy=False)
+    data['Date'] = dates_to_datetime64(dates)
+    data['Time'] = seconds_to_timedelta64(seconds)
+    return pd.DataFrame(data)
+
+
+@timed('rating_frames.build_team_frame')
+def build_team_frame(dates, seconds, averages):
+    """Build the team performance frame indexed by (date, time)"""
+    index = pd.MultiIndex.from_arrays(
+        [dates_to_datetime64(dates), seconds_to_timedelta64(seconds)],
+        names=['date', 'time']
+    )
+    data = {
+        category: np.asarray(averages[category], dtype=np.float64)
+        for category in RATING_CATEGORIES
+    }
+    return pd.DataFrame(data, index=index)
+
+
+@timed('rating_frames.build_players_frame')
+def build_players_frame(names, positions):
+    """Build the roster frame with categorical name and position columns"""
+    return pd.DataFrame({
+        'Name': pd.Categorical(names),
+        'Position': pd.Categorical(positions)
+    })
+
+
+@timed('rating_frames.rating_columns_from_rows')
+def rating_columns_from_rows(rows):
+    """Transpose (id, player_id, date, seconds, opponent, *letters) rows into NumPy columns"""
+    if rows:
+        ids, player_ids, dates, seconds, opponents, *letters = zip(*rows)
+    else:
+        ids = player_ids = dates = seconds = opponents = ()
+        letters = [()] * len(RATING_CATEGORIES)
+    # Rows without a kick-off time are placed at midnight of the match date
+    times = seconds_to_timedelta64(seconds)
+    times = np.where(np.isnat(times), np.timedelta64(0, 'ns'), times)
+    columns = {
+        'id': np.asarray(ids, dtype=np.int64),
+        'player_id': np.asarray(player_ids, dtype=np.int32),
+        'timestamp': dates_to_datetime64(dates) + times,
+        'opponent': list(opponents),
+    }
+    for category, values in zip(RATING_CATEGORIES, letters):
+        columns[category] = ratings_to_int8(values) if values else np.empty(0, dtype=np.int8)
+    return columns
@@ -0,0 +1,342 @@
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import cache_events
+from instrumentation import instrument_class
+from rating_frames import (
+    RATING_CATEGORIES,
+    build_player_frame,
+    build_team_frame,
+    empty_player_frame,
+)
+
+# Bump when the on-disk snapshot layout changes; older snapshots are ignored
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_KEEP = 2
+
+# Match ids are taken when a save starts but become visible when it commits,
+# so concurrent saves can commit out of id order. Each refresh re-reads this
+# many ids below the high-water mark to pick up such late rows, and a full
+# reload every RECONCILE_SECONDS catches anything later still.
+LATE_ROW_WINDOW = 2_000
+RECONCILE_SECONDS = 600
+
+# File-name safe column names for the rating categories
+_SNAPSHOT_RATING_FILES = {
+    'Boldholder': 'boldholder',
+    'Medspiller': 'medspiller',
+    'Presspiller': 'presspiller',
+    'Støttespiller': 'stottespiller',
+}
+
+
+@instrument_class
+class RatingsStore:
+    """In-process columnar copy of all valid match ratings.
+
+    Rows are held as parallel NumPy arrays (one entry per player per match)
+    and answer the analysis queries by vectorized slicing. The store is loaded
+    once and then refreshed incrementally with rows whose id is above the
+    high-water mark minus LATE_ROW_WINDOW, and fully reloaded every
+    reconcile_interval seconds.
+    """
+
+    def __init__(self, db, max_age=30, snapshot_dir=None, reconcile_interval=RECONCILE_SECONDS):
+        self.db = db
+        self.max_age = max_age
+        self.snapshot_dir = snapshot_dir
+        self.reconcile_interval = reconcile_interval
+        self._lock = threading.RLock()
+        self._needs_reload = True
+        self._needs_refresh = False
+        self._refreshed_at = 0.0
+        self._reloaded_at = 0.0
+        self._clear()
+
+    def _clear(self):
+        """Drop all rows and reset the high-water mark"""
+        self.match_ids = np.empty(0, dtype=np.int64)
+        self.player_ids = np.empty(0, dtype=np.int32)
+        self.timestamps = np.empty(0, dtype='datetime64[ns]')
+        self.opponent_codes = np.empty(0, dtype=np.int32)
+        self.ratings = {category: np.empty(0, dtype=np.int8) for category in RATING_CATEGORIES}
+        self.opponents = []
+        self._opponent_codes = {}
+        self.players = {}
+        self.high_water_mark = 0
+
+    def invalidate(self):
+        """Force a full reload on next access (after deletes or resets)"""
+        self._needs_reload = True
+
+    def mark_dirty(self):
+        """Fetch new rows on next access (after inserts)"""
+        self._needs_refresh = True
+
+    def handle_event(self, event):
+        """Evict what a cache event from another instance affects"""
+        if event['entity'] in ('matches', 'players') and event['action'] in ('insert', 'delete'):
+            # New rows are fetched incrementally; rows of deleted players drop
+            # out when the player index is refreshed
+            self.mark_dirty()
+        else:
+            self.invalidate()
+
+    def ensure_fresh(self):
+        """Load or incrementally refresh the store if it is out of date"""
+        with self._lock:
+            if self._needs_reload or time.monotonic() - self._reloaded_at > self.reconcile_interval:
+                self.reload()
+            elif self._needs_refresh or time.monotonic() - self._refreshed_at > self.max_age:
+                self.refresh()
+
+    def reload(self):
+        """Discard all rows and load the full table"""
+        with self._lock:
+            self._clear()
+            self._needs_reload = False
+            self._reloaded_at = time.monotonic()
+            self.refresh()
+            if self.snapshot_dir:
+                self.save_snapshot(self.snapshot_dir)
+
+    def refresh(self):
+        """Fetch players and rating rows near or above the high-water mark"""
+        with self._lock:
+            self.db.budget_exceeded = None
+            players = self.db.get_player_index()
+            # Keep serving the rows already loaded and retry on the next read
+            if self.db.budget_exceeded:
+                return
+            self.players = {name: player_id for player_id, name in players}
+
+            # A max id below the high-water mark means the table was reset; a
+            # failed check is not a reset, so keep the rows and retry later
+            max_id = self.db.get_max_match_id()
+            if max_id is None or self.db.budget_exceeded:
+                return
+            if max_id < self.high_water_mark:
+                self._clear()
+                self.players = {name: player_id for player_id, name in self.db.get_player_index()}
+
+            after_id = max(0, self.high_water_mark - LATE_ROW_WINDOW)
+            columns = self.db.get_rating_columns(after_id=after_id)
+            if columns is None:
+                return
+            self._append(columns, after_id)
+            self._needs_refresh = False
+            self._refreshed_at = time.monotonic()
+
+    def _append(self, columns, after_id=0):
+        """Append fetched columns to the store, skipping rows above after_id it already holds"""
+        known = np.isin(columns['id'], self.match_ids[self.match_ids > after_id])
+        if known.any():
+            new = ~known
+            columns = {
+                name: [value for value, keep in zip(values, new) if keep] if isinstance(values, list) else values[new]
+                for name, values in columns.items()
+            }
+        if not len(columns['id']):
+            return
+
+        codes = np.empty(len(columns['opponent']), dtype=np.int32)
+        for i, opponent in enumerate(columns['opponent']):
+            code = self._opponent_codes.get(opponent)
+            if code is None:
+                code = self._opponent_codes[opponent] = len(self.opponents)
+                self.opponents.append(opponent)
+            codes[i] = code
+
+        self.match_ids = np.concatenate([self.match_ids, columns['id']])
+        self.player_ids = np.concatenate([self.player_ids, columns['player_id']])
+        self.timestamps = np.concatenate([self.timestamps, columns['timestamp']])
+        self.opponent_codes = np.concatenate([self.opponent_codes, codes])
+        for category in RATING_CATEGORIES:
+            self.ratings[category] = np.concatenate([self.ratings[category], columns[category]])
+        self.high_water_mark = max(self.high_water_mark, int(columns['id'].max()))
+
+    def save_snapshot(self, directory):
+        """Write the store as versioned .npy columns plus a manifest.
+
+        Each snapshot goes into its own version directory; the top-level
+        manifest.json pointing at it is replaced atomically.
+        """
+        with self._lock:
+            version = f"v{self.high_water_mark}-{os.getpid()}-{int(time.time())}"
+            version_dir = os.path.join(directory, version)
+            os.makedirs(version_dir, exist_ok=True)
+
+            columns = {
+                'match_ids': self.match_ids,
+                'player_ids': self.player_ids,
+                'timestamps': self.timestamps,
+                'opponent_codes': self.opponent_codes,
+            }
+            for category, file_name in _SNAPSHOT_RATING_FILES.items():
+                columns[file_name] = self.ratings[category]
+            for name, values in columns.items():
+                np.save(os.path.join(version_dir, f"{name}.npy"), np.ascontiguousarray(values))
+
+            manifest = {
+                'format': SNAPSHOT_FORMAT,
+                'version': version,
+                'data_version': self.high_water_mark,
+                'rows': int(len(self.match_ids)),
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'columns': sorted(columns),
+                'opponents': self.opponents,
+            }
+            with open(os.path.join(version_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False)
+
+        pointer_path = os.path.join(directory, 'manifest.json')
+        tmp_path = f"{pointer_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'format': SNAPSHOT_FORMAT, 'current': version}, f)
+        os.replace(tmp_path, pointer_path)
+
+        self._prune_snapshots(directory, version)
+        return version
+
+    def _prune_snapshots(self, directory, current):
+        """Remove all but the newest SNAPSHOT_KEEP version directories"""
+        versions = sorted(
+            (entry for entry in os.scandir(directory) if entry.is_dir() and entry.name.startswith('v')),
+            key=lambda entry: entry.stat().st_mtime,
+            reverse=True
+        )
+        for entry in versions[SNAPSHOT_KEEP:]:
+            if entry.name != current:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def load_snapshot(self, directory):
+        """Memory-map the current snapshot; returns False if none is usable.
+
+        Rows written after the snapshot are fetched by the next refresh.
+        """
+        pointer_path = os.path.join(directory, 'manifest.json')
+        if not os.path.exists(pointer_path):
+            return False
+        try:
+            with open(pointer_path, encoding='utf-8') as f:
+                pointer = json.load(f)
+            if pointer.get('format') != SNAPSHOT_FORMAT:
+                return False
+            version_dir = os.path.join(directory, pointer['current'])
+            with open(os.path.join(version_dir, 'manifest.json'), encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('format') != SNAPSHOT_FORMAT:
+                return False
+            columns = {
+                name: np.load(os.path.join(version_dir, f"{name}.npy"), mmap_mode='r')
+                for name in manifest['columns']
+            }
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error loading ratings snapshot: {e}")
+            return False
+
+        with self._lock:
+            self._clear()
+            self.match_ids = columns['match_ids']
+            self.player_ids = columns['player_ids']
+            self.timestamps = columns['timestamps']
+            self.opponent_codes = columns['opponent_codes']
+            for category, file_name in _SNAPSHOT_RATING_FILES.items():
+                self.ratings[category] = columns[file_name]
+            self.opponents = list(manifest['opponents'])
+            self._opponent_codes = {opponent: code for code, opponent in enumerate(self.opponents)}
+            self.high_water_mark = manifest['data_version']
+            self._needs_reload = False
+            self._needs_refresh = True
+            # The first refresh re-reads LATE_ROW_WINDOW ids below data_version
+            self._reloaded_at = time.monotonic()
+        return True
+
+    def _date_mask(self, start_date, end_date):
+        """Boolean mask of rows within the inclusive date range"""
+        days = self.timestamps.astype('datetime64[D]')
+        mask = np.ones(len(days), dtype=bool)
+        if start_date:
+            mask &= days >= np.datetime64(start_date, 'D')
+        if end_date:
+            mask &= days <= np.datetime64(end_date, 'D')
+        return mask
+
+    def _split_timestamps(self, timestamps):
+        """Split timestamps into match dates and seconds since midnight"""
+        dates = timestamps.astype('datetime64[D]')
+        seconds = (timestamps - dates) // np.timedelta64(1, 's')
+        return dates, seconds
+
+    def get_player_performance(self, player_name, start_date=None, end_date=None):
+        """Get performance history for a specific player within date range"""
+        self.ensure_fresh()
+        with self._lock:
+            player_id = self.players.get(player_name)
+            if player_id is None:
+                return empty_player_frame()
+
+            mask = (self.player_ids == player_id) & self._date_mask(start_date, end_date)
+            rows = np.flatnonzero(mask)
+            rows = rows[np.argsort(self.timestamps[rows], kind='stable')]
+
+            dates, seconds = self._split_timestamps(self.timestamps[rows])
+            opponents = np.asarray(self.opponents, dtype=object)[self.opponent_codes[rows]]
+            ratings = {category: self.ratings[category][rows] for category in RATING_CATEGORIES}
+        return build_player_frame(dates, seconds, opponents, ratings)
+
+    def get_team_performance(self, start_date=None, end_date=None):
+        """Get team's average ratings per match within date range"""
+        self.ensure_fresh()
+        with self._lock:
+            active = np.isin(self.player_ids, np.fromiter(self.players.values(), dtype=np.int32))
+            rows = np.flatnonzero(active & self._date_mask(start_date, end_date))
+            if not len(rows):
+                return pd.DataFrame()
+
+            # Group rows by match timestamp and average each role
+            match_times, group = np.unique(self.timestamps[rows], return_inverse=True)
+            counts = np.bincount(group)
+            averages = {}
+            for category in RATING_CATEGORIES:
+                means = np.bincount(group, weights=self.ratings[category][rows]) / counts
+                averages[category] = np.floor(means * 100 + 0.5) / 100  # round half up like SQL ROUND
+
+        dates, seconds = self._split_timestamps(match_times)
+        return build_team_frame(dates, seconds, averages)
+
+    def get_available_seasons(self):
+        """Get list of available seasons (years) from match data"""
+        self.ensure_fresh()
+        with self._lock:
+            years = self.timestamps.astype('datetime64[Y]').astype(np.int64) + 1970
+            return [int(year) for year in np.unique(years)]
+
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+
+def get_shared_store(db, snapshot_dir=None):
+    """Get the process-wide ratings store, creating it on first use.
+
+    With a snapshot directory, a new store starts from the mapped snapshot
+    and only catches up on newer rows from the database.
+    """
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            _shared_store = RatingsStore(db, snapshot_dir=snapshot_dir)
+            if snapshot_dir:
+                _shared_store.load_snapshot(snapshot_dir)
+            # Writes on other instances reach this store through NOTIFY
+            for entity in ('matches', 'players', 'all'):
+                cache_events.subscribe(entity, _shared_store.handle_event)
+        return _shared_store
@@ -0,0 +1,27 @@
+"""Production entry point: warm the process up, then start Streamlit in it.
+
+Warm-up runs before Streamlit opens its port, so the platform only routes
+traffic to the instance once connections, schema and caches are ready. If it
+fails (e.g. the database is briefly unreachable at cold start) Streamlit still
+starts, so the process stays live, while warm-up is retried with backoff in the
+background; /readyz answers 503 and keeps traffic away until a retry succeeds.
+The /healthz and /readyz probes and /metrics are served on HEALTH_PORT
+throughout; with METRICS_FILE set the metrics are also written to that file.
+"""
+import os
+import sys
+
+from streamlit.web import cli as streamlit_cli
+
+import health
+import metrics
+
+
+if __name__ == '__main__':
+    health.start_health_server()
+    if os.environ.get('METRICS_FILE'):
+        metrics.start_file_writer(os.environ['METRICS_FILE'])
+    if not health.warm_up():
+        health.start_warm_up_retries()
+    sys.argv = ['streamlit', 'run', 'main.py', *sys.argv[1:]]
+    sys.exit(streamlit_cli.main())
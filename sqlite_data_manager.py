@@ -0,0 +1,516 @@
+import sqlite3
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+import metrics
+from instrumentation import instrument_class
+from storage import SUBMISSION_KEEP_DAYS, DataBackend, like_prefix, sqlite_connection, sqlite_path
+from rating_frames import (
+    RATING_CATEGORIES,
+    build_player_frame,
+    build_players_frame,
+    build_team_frame,
+    empty_player_frame,
+    rating_columns_from_rows,
+)
+
+ROLE_COLUMNS = ['boldholder', 'medspiller', 'presspiller', 'stottespiller']
+
+# Valid rows only: the same filter as the Postgres queries
+_VALID_RATINGS = """
+    m.date IS NOT NULL
+    AND m.date != '1970-01-01'
+    AND m.boldholder IN ('A', 'B', 'C', 'D')
+    AND m.medspiller IN ('A', 'B', 'C', 'D')
+    AND m.presspiller IN ('A', 'B', 'C', 'D')
+    AND m.stottespiller IN ('A', 'B', 'C', 'D')
+"""
+
+# Seconds since midnight of a 'HH:MM:SS' time (NULL stays NULL)
+_SECONDS = "CAST(strftime('%s', '1970-01-01 ' || m.time) AS INTEGER)"
+
+
+def _average(column):
+    return f"""ROUND(AVG(CASE m.{column}
+        WHEN 'A' THEN 4.0 WHEN 'B' THEN 3.0 WHEN 'C' THEN 2.0 WHEN 'D' THEN 1.0
+    END), 2)"""
+
+
+# Every method is timed; _connect only hands out a context manager
+@instrument_class(exclude=('_connect',))
+class SQLiteDataManager(DataBackend):
+    """Players and matches in an embedded SQLite database (STORAGE_BACKEND=sqlite).
+
+    A single-machine store: deleting a player removes their matches at once
+    and there are no other instances to notify about writes.
+    """
+    # Database files whose schema exists, so setup runs once per file and process
+    _initialized_paths = set()
+
+    def __init__(self, session=None, path=None):
+        super().__init__(session)
+        self.path = path or sqlite_path()
+        self.rating_order = ['D', 'C', 'B', 'A']
+        self.rating_map = {'A': 4, 'B': 3, 'C': 2, 'D': 1}
+        self.reverse_rating_map = {4: 'A', 3: 'B', 2: 'C', 1: 'D'}
+        if self.path not in SQLiteDataManager._initialized_paths:
+            self._initialize_tables()
+
+    def _initialize_tables(self):
+        """Create tables and indexes if they don't exist"""
+        try:
+            with self._connect(query_class='maintenance') as conn:
+                # Readers are not blocked by the writer
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript("""
+                    CREATE TABLE IF NOT EXISTS players (
+                        id INTEGER PRIMARY KEY,
+                        name TEXT NOT NULL UNIQUE,
+                        position TEXT DEFAULT 'Not specified'
+                    );
+                    -- AUTOINCREMENT keeps ids increasing after deletes, which
+                    -- the ratings store relies on for incremental refreshes
+                    CREATE TABLE IF NOT EXISTS matches (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        date DATE,
+                        time TIME,
+                        opponent TEXT,
+                        player_id INTEGER REFERENCES players(id) ON DELETE CASCADE,
+                        boldholder TEXT,
+                        medspiller TEXT,
+                        presspiller TEXT,
+                        stottespiller TEXT
+                    );
+                    CREATE TABLE IF NOT EXISTS match_submissions (
+                        idempotency_key TEXT PRIMARY KEY,
+                        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    );
+                    CREATE UNIQUE INDEX IF NOT EXISTS matches_natural_key_idx
+                        ON matches (player_id, date, time, opponent);
+                    CREATE INDEX IF NOT EXISTS matches_date_idx ON matches (date);
+                """)
+                # Without a background worker, old idempotency keys go when a process opens the file
+                conn.execute(
+                    "DELETE FROM match_submissions WHERE applied_at < datetime('now', ?)",
+                    (f'-{SUBMISSION_KEEP_DAYS} days',)
+                )
+            SQLiteDataManager._initialized_paths.add(self.path)
+        except sqlite3.Error as e:
+            print(f"Error initializing tables: {e}")
+
+    @contextmanager
+    def _connect(self, read=False, query_class='interactive'):
+        """Open the database file; commits on success and rolls back on error.
+
+        Statements run within the latency budget of query_class.
+        """
+        try:
+            with sqlite_connection(self.path, query_class) as conn:
+                yield conn
+        except sqlite3.Error as e:
+            self._check_budget(e, query_class)
+            raise
+
+    def add_player(self, name, position="Not specified"):
+        """Add a new player to the system"""
+        try:
+            with self._connect(query_class='write') as conn:
+                cur = conn.execute(
+                    "INSERT INTO players (name, position) VALUES (?, ?) ON CONFLICT (name) DO NOTHING",
+                    (name, position)
+                )
+                return cur.rowcount == 1
+        except sqlite3.Error as e:
+            print(f"Error adding player: {e}")
+            return False
+
+    def add_players(self, rows):
+        """Add many (name, position) players in one transaction.
+
+        Returns the names that were added and the names that already existed.
+        """
+        added = set()
+        try:
+            with self._connect(query_class='write') as conn:
+                for name, position in rows:
+                    cur = conn.execute(
+                        "INSERT INTO players (name, position) VALUES (?, ?) ON CONFLICT (name) DO NOTHING",
+                        (name, position)
+                    )
+                    if cur.rowcount == 1:
+                        added.add(name)
+        except sqlite3.Error as e:
+            print(f"Error adding players: {e}")
+            return [], []
+        names = [name for name, _ in rows]
+        return [name for name in names if name in added], [name for name in names if name not in added]
+
+    def delete_player(self, name):
+        """Delete a player together with their match history; False if there is no such player"""
+        try:
+            with self._connect(query_class='write') as conn:
+                return conn.execute("DELETE FROM players WHERE name = ?", (name,)).rowcount > 0
+        except sqlite3.Error as e:
+            print(f"Error deleting player: {e}")
+            return False
+
+    def get_players(self):
+        """Get list of all players"""
+        try:
+            with self._connect(read=True) as conn:
+                rows = conn.execute("SELECT name, position FROM players ORDER BY name").fetchall()
+            names, positions = zip(*rows) if rows else ((), ())
+            return build_players_frame(names, positions)
+        except sqlite3.Error as e:
+            print(f"Error getting players: {e}")
+            return build_players_frame([], [])
+
+    def get_players_page(self, search="", after=None, limit=25, count_cap=1000):
+        """Get one page of the roster ordered by name using keyset pagination.
+
+        Returns (players_df, next_after, total_estimate); next_after is the
+        name to pass as after for the next page, or None on the last page.
+        """
+        conditions = []
+        params = []
+        search = search.strip()
+        if search:
+            conditions.append("lower(name) LIKE ? ESCAPE '\\'")
+            params.append(like_prefix(search))
+        filter_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        page_conditions = conditions + (["name > ?"] if after is not None else [])
+        page_params = params + ([after] if after is not None else [])
+        page_sql = f"WHERE {' AND '.join(page_conditions)}" if page_conditions else ""
+
+        try:
+            with self._connect(read=True) as conn:
+                rows = conn.execute(f"""
+                    SELECT name, position FROM players
+                    {page_sql}
+                    ORDER BY name
+                    LIMIT ?
+                """, page_params + [limit + 1]).fetchall()
+                total = conn.execute(f"""
+                    SELECT count(*) FROM (SELECT 1 FROM players {filter_sql} LIMIT ?)
+                """, params + [count_cap]).fetchone()[0]
+
+            next_after = rows[limit - 1][0] if len(rows) > limit else None
+            rows = rows[:limit]
+            names, positions = zip(*rows) if rows else ((), ())
+            return build_players_frame(names, positions), next_after, total
+        except sqlite3.Error as e:
+            print(f"Error getting players page: {e}")
+            return build_players_frame([], []), None, 0
+
+    def search_players(self, query="", limit=20):
+        """Get the names of the players best matching query (top matches only)"""
+        prefix = like_prefix(query.strip())
+        try:
+            with self._connect(read=True) as conn:
+                # Also match the start of later words (e.g. surnames)
+                rows = conn.execute("""
+                    SELECT name FROM players
+                    WHERE lower(name) LIKE ? ESCAPE '\\' OR lower(name) LIKE ? ESCAPE '\\'
+                    ORDER BY lower(name) LIKE ? ESCAPE '\\' DESC, name
+                    LIMIT ?
+                """, (prefix, '% ' + prefix, prefix, limit)).fetchall()
+            return [row[0] for row in rows]
+        except sqlite3.Error as e:
+            print(f"Error searching players: {e}")
+            return []
+
+    def add_match_record(self, date, time, opponent, players_df, ratings, idempotency_key=None):
+        """Add or update match performance records for selected players.
+
+        Rows are upserted on (player, date, time, opponent) and a submission
+        whose idempotency key was already applied is skipped, as with Postgres.
+        The inserted/updated row counts are kept in last_match_write.
+        """
+        names = players_df['Name'].tolist()
+        self.last_match_write = {'inserted': 0, 'updated': 0}
+        try:
+            with self._connect(query_class='write') as conn:
+                # Take the write lock up front so the existing rows cannot change under us
+                conn.execute("BEGIN IMMEDIATE")
+                placeholders = ', '.join('?' * len(names))
+                player_ids = dict(conn.execute(
+                    f"SELECT name, id FROM players WHERE name IN ({placeholders})", names
+                ).fetchall())
+                missing = set(names) - set(player_ids)
+                if missing:
+                    print(f"Error adding match record: unknown players {sorted(missing)}")
+                    return False
+
+                if idempotency_key:
+                    cur = conn.execute(
+                        "INSERT INTO match_submissions (idempotency_key) VALUES (?) ON CONFLICT DO NOTHING",
+                        (idempotency_key,)
+                    )
+                    if cur.rowcount == 0:
+                        return True
+
+                existing = {
+                    row[0]: tuple(row[1:])
+                    for row in conn.execute(f"""
+                        SELECT player_id, {', '.join(ROLE_COLUMNS)} FROM matches
+                        WHERE date = ? AND time IS ? AND opponent IS ?
+                          AND player_id IN ({placeholders})
+                    """, [date, time, opponent, *player_ids.values()]).fetchall()
+                }
+                # Unchanged rows are left alone
+                rows = []
+                for name in names:
+                    values = tuple(ratings[category][name] for category in RATING_CATEGORIES)
+                    current = existing.get(player_ids[name])
+                    if current == values:
+                        continue
+                    self.last_match_write['inserted' if current is None else 'updated'] += 1
+                    rows.append((date, time, opponent, player_ids[name], *values))
+                conn.executemany(f"""
+                    INSERT INTO matches (date, time, opponent, player_id, {', '.join(ROLE_COLUMNS)})
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (player_id, date, time, opponent) DO UPDATE SET
+                        boldholder = excluded.boldholder,
+                        medspiller = excluded.medspiller,
+                        presspiller = excluded.presspiller,
+                        stottespiller = excluded.stottespiller
+                """, rows)
+
+            metrics.MATCH_ROWS_WRITTEN.inc(self.last_match_write['inserted'], action='insert')
+            metrics.MATCH_ROWS_WRITTEN.inc(self.last_match_write['updated'], action='update')
+            return True
+        except sqlite3.Error as e:
+            print(f"Error adding match record: {e}")
+            return False
+
+    def list_matches(self, limit=50):
+        """Get the most recent fixtures with the number of rated players"""
+        try:
+            with self._connect(read=True) as conn:
+                rows = conn.execute("""
+                    SELECT m.date, m.time, m.opponent, COUNT(*)
+                    FROM matches m
+                    GROUP BY m.date, m.time, m.opponent
+                    ORDER BY m.date DESC, m.time DESC NULLS LAST, m.opponent
+                    LIMIT ?
+                """, (limit,)).fetchall()
+            return [
+                {'date': date, 'time': time, 'opponent': opponent, 'players': players}
+                for date, time, opponent, players in rows
+            ]
+        except sqlite3.Error as e:
+            print(f"Error listing matches: {e}")
+            return []
+
+    def get_match_ratings(self, date, time, opponent):
+        """Get every rating row of one fixture, indexed by player name.
+
+        The id column identifies the rows for update_match_ratings.
+        """
+        try:
+            with self._connect(read=True) as conn:
+                rows = conn.execute(f"""
+                    SELECT p.name, m.id, {', '.join('m.' + column for column in ROLE_COLUMNS)}
+                    FROM matches m
+                    JOIN players p ON p.id = m.player_id
+                    WHERE m.date = ? AND m.time IS ? AND m.opponent IS ?
+                    ORDER BY p.name
+                """, (date, time, opponent)).fetchall()
+        except sqlite3.Error as e:
+            print(f"Error fetching match ratings: {e}")
+            rows = []
+        frame = pd.DataFrame(rows, columns=['Spiller', 'id'] + RATING_CATEGORIES)
+        return frame.set_index('Spiller')
+
+    def update_match_ratings(self, changes):
+        """Apply corrected ratings in one transaction.
+
+        changes is a frame with an id column and the rating categories; rows
+        whose ratings are unchanged are left alone. Returns the number of rows
+        updated, or None on error.
+        """
+        values = [
+            (*(row[category] for category in RATING_CATEGORIES), int(row['id']))
+            for _, row in changes.iterrows()
+        ]
+        if not values:
+            return 0
+        try:
+            with self._connect(query_class='write') as conn:
+                before = conn.total_changes
+                conn.executemany("""
+                    UPDATE matches SET
+                        boldholder = ?1,
+                        medspiller = ?2,
+                        presspiller = ?3,
+                        stottespiller = ?4
+                    WHERE id = ?5
+                      AND (boldholder, medspiller, presspiller, stottespiller) IS NOT (?1, ?2, ?3, ?4)
+                """, values)
+                updated = conn.total_changes - before
+            metrics.MATCH_ROWS_WRITTEN.inc(updated, action='update')
+            return updated
+        except sqlite3.Error as e:
+            print(f"Error updating match ratings: {e}")
+            return None
+
+    def get_player_performance(self, player_name, start_date=None, end_date=None):
+        """Get performance history for a specific player within date range"""
+        conditions = ["p.name = ?"]
+        params = [player_name]
+        if start_date:
+            conditions.append("m.date >= ?")
+            params.append(start_date)
+        if end_date:
+            conditions.append("m.date <= ?")
+            params.append(end_date)
+
+        query = f"""
+            SELECT m.date, {_SECONDS}, m.opponent, {', '.join('m.' + column for column in ROLE_COLUMNS)}
+            FROM matches m
+            JOIN players p ON m.player_id = p.id
+            WHERE {' AND '.join(conditions)}
+            AND {_VALID_RATINGS}
+            ORDER BY m.date, m.time
+        """
+        try:
+            with self._connect(read=True, query_class='analytics') as conn:
+                rows = conn.execute(query, params).fetchall()
+            if not rows:
+                return empty_player_frame()
+            dates, seconds, opponents, *letters = zip(*rows)
+            return build_player_frame(dates, seconds, opponents, dict(zip(RATING_CATEGORIES, letters)))
+        except sqlite3.Error as e:
+            print(f"Error getting player performance: {e}")
+            return empty_player_frame()
+
+    def get_team_performance(self, start_date=None, end_date=None):
+        """Get team's overall performance history within date range"""
+        conditions = []
+        params = []
+        if start_date:
+            conditions.append("AND m.date >= ?")
+            params.append(start_date)
+        if end_date:
+            conditions.append("AND m.date <= ?")
+            params.append(end_date)
+
+        query = f"""
+            SELECT m.date, {_SECONDS}, {', '.join(_average(column) for column in ROLE_COLUMNS)}
+            FROM matches m
+            WHERE {_VALID_RATINGS}
+            {' '.join(conditions)}
+            GROUP BY m.date, m.time
+            ORDER BY m.date, m.time
+        """
+        try:
+            with self._connect(read=True, query_class='analytics') as conn:
+                rows = conn.execute(query, params).fetchall()
+            if not rows:
+                return pd.DataFrame()
+            dates, seconds, *averages = zip(*rows)
+            return build_team_frame(dates, seconds, dict(zip(RATING_CATEGORIES, averages)))
+        except sqlite3.Error as e:
+            print(f"Error getting team performance: {e}")
+            return pd.DataFrame()
+
+    def get_player_index(self):
+        """Get (id, name) pairs for all players"""
+        try:
+            with self._connect(read=True, query_class='analytics') as conn:
+                return conn.execute("SELECT id, name FROM players ORDER BY id").fetchall()
+        except sqlite3.Error as e:
+            print(f"Error getting player index: {e}")
+            return []
+
+    def get_max_match_id(self):
+        """Get the highest match row id, 0 if there are no matches or None on error"""
+        try:
+            with self._connect(read=True) as conn:
+                return conn.execute("SELECT COALESCE(MAX(id), 0) FROM matches").fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Error getting max match id: {e}")
+            return None
+
+    def get_rating_columns(self, after_id=0):
+        """Get all valid rating rows with id > after_id as NumPy columns"""
+        query = f"""
+            SELECT m.id, m.player_id, m.date, {_SECONDS}, m.opponent,
+                   {', '.join('m.' + column for column in ROLE_COLUMNS)}
+            FROM matches m
+            WHERE m.id > ?
+            AND {_VALID_RATINGS}
+            ORDER BY m.id
+        """
+        try:
+            with self._connect(read=True, query_class='analytics') as conn:
+                rows = conn.execute(query, (after_id,)).fetchall()
+            return rating_columns_from_rows(rows)
+        except sqlite3.Error as e:
+            print(f"Error getting rating columns: {e}")
+            return None
+
+    def get_available_seasons(self):
+        """Get list of available seasons (years) from match data"""
+        try:
+            with self._connect(read=True, query_class='analytics') as conn:
+                rows = conn.execute("""
+                    SELECT DISTINCT CAST(substr(date, 1, 4) AS INTEGER) FROM matches
+                    WHERE date IS NOT NULL
+                    ORDER BY 1
+                """).fetchall()
+            return [row[0] for row in rows]
+        except sqlite3.Error as e:
+            print(f"Error getting available seasons: {e}")
+            return []
+
+    def load_dataset(self, dataset):
+        """Insert a synthetic_data dataset; returns (players added, rows added) or None on error"""
+        ratings = dataset['ratings']
+        names = [str(name) for name in dataset['names']]
+        try:
+            with self._connect(query_class='maintenance') as conn:
+                before = conn.total_changes
+                conn.executemany(
+                    "INSERT INTO players (name, position) VALUES (?, ?) ON CONFLICT (name) DO NOTHING",
+                    zip(names, (str(position) for position in dataset['positions']))
+                )
+                players_added = conn.total_changes - before
+
+                placeholders = ', '.join('?' * len(names))
+                ids = dict(conn.execute(f"SELECT name, id FROM players WHERE name IN ({placeholders})", names))
+                player_ids = np.array([ids[name] for name in names], dtype=np.int64)
+
+                rows = zip(
+                    np.datetime_as_string(ratings['date'], unit='D').tolist(),
+                    np.char.add(np.char.zfill(ratings['hour'].astype(str), 2), ':00:00').tolist(),
+                    ratings['opponent'].tolist(),
+                    player_ids[ratings['player']].tolist(),
+                    *(ratings[column].tolist() for column in ROLE_COLUMNS)
+                )
+                before = conn.total_changes
+                conn.executemany(f"""
+                    INSERT INTO matches (date, time, opponent, player_id, {', '.join(ROLE_COLUMNS)})
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (player_id, date, time, opponent) DO NOTHING
+                """, rows)
+                rows_added = conn.total_changes - before
+                # Planner statistics for the new rows
+                conn.execute("ANALYZE")
+            return players_added, rows_added
+        except sqlite3.Error as e:
+            print(f"Error loading dataset: {e}")
+            return None
+
+    def reset_data(self):
+        """Reset all data in the system"""
+        try:
+            with self._connect(query_class='maintenance') as conn:
+                conn.execute("DELETE FROM matches")
+                conn.execute("DELETE FROM match_submissions")
+                conn.execute("DELETE FROM players")
+                return True
+        except sqlite3.Error as e:
+            print(f"Error resetting data: {e}")
+            return False
@@ -0,0 +1,251 @@
+"""Storage backends for players, matches and users.
+
+STORAGE_BACKEND selects the implementation: 'postgres' (the default, needs
+DATABASE_URL) or 'sqlite', an embedded database file at SQLITE_PATH for tests,
+benchmarks and single-machine installs without a database server.
+"""
+import os
+import sqlite3
+import threading
+import time as clock
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import date, datetime, time
+
+import metrics
+import query_budget
+
+BACKENDS = ('postgres', 'sqlite')
+DEFAULT_SQLITE_PATH = os.path.join('data', 'soccer_talent_tracker.sqlite3')
+# Idempotency keys of applied match submissions are kept this long; retries
+# and double submits arrive within minutes
+SUBMISSION_KEEP_DAYS = 30
+
+# Dates and times are stored as ISO text and read back by declared column type
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(sep=' '))
+sqlite3.register_adapter(time, time.isoformat)
+sqlite3.register_converter('DATE', lambda value: date.fromisoformat(value.decode()))
+sqlite3.register_converter('TIME', lambda value: time.fromisoformat(value.decode()))
+sqlite3.register_converter('TIMESTAMP', lambda value: datetime.fromisoformat(value.decode()))
+
+
+def backend_name():
+    """The configured storage backend"""
+    name = os.environ.get('STORAGE_BACKEND', 'postgres').lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown STORAGE_BACKEND {name!r}, expected one of {', '.join(BACKENDS)}")
+    return name
+
+
+def sqlite_path():
+    """Database file of the SQLite backend"""
+    return os.environ.get('SQLITE_PATH') or DEFAULT_SQLITE_PATH
+
+
+def like_prefix(text):
+    """Case-insensitive LIKE prefix pattern with wildcards in text escaped"""
+    escaped = text.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return escaped + '%'
+
+
+def _lower(value):
+    return value.lower() if isinstance(value, str) else value
+
+
+def _limit_statements(conn, statement_ms):
+    """Interrupt any statement on conn that runs longer than statement_ms"""
+    deadline = [0.0]
+
+    def start(sql):
+        deadline[0] = clock.monotonic() + statement_ms / 1000
+
+    # The trace callback runs as each statement starts, the progress
+    # handler every few thousand VM instructions while it runs
+    conn.set_trace_callback(start)
+    conn.set_progress_handler(lambda: clock.monotonic() > deadline[0], 10_000)
+
+
+@contextmanager
+def sqlite_connection(path=None, query_class=None):
+    """Open the embedded database; commits on success, rolls back on error and closes.
+
+    With a query_class its budget limits each statement and the wait for locks.
+    """
+    path = path or sqlite_path()
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    statement_ms, lock_ms = query_budget.budget(query_class) if query_class else (0, 0)
+    conn = sqlite3.connect(path, timeout=lock_ms / 1000 if lock_ms else 30,
+                           detect_types=sqlite3.PARSE_DECLTYPES)
+    try:
+        if statement_ms:
+            _limit_statements(conn, statement_ms)
+        conn.execute("PRAGMA foreign_keys=ON")
+        # SQLite's lower() only folds ASCII; names like Ørsted must match ør...
+        conn.create_function('lower', 1, _lower, deterministic=True)
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def ping():
+    """Check the configured database answers a trivial query"""
+    if backend_name() == 'sqlite':
+        try:
+            with sqlite_connection() as conn:
+                conn.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    import psycopg2
+    import db_pool
+    try:
+        with db_pool.connection(os.environ['DATABASE_URL']) as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+        return True
+    except (psycopg2.Error, KeyError):
+        return False
+
+
+class DataBackend(ABC):
+    """Player and match storage used by DataManager.
+
+    Reads return empty frames or lists and writes return False (or None where
+    documented) on database errors, after printing the error. When the error was
+    a statement running out of its query_budget, budget_exceeded is set to the
+    query class until the caller clears it. The flag is per thread, so
+    concurrent reads (see prefetch.py) can share one backend.
+    """
+    # Whether deletes only hide players and a purge worker removes their
+    # matches later, and whether other instances announce writes via NOTIFY
+    soft_delete = False
+    shared = False
+
+    def __init__(self, session=None):
+        # Per-user state (e.g. st.session_state) for read-your-writes
+        self.session = session if session is not None else {}
+        self.last_match_write = {'inserted': 0, 'updated': 0}
+        self._local = threading.local()
+
+    @property
+    def budget_exceeded(self):
+        """Query class of the last call in this thread that ran out of its budget"""
+        return getattr(self._local, 'budget_exceeded', None)
+
+    @budget_exceeded.setter
+    def budget_exceeded(self, query_class):
+        self._local.budget_exceeded = query_class
+
+    def _check_budget(self, error, query_class):
+        """Record error if it means a statement of query_class ran out of its budget"""
+        if query_budget.exceeded(error):
+            self.budget_exceeded = query_class
+            metrics.QUERY_BUDGET_EXCEEDED.inc(query_class=query_class)
+
+    @abstractmethod
+    def add_player(self, name, position="Not specified"):
+        """Add a new player; False if the name is taken"""
+
+    @abstractmethod
+    def add_players(self, rows):
+        """Add many (name, position) players; returns (added names, existing names)"""
+
+    @abstractmethod
+    def delete_player(self, name):
+        """Delete a player and (now or in the background) their match history; False if there is no such player"""
+
+    @abstractmethod
+    def get_players(self):
+        """Get the roster frame (Name, Position) ordered by name"""
+
+    @abstractmethod
+    def get_players_page(self, search="", after=None, limit=25, count_cap=1000):
+        """Get (players_df, next_after, total_estimate) for one roster page ordered by name"""
+
+    @abstractmethod
+    def search_players(self, query="", limit=20):
+        """Get the names of the players best matching query"""
+
+    @abstractmethod
+    def add_match_record(self, date, time, opponent, players_df, ratings, idempotency_key=None):
+        """Upsert one match's ratings; counts go to last_match_write"""
+
+    @abstractmethod
+    def list_matches(self, limit=50):
+        """Get the most recent fixtures with the number of rated players"""
+
+    @abstractmethod
+    def get_match_ratings(self, date, time, opponent):
+        """Get every rating row of one fixture, indexed by player name"""
+
+    @abstractmethod
+    def update_match_ratings(self, changes):
+        """Apply corrected ratings; returns the number of rows updated or None on error"""
+
+    @abstractmethod
+    def get_player_performance(self, player_name, start_date=None, end_date=None):
+        """Get performance history for a specific player within date range"""
+
+    @abstractmethod
+    def get_team_performance(self, start_date=None, end_date=None):
+        """Get team's average ratings per match within date range"""
+
+    @abstractmethod
+    def get_player_index(self):
+        """Get (id, name) pairs for all players that are not deleted"""
+
+    def get_pending_deletions(self):
+        """Get deleted players whose match rows are still being purged"""
+        return []
+
+    @abstractmethod
+    def get_max_match_id(self):
+        """Get the highest match row id, 0 if there are no matches or None on error"""
+
+    @abstractmethod
+    def get_rating_columns(self, after_id=0):
+        """Get all valid rating rows with id > after_id as NumPy columns"""
+
+    @abstractmethod
+    def get_available_seasons(self):
+        """Get list of available seasons (years) from match data"""
+
+    @abstractmethod
+    def load_dataset(self, dataset):
+        """Insert a synthetic_data dataset; returns (players added, rows added) or None on error"""
+
+    def generate_test_data(self, username, players=10, seasons=1, matches_per_season=5, squad_size=5):
+        """Generate reproducible test players and matches for a specific user"""
+        import zlib
+        from synthetic_data import generate_dataset
+
+        dataset = generate_dataset(
+            players=players,
+            seasons=seasons,
+            matches_per_season=matches_per_season,
+            squad_size=squad_size,
+            # Stable across processes, unlike hash()
+            seed=zlib.crc32(username.encode('utf-8')),
+            name_prefix="Test"
+        )
+        return self.load_dataset(dataset) is not None
+
+    @abstractmethod
+    def reset_data(self):
+        """Remove all players and matches"""
+
+
+def get_data_backend(session=None):
+    """The DataBackend selected by STORAGE_BACKEND"""
+    if backend_name() == 'sqlite':
+        from sqlite_data_manager import SQLiteDataManager
+        return SQLiteDataManager(session)
+    from postgres_data_manager import PostgresDataManager
+    return PostgresDataManager(session)
@@ -0,0 +1,187 @@
+"""Reproducible synthetic players and match ratings, loaded with COPY.
+
+    python synthetic_data.py --players 200 --seasons 10 --matches-per-season 500 --squad-size 200
+
+builds one million rating rows. The same seed always gives the same dataset.
+"""
+import argparse
+import io
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import psycopg2
+
+from cache_events import notify
+
+GRADES = np.array(['D', 'C', 'B', 'A'])
+POSITIONS = np.array(['Målmand', 'Forsvar', 'Midtbane', 'Angreb'])
+ROLE_COLUMNS = ['boldholder', 'medspiller', 'presspiller', 'stottespiller']
+KICKOFF_HOURS = np.array([9, 11, 13, 15])
+# A fixed first season keeps a seed's dataset the same whatever the current date
+DEFAULT_START_YEAR = 2020
+
+
+def generate_dataset(players=25, seasons=2, matches_per_season=30, squad_size=16,
+                     drift=0.3, drift_sd=0.3, noise=0.6, start_year=DEFAULT_START_YEAR, seed=42,
+                     name_prefix="Spiller"):
+    """Build players and rating rows as NumPy columns.
+
+    Every player has a base level per role and a personal trend (drift, in
+    grade points per season, drawn around drift with spread drift_sd); each
+    rating is the trend at the match date plus Gaussian noise, rounded to a
+    grade. Each match rates a random squad of squad_size players.
+    """
+    rng = np.random.default_rng(seed)
+    squad_size = min(squad_size, players)
+    width = len(str(players))
+
+    names = np.array([f"{name_prefix}{i:0{width}d}" for i in range(1, players + 1)])
+    positions = POSITIONS[rng.integers(len(POSITIONS), size=players)]
+
+    # Matches spread over each season from January to early December
+    season = np.repeat(np.arange(seasons), matches_per_season)
+    match_in_season = np.tile(np.arange(matches_per_season), seasons)
+    season_start = np.array([f"{start_year + s}-01-10" for s in range(seasons)], dtype='datetime64[D]')
+    dates = season_start[season] + (match_in_season * 330 // matches_per_season).astype('timedelta64[D]')
+    hours = KICKOFF_HOURS[match_in_season % len(KICKOFF_HOURS)]
+    # Opponent numbers are unique within a season, so no two matches share a natural key
+    opponents = np.char.add('Modstander ', (match_in_season + 1).astype(str))
+
+    # Random squad per match: the squad_size lowest of one uniform draw per player
+    n_matches = len(dates)
+    squads = np.argpartition(rng.random((n_matches, players)), squad_size - 1, axis=1)[:, :squad_size]
+    player_index = squads.ravel()
+    match_index = np.repeat(np.arange(n_matches), squad_size)
+
+    base = rng.normal(2.3, 0.5, size=(players, len(ROLE_COLUMNS)))
+    trend = rng.normal(drift, drift_sd, size=players)
+    progress = (season + match_in_season / matches_per_season)[match_index]
+    latent = (base[player_index] + (trend[player_index] * progress)[:, None]
+              + rng.normal(0.0, noise, size=(len(player_index), len(ROLE_COLUMNS))))
+    grades = np.clip(np.rint(latent), 1, 4).astype(np.int8)
+
+    ratings = {
+        'date': dates[match_index],
+        'hour': hours[match_index],
+        'opponent': opponents[match_index],
+        'player': player_index,
+    }
+    for i, column in enumerate(ROLE_COLUMNS):
+        ratings[column] = GRADES[grades[:, i] - 1]
+    return {'names': names, 'positions': positions, 'ratings': ratings}
+
+
+def _copy(cur, table, frame):
+    """COPY a frame into a table as tab-separated text"""
+    buffer = io.BytesIO()
+    frame.to_csv(buffer, sep='\t', header=False, index=False, encoding='utf-8')
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(frame.columns)}) FROM STDIN WITH (ENCODING 'UTF8')", buffer)
+
+
+def load_dataset(conn, dataset):
+    """Insert a generated dataset; existing players and matches are left as they are.
+
+    Returns the number of players and rating rows added.
+    """
+    ratings = dataset['ratings']
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TEMP TABLE synthetic_players (name VARCHAR(100), position VARCHAR(50)) ON COMMIT DROP
+        """)
+        _copy(cur, 'synthetic_players', pd.DataFrame({
+            'name': dataset['names'],
+            'position': dataset['positions'],
+        }))
+        cur.execute("""
+            INSERT INTO players (name, position)
+            SELECT name, position FROM synthetic_players
+            ON CONFLICT (name) WHERE deleted_at IS NULL DO NOTHING
+        """)
+        players_added = cur.rowcount
+
+        cur.execute("""
+            SELECT s.ordinality - 1, p.id
+            FROM unnest(%s::text[]) WITH ORDINALITY AS s(name, ordinality)
+            JOIN players p ON p.name = s.name AND p.deleted_at IS NULL
+        """, (list(dataset['names']),))
+        player_ids = np.zeros(len(dataset['names']), dtype=np.int64)
+        for index, player_id in cur.fetchall():
+            player_ids[index] = player_id
+
+        cur.execute("""
+            CREATE TEMP TABLE synthetic_matches (
+                date DATE,
+                time TIME,
+                opponent VARCHAR(100),
+                player_id INTEGER,
+                boldholder VARCHAR(1),
+                medspiller VARCHAR(1),
+                presspiller VARCHAR(1),
+                stottespiller VARCHAR(1)
+            ) ON COMMIT DROP
+        """)
+        _copy(cur, 'synthetic_matches', pd.DataFrame({
+            'date': np.datetime_as_string(ratings['date'], unit='D'),
+            'time': np.char.add(np.char.zfill(ratings['hour'].astype(str), 2), ':00'),
+            'opponent': ratings['opponent'],
+            'player_id': player_ids[ratings['player']],
+            **{column: ratings[column] for column in ROLE_COLUMNS},
+        }))
+        cur.execute(f"""
+            INSERT INTO matches (date, time, opponent, player_id, {', '.join(ROLE_COLUMNS)})
+            SELECT date, time, opponent, player_id, {', '.join(ROLE_COLUMNS)}
+            FROM synthetic_matches
+            ON CONFLICT (player_id, date, time, opponent) DO NOTHING
+        """)
+        rows_added = cur.rowcount
+
+        # Planner statistics for the new rows, then let every instance reload
+        cur.execute("ANALYZE players")
+        cur.execute("ANALYZE matches")
+        notify(cur, 'all', 'import')
+    conn.commit()
+    return players_added, rows_added
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load reproducible synthetic ratings into Postgres")
+    parser.add_argument('--dsn', default=os.environ.get('DATABASE_URL'), help="defaults to DATABASE_URL")
+    parser.add_argument('--players', type=int, default=25)
+    parser.add_argument('--seasons', type=int, default=2)
+    parser.add_argument('--matches-per-season', type=int, default=30)
+    parser.add_argument('--squad-size', type=int, default=16)
+    parser.add_argument('--drift', type=float, default=0.3, help="mean grade change per season")
+    parser.add_argument('--noise', type=float, default=0.6)
+    parser.add_argument('--start-year', type=int, default=DEFAULT_START_YEAR)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error("set DATABASE_URL or pass --dsn")
+
+    # Make sure the schema exists
+    os.environ['DATABASE_URL'] = args.dsn
+    from postgres_data_manager import PostgresDataManager
+    PostgresDataManager()
+
+    start = time.perf_counter()
+    dataset = generate_dataset(
+        players=args.players, seasons=args.seasons, matches_per_season=args.matches_per_season,
+        squad_size=args.squad_size, drift=args.drift, noise=args.noise,
+        start_year=args.start_year, seed=args.seed
+    )
+    generated = time.perf_counter()
+    conn = psycopg2.connect(args.dsn)
+    try:
+        players_added, rows_added = load_dataset(conn, dataset)
+    finally:
+        conn.close()
+    loaded = time.perf_counter()
+    print(f"Generated {len(dataset['ratings']['player'])} rating rows in {generated - start:.1f}s, "
+          f"added {players_added} players and {rows_added} rows in {loaded - generated:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
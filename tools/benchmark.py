@@ -0,0 +1,228 @@
+"""Benchmark the data layer and chart building at several dataset sizes.
+
+Each scale wipes the target database, loads a synthetic dataset of that many
+rating rows and times the main reads, a full-squad match save and every
+Visualizer.plot_* method. Results are written as JSON; with a baseline the
+run fails when an operation got slower than the tolerance allows.
+
+    python -m tools.benchmark --dsn postgresql://.../stt_bench [--scales 1000,100000,1000000]
+        [--backend sql|store] [--output results.json] [--baseline baseline.json]
+    python -m tools.benchmark --storage sqlite [--sqlite-path bench.db] ...
+
+The database behind --dsn (or --sqlite-path) is reset: never point it at production data.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import date, datetime
+
+DEFAULT_SCALES = [1_000, 100_000, 1_000_000]
+SQUAD_SIZE = 16
+SEASONS = 5
+
+# Differences below this are timer noise, whatever the ratio
+NOISE_FLOOR_MS = 1.0
+
+
+def dataset_shape(rows):
+    """Generator parameters giving about the requested number of rating rows"""
+    players = max(SQUAD_SIZE, min(200, rows // 100))
+    matches = math.ceil(rows / SQUAD_SIZE)
+    return {
+        'players': players,
+        'seasons': SEASONS,
+        'matches_per_season': math.ceil(matches / SEASONS),
+        'squad_size': SQUAD_SIZE,
+    }
+
+
+def time_call(func, repeat):
+    """Run func repeat times; returns millisecond statistics"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'median_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(timings[min(len(timings) - 1, int(0.95 * len(timings)))], 3),
+        'min_ms': round(timings[0], 3),
+        'runs': repeat,
+    }
+
+
+def run_scale(rows, backend, repeat):
+    """Seed the database with about rows ratings and time every operation"""
+    import pandas as pd
+
+    from ratings_store import RatingsStore
+    from rating_frames import RATING_CATEGORIES
+    from storage import get_data_backend
+    from synthetic_data import generate_dataset
+    from visualizations import Visualizer
+
+    db = get_data_backend()
+    db.reset_data()
+    dataset = generate_dataset(seed=rows, name_prefix="Bench", **dataset_shape(rows))
+    start = time.perf_counter()
+    added = db.load_dataset(dataset)
+    if added is None:
+        sys.exit(f"Could not load the {rows}-row dataset into {os.environ['STORAGE_BACKEND']}, see the error above")
+    _, loaded = added
+    load_seconds = time.perf_counter() - start
+
+    reader = db
+    if backend == 'store':
+        reader = RatingsStore(db)
+        reader.ensure_fresh()
+
+    players = list(dataset['names'])
+    player = players[len(players) // 2]
+    squad = players[:SQUAD_SIZE]
+    player_data = reader.get_player_performance(player)
+    team_data = reader.get_team_performance()
+    comparison = {name: reader.get_player_performance(name) for name in players[:4]}
+    viz = Visualizer()
+
+    saves = iter(range(repeat))
+
+    def save_match():
+        opponent = f"Benchmark {next(saves)}"
+        db.add_match_record(
+            date(2000, 1, 1), datetime(2000, 1, 1, 12).time(), opponent,
+            pd.DataFrame({'Name': squad}),
+            {category: {name: 'B' for name in squad} for category in RATING_CATEGORIES}
+        )
+        if backend == 'store':
+            reader.mark_dirty()
+
+    operations = {
+        'get_players': db.get_players,
+        'get_player_performance': lambda: reader.get_player_performance(player),
+        'get_team_performance': reader.get_team_performance,
+        'get_available_seasons': reader.get_available_seasons,
+        'add_match_record': save_match,
+        'plot_player_single_category': lambda: viz.plot_player_single_category(player_data, player, 'Boldholder'),
+        'plot_player_all_categories': lambda: viz.plot_player_all_categories(player_data, player),
+        'plot_team_single_category': lambda: viz.plot_team_single_category(team_data, 'Boldholder'),
+        'plot_team_all_categories': lambda: viz.plot_team_all_categories(team_data),
+        'plot_player_comparison': lambda: viz.plot_player_comparison(comparison),
+    }
+    results = {name: time_call(func, repeat) for name, func in operations.items()}
+    return {'rows': loaded, 'load_seconds': round(load_seconds, 2), 'operations': results}
+
+
+def compare(results, baseline, tolerance):
+    """Operations slower than baseline median by more than tolerance (and the noise floor)"""
+    regressions = []
+    for scale, scale_results in results['scales'].items():
+        base_scale = baseline.get('scales', {}).get(scale)
+        if not base_scale:
+            continue
+        for name, stats in scale_results['operations'].items():
+            base = base_scale['operations'].get(name)
+            if not base:
+                continue
+            limit = base['median_ms'] * (1 + tolerance)
+            if stats['median_ms'] > limit and stats['median_ms'] - base['median_ms'] > NOISE_FLOOR_MS:
+                regressions.append({
+                    'scale': scale,
+                    'operation': name,
+                    'baseline_ms': base['median_ms'],
+                    'median_ms': stats['median_ms'],
+                    'ratio': round(stats['median_ms'] / base['median_ms'], 2),
+                })
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--storage', choices=['postgres', 'sqlite'], default='postgres',
+                        help='storage backend holding the data')
+    parser.add_argument('--dsn', help='Postgres database to seed and benchmark (it is reset)')
+    parser.add_argument('--sqlite-path', help='SQLite file for --storage sqlite (default: a temporary file)')
+    parser.add_argument('--scales', default=','.join(str(scale) for scale in DEFAULT_SCALES),
+                        help='comma-separated numbers of rating rows')
+    parser.add_argument('--backend', choices=['sql', 'store'], default='sql',
+                        help='answer reads with SQL on the storage backend or from the in-memory ratings store')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='write results JSON here instead of stdout')
+    parser.add_argument('--baseline', help='results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown over the baseline median (default 0.25)')
+    args = parser.parse_args()
+    if args.storage == 'postgres' and not args.dsn:
+        parser.error("--dsn is required with --storage postgres")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        base_meta = baseline.get('meta', {})
+        # Baselines from before --storage existed are Postgres runs that called SQL reads 'postgres'
+        base_storage = base_meta.get('storage', 'postgres')
+        base_backend = {'postgres': 'sql'}.get(base_meta.get('backend'), base_meta.get('backend'))
+        if (base_storage, base_backend) != (args.storage, args.backend):
+            sys.exit(f"Baseline was measured with --storage {base_storage} --backend {base_backend}, "
+                     f"not --storage {args.storage} --backend {args.backend}")
+
+    # The data layer reads its database from the environment
+    os.environ['STORAGE_BACKEND'] = args.storage
+    if args.storage == 'sqlite':
+        os.environ['SQLITE_PATH'] = args.sqlite_path or os.path.join(tempfile.mkdtemp(), 'bench.db')
+    else:
+        os.environ['DATABASE_URL'] = args.dsn
+        os.environ.pop('DATABASE_READ_URL', None)
+
+    results = {
+        'meta': {
+            'commit': _git_commit(),
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'storage': args.storage,
+            'backend': args.backend,
+            'repeat': args.repeat,
+        },
+        'scales': {},
+    }
+    # The data layer prints its errors; keep stdout for the JSON
+    with redirect_stdout(sys.stderr):
+        for rows in (int(scale) for scale in args.scales.split(',')):
+            print(f"Benchmarking {rows} rows...")
+            results['scales'][str(rows)] = run_scale(rows, args.backend, args.repeat)
+
+    if baseline is not None:
+        results['regressions'] = compare(results, baseline, args.tolerance)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    for regression in results.get('regressions', []):
+        print(f"Regression at {regression['scale']} rows: {regression['operation']} "
+              f"{regression['baseline_ms']:.1f} -> {regression['median_ms']:.1f} ms", file=sys.stderr)
+    sys.exit(1 if results.get('regressions') else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Check the import-time budget of the login path.
+
+Imports main.py in fresh interpreters (which only runs its module-level
+imports, i.e. everything an unauthenticated visitor pays for) and fails if
+the median import time exceeds the budget or a heavy module is loaded.
+
+    python -m tools.import_budget [--budget SECONDS] [--runs N]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Modules that only logged-in pages may import
+DEFERRED_MODULES = ['pandas', 'numpy', 'plotly.subplots', 'data_manager', 'visualizations']
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({'seconds': elapsed, 'loaded': [m for m in %r if m in sys.modules]}))
+"""
+
+
+def measure(runs):
+    """Return (median seconds, deferred modules loaded) for importing main"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    timings = []
+    loaded = set()
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-c', _PROBE % (DEFERRED_MODULES,)],
+            cwd=root, capture_output=True, text=True, check=True
+        )
+        # Streamlit logs bare-mode warnings; the probe's JSON is the last line
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+        timings.append(probe['seconds'])
+        loaded.update(probe['loaded'])
+    return statistics.median(timings), sorted(loaded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget', type=float, default=float(os.environ.get('LOGIN_IMPORT_BUDGET', '0.75')),
+                        help='maximum median import time in seconds (default 0.75)')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    median, loaded = measure(args.runs)
+    print(f"Login path import time: {median * 1000:.0f} ms (budget {args.budget * 1000:.0f} ms)")
+    ok = True
+    if loaded:
+        print(f"Deferred modules imported on the login path: {', '.join(loaded)}")
+        ok = False
+    if median > args.budget:
+        print("Import time budget exceeded")
+        ok = False
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+"""Drive main.py headlessly with many concurrent simulated coaches.
+
+Every virtual user runs the app with Streamlit's AppTest: log in, enter
+ratings for a squad on Kampdata, then open the individual and team views on
+Udviklingsanalyse. AppTest swaps a process-wide Streamlit runtime on every
+run, so each user gets its own worker process; unlike sessions in one
+server, workers do not share the connection pool or caches. The report
+gives throughput, per-step latency percentiles and the database connections
+seen while it ran.
+
+    python -m tools.loadtest --dsn postgresql://.../stt_load --users 20 [--iterations 3]
+        [--output report.json]
+
+The users log in as a coach account the harness creates for the run and
+deletes afterwards. Match ratings are written to the database behind --dsn.
+"""
+import argparse
+import datetime
+import json
+import os
+import secrets
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+
+import psycopg2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, 'main.py')
+SQUAD_SIZE = 11
+LOAD_USERNAME = 'loadtest_coach'
+
+
+class ConnectionSampler(threading.Thread):
+    """Samples pg_stat_activity for the benchmark database while the test runs"""
+
+    def __init__(self, dsn, interval=0.5):
+        super().__init__(name='connection-sampler', daemon=True)
+        self.dsn = dsn
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def run(self):
+        conn = psycopg2.connect(self.dsn)
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                while not self._stop_event.is_set():
+                    cur.execute("""
+                        SELECT count(*), count(*) FILTER (WHERE state = 'active')
+                        FROM pg_stat_activity
+                        WHERE datname = current_database() AND pid <> pg_backend_pid()
+                    """)
+                    self.samples.append(cur.fetchone())
+                    self._stop_event.wait(self.interval)
+        finally:
+            conn.close()
+
+    def summary(self):
+        totals = [total for total, _ in self.samples] or [0]
+        active = [count for _, count in self.samples] or [0]
+        return {
+            'samples': len(self.samples),
+            'max_connections': max(totals),
+            'mean_connections': round(statistics.mean(totals), 1),
+            'max_active': max(active),
+        }
+
+
+def percentiles(timings):
+    """Millisecond summary of a list of durations in seconds"""
+    if not timings:
+        return None
+    ms = sorted(t * 1000 for t in timings)
+    pick = lambda q: round(ms[min(len(ms) - 1, int(q * len(ms)))], 1)
+    return {'count': len(ms), 'p50_ms': pick(0.5), 'p95_ms': pick(0.95), 'p99_ms': pick(0.99), 'max_ms': round(ms[-1], 1)}
+
+
+def run_user(user_id, iterations, username, password, squad):
+    """One simulated coach: log in once, then enter a match and view analysis per iteration.
+
+    Returns the step timings and the error that stopped the user, if any.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    results = {}
+
+    def step(name, action):
+        start = time.perf_counter()
+        action()
+        elapsed = time.perf_counter() - start
+        if at.exception:
+            raise RuntimeError(f"{name}: {at.exception[0].message}")
+        results.setdefault(name, []).append(elapsed)
+
+    def log_in():
+        at.run()
+        at.text_input[0].input(username)
+        at.text_input[1].input(password)
+        next(button for button in at.button if button.label == "Log ind").click()
+        at.run()
+        if not at.session_state['user']:
+            raise RuntimeError("login failed")
+
+    def save_match(iteration):
+        at.session_state['page'] = "Kampdata"
+        at.session_state['match_step'] = 2
+        at.session_state['selected_players'] = squad
+        at.session_state['match_date'] = datetime.date.today()
+        at.session_state['match_time'] = datetime.time(10, 0)
+        at.session_state['opponent'] = f"Belastningstest {user_id}-{iteration}"
+        at.run()
+        next(button for button in at.button if button.label == "Gem Kampdata").click()
+        at.run()
+
+    def view_player():
+        at.session_state['page'] = "Udviklingsanalyse"
+        at.run()
+
+    def view_team():
+        at.radio[0].set_value("Holdanalyse")
+        at.run()
+
+    at = AppTest.from_file(MAIN, default_timeout=120)
+    try:
+        step('login', log_in)
+        for iteration in range(iterations):
+            start = time.perf_counter()
+            step('kampdata_save', lambda: save_match(iteration))
+            step('analysis_player', view_player)
+            step('analysis_team', view_team)
+            results.setdefault('flow', []).append(time.perf_counter() - start)
+    except Exception as e:
+        return results, f"user {user_id}: {e}"
+    return results, None
+
+
+def run_worker(args):
+    """Worker process entry point: run one user and print its timings as JSON"""
+    squad = json.loads(args.squad)
+    with redirect_stdout(sys.stderr):
+        results, error = run_user(args.worker, args.iterations, LOAD_USERNAME, os.environ['LOADTEST_PASSWORD'], squad)
+    print(json.dumps({'results': results, 'error': error}))
+
+
+def spawn_user(user_id, args, password, squad, results, errors, lock):
+    """Run one user in a worker process and merge its timings into results"""
+    command = [
+        sys.executable, '-m', 'tools.loadtest', '--dsn', args.dsn, '--worker', str(user_id),
+        '--iterations', str(args.iterations), '--squad', json.dumps(squad),
+    ]
+    # The password goes through the environment rather than the process list.
+    # Without ADMIN_* the app leaves the admin account of --dsn alone
+    env = {name: value for name, value in os.environ.items() if not name.startswith('ADMIN_')}
+    env['LOADTEST_PASSWORD'] = password
+    proc = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True)
+    try:
+        outcome = json.loads(proc.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        stderr = proc.stderr.strip().splitlines()
+        with lock:
+            errors.append(f"user {user_id}: worker exited with {proc.returncode}: {stderr[-1] if stderr else ''}")
+        return
+    with lock:
+        for name, timings in outcome['results'].items():
+            results.setdefault(name, []).extend(timings)
+        if outcome['error']:
+            errors.append(outcome['error'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dsn', required=True, help='database the app runs against (ratings are written to it)')
+    parser.add_argument('--users', type=int, default=10, help='concurrent simulated users')
+    parser.add_argument('--iterations', type=int, default=3, help='match entries per user')
+    parser.add_argument('--output', help='write the report JSON here instead of stdout')
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--squad', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.dsn
+    os.environ.pop('DATABASE_READ_URL', None)
+    sys.path.insert(0, ROOT)
+    if args.worker is not None:
+        run_worker(args)
+        return
+
+    # The app prints its errors; keep stdout for the JSON report
+    with redirect_stdout(sys.stderr):
+        from auth.database import AuthDB
+        from postgres_data_manager import PostgresDataManager
+        from synthetic_data import generate_dataset, load_dataset
+
+        db = PostgresDataManager()
+        squad = db.get_players()['Name'].tolist()[:SQUAD_SIZE]
+        if len(squad) < SQUAD_SIZE:
+            with db._connect() as conn:
+                load_dataset(conn, generate_dataset(players=25, name_prefix="Load"))
+            squad = db.get_players()['Name'].tolist()[:SQUAD_SIZE]
+
+        # The users log in as a throwaway coach, never as the admin of --dsn
+        auth = AuthDB()
+        password = secrets.token_urlsafe(16)
+        auth.delete_user(LOAD_USERNAME)
+        if not auth.create_user(LOAD_USERNAME, password, f"{LOAD_USERNAME}@example.com", 'coach'):
+            sys.exit(f"Could not create the {LOAD_USERNAME} account")
+
+        results, errors, lock = {}, [], threading.Lock()
+        sampler = ConnectionSampler(args.dsn)
+        sampler.start()
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=args.users) as pool:
+                for user_id in range(args.users):
+                    pool.submit(spawn_user, user_id, args, password, squad, results, errors, lock)
+        finally:
+            auth.delete_user(LOAD_USERNAME)
+        elapsed = time.perf_counter() - start
+        sampler.stop()
+
+    flows = len(results.get('flow', []))
+    report = {
+        'users': args.users,
+        'iterations': args.iterations,
+        'elapsed_s': round(elapsed, 2),
+        'flows_completed': flows,
+        'throughput_flows_per_s': round(flows / elapsed, 2) if elapsed else None,
+        'match_saves_per_min': round(len(results.get('kampdata_save', [])) / elapsed * 60, 1) if elapsed else None,
+        'latency': {name: percentiles(timings) for name, timings in sorted(results.items())},
+        'db_connections': sampler.summary(),
+        'errors': errors,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
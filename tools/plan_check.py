@@ -0,0 +1,220 @@
+"""Check the query plans of the production queries against a seeded database.
+
+Each check calls a real PostgresDataManager or AuthDB method, captures the
+statements it runs and EXPLAINs them (FORMAT JSON). Player and date-range
+reads must not sequentially scan matches, and no statement may be estimated
+above its cost ceiling. Exits non-zero on any violation.
+
+    python -m tools.plan_check --dsn postgresql://.../stt_plans [--output plans.json] [--verbose]
+
+The database behind --dsn is reset and its admin account rewritten: never
+point it at production data.
+"""
+import argparse
+import json
+import os
+import sys
+from contextlib import redirect_stdout
+from datetime import date, time
+
+import psycopg2
+
+# Seeded dataset: about 100,000 rating rows over five seasons
+DATASET = {'players': 200, 'seasons': 5, 'matches_per_season': 1250, 'squad_size': 16, 'seed': 47}
+USERS = 500
+
+# Planner cost units at the seeded size; a sequential scan of matches costs about 2,500
+SMALL = 100
+MEDIUM = 1_000
+FULL_SCAN = 20_000
+
+
+def _checks(db, auth, dataset):
+    """(name, call, forbid seq scan on matches, cost ceiling) for every production query shape"""
+    import pandas as pd
+    from player_purge import PlayerPurgeWorker
+    from rating_frames import RATING_CATEGORIES
+
+    player = str(dataset['names'][len(dataset['names']) // 2])
+    squad = [str(name) for name in dataset['names'][:16]]
+    first_year = int(str(dataset['ratings']['date'][0])[:4])
+    season_start, season_end = date(first_year + 2, 1, 1), date(first_year + 2, 12, 31)
+    fixture = db.list_matches(limit=1)[0]
+    deleted = str(dataset['names'][-1])
+    purge_worker = PlayerPurgeWorker(db.conn_string)
+
+    def correct_ratings():
+        ratings = db.get_match_ratings(fixture['date'], fixture['time'], fixture['opponent'])
+        for category in RATING_CATEGORIES:
+            ratings[category] = ratings[category].map(lambda rating: 'B' if rating == 'A' else 'A')
+        db.update_match_ratings(ratings.reset_index(drop=True))
+
+    def save_match():
+        db.add_match_record(
+            date(first_year, 6, 1), time(12, 0), "Plantjek",
+            pd.DataFrame({'Name': squad}),
+            {category: {name: 'B' for name in squad} for category in RATING_CATEGORIES},
+            idempotency_key="plan-check"
+        )
+
+    return [
+        ('get_players', db.get_players, False, MEDIUM),
+        ('get_players_page', lambda: db.get_players_page(search="Plan"), False, MEDIUM),
+        ('search_players', lambda: db.search_players("Plan01"), False, MEDIUM),
+        ('get_player_performance', lambda: db.get_player_performance(player), True, MEDIUM),
+        ('get_player_performance_season',
+         lambda: db.get_player_performance(player, season_start, season_end), True, MEDIUM),
+        ('get_team_performance', db.get_team_performance, False, FULL_SCAN),
+        ('get_team_performance_season',
+         lambda: db.get_team_performance(season_start, season_end), True, FULL_SCAN),
+        ('get_match_ratings',
+         lambda: db.get_match_ratings(fixture['date'], fixture['time'], fixture['opponent']), True, SMALL),
+        ('list_matches', db.list_matches, False, FULL_SCAN),
+        ('get_available_seasons', db.get_available_seasons, False, FULL_SCAN),
+        ('get_rating_columns_incremental',
+         lambda: db.get_rating_columns(after_id=(db.get_max_match_id() or 0) - 100), True, MEDIUM),
+        ('get_max_match_id', db.get_max_match_id, True, SMALL),
+        ('get_pending_deletions', db.get_pending_deletions, True, MEDIUM),
+        ('add_match_record', save_match, True, MEDIUM),
+        ('update_match_ratings', correct_ratings, True, MEDIUM),
+        ('add_player', lambda: db.add_player("Plan Ny", "Forsvar"), False, SMALL),
+        ('add_players', lambda: db.add_players([("Plan Ny 1", "Midtbane"), ("Plan Ny 2", "Angreb")]), False, SMALL),
+        ('delete_player', lambda: db.delete_player(deleted), False, SMALL),
+        # Runs after delete_player, so one player's match rows are purged
+        ('purge_batch', purge_worker.purge_batch, True, MEDIUM),
+        ('verify_user', lambda: auth.verify_user("plan_user_250", "wrong password"), False, SMALL),
+        ('get_user_role', lambda: auth.get_user_role("plan_user_250"), False, SMALL),
+        ('get_pending_users', auth.get_pending_users, False, MEDIUM),
+        ('approve_user', lambda: auth.approve_user("plan_user_251"), False, SMALL),
+        ('reject_user', lambda: auth.reject_user("plan_user_261"), False, SMALL),
+        ('get_active_users', auth.get_active_users, False, MEDIUM),
+        ('create_user',
+         lambda: auth.create_user("plan_user_created", "plan check", "created@example.com", "coach"), False, SMALL),
+        ('register_user',
+         lambda: auth.register_user("plan_user_registered", "plan check", "registered@example.com", "coach"),
+         False, SMALL),
+        ('update_user',
+         lambda: auth.update_user("plan_user_252", "updated@example.com", "plan check", "coach"), False, SMALL),
+        ('delete_user', lambda: auth.delete_user("plan_user_253"), False, SMALL),
+        ('sync_admin', lambda: auth.sync_admin("admin", "plan check", "admin@example.com"), False, SMALL),
+    ]
+
+
+def plan_nodes(plan):
+    """Every node of a JSON plan tree, depth first"""
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def explain(conn, query, vars):
+    """Estimated JSON plan of one statement; None for statements that cannot be explained"""
+    sql = query.decode('utf-8') if isinstance(query, bytes) else query
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')):
+        return None
+    with conn.cursor() as cur:
+        cur.execute("EXPLAIN (FORMAT JSON) " + sql, vars)
+        return cur.fetchone()[0][0]['Plan']
+
+
+def check(conn, name, call, forbid_seq_scan, max_cost):
+    """Run one production call and check the plans of its statements"""
+    import query_log
+
+    with query_log.capture() as statements:
+        call()
+    results, violations = [], []
+    for caller, query, vars in statements:
+        plan = explain(conn, query, vars)
+        if plan is None:
+            continue
+        nodes = list(plan_nodes(plan))
+        seq_scans = sorted({node['Relation Name'] for node in nodes if node['Node Type'] == 'Seq Scan'})
+        result = {
+            'sql': query_log.normalize_sql(query),
+            'caller': caller,
+            'total_cost': plan['Total Cost'],
+            'seq_scans': seq_scans,
+            'plan': plan,
+        }
+        results.append(result)
+        if forbid_seq_scan and 'matches' in seq_scans:
+            violations.append(f"{name}: sequential scan on matches in {result['sql'][:80]}")
+        if plan['Total Cost'] > max_cost:
+            violations.append(f"{name}: estimated cost {plan['Total Cost']:.0f} over {max_cost} "
+                              f"in {result['sql'][:80]}")
+    if not results:
+        violations.append(f"{name}: no statements captured")
+    return results, violations
+
+
+def seed(db):
+    """Reset the database and load the players, ratings and users the checks run against"""
+    from auth.database import pwd_context
+    from synthetic_data import generate_dataset, load_dataset
+
+    db.reset_data()
+    dataset = generate_dataset(name_prefix="Plan", **DATASET)
+    with db._connect() as conn:
+        load_dataset(conn, dataset)
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM users WHERE username LIKE 'plan\\_user\\_%%'")
+            cur.execute("""
+                INSERT INTO users (username, password_hash, email, role_id, status)
+                SELECT 'plan_user_' || i, %s, 'plan_user_' || i || '@example.com',
+                       (SELECT id FROM roles WHERE name = 'coach'),
+                       CASE WHEN i %% 10 = 1 THEN 'pending' ELSE 'active' END
+                FROM generate_series(1, %s) AS i
+            """, (pwd_context.hash("plan check"), USERS))
+            cur.execute("ANALYZE users")
+        conn.commit()
+    return dataset
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dsn', required=True, help='database to seed and check (it is reset)')
+    parser.add_argument('--output', help='write every statement with its plan as JSON here')
+    parser.add_argument('--verbose', action='store_true', help='print the estimated cost of every statement')
+    args = parser.parse_args()
+
+    # The data layer reads its database from the environment
+    os.environ['DATABASE_URL'] = args.dsn
+    os.environ.pop('DATABASE_READ_URL', None)
+
+    report, violations = {}, []
+    # The data layer prints its errors; keep stdout for the verdict
+    with redirect_stdout(sys.stderr):
+        from auth.database import AuthDB
+        from postgres_data_manager import PostgresDataManager
+
+        db = PostgresDataManager()
+        auth = AuthDB()
+        dataset = seed(db)
+        conn = psycopg2.connect(args.dsn)
+        conn.autocommit = True
+        try:
+            for name, call, forbid_seq_scan, max_cost in _checks(db, auth, dataset):
+                report[name], found = check(conn, name, call, forbid_seq_scan, max_cost)
+                violations.extend(found)
+        finally:
+            conn.close()
+
+    if args.verbose:
+        for name, results in report.items():
+            for result in results:
+                scans = f" (seq scan: {', '.join(result['seq_scans'])})" if result['seq_scans'] else ""
+                print(f"{name:32} {result['total_cost']:>10.1f}{scans}  {result['sql'][:70]}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, default=str)
+            f.write("\n")
+
+    for violation in violations:
+        print(violation, file=sys.stderr)
+    print(f"{len(report)} query shapes checked, {len(violations)} violations")
+    sys.exit(1 if violations else 0)
+
+
+if __name__ == '__main__':
+    main()
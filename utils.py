@@ -7,3 +7,36 @@ def initialize_session_state():
     
     if 'matches' not in st.session_state:
         st.session_state.matches = []
+
+def parse_roster_text(text):
+    """Parse a pasted or uploaded roster into (name, position) rows.
+
+    One player per line as "Navn" or "Navn, Position" (comma, semicolon or
+    tab separated). A header line, blank lines and repeated names are skipped.
+    Returns the rows and the lines that could not be used.
+    """
+    rows = []
+    invalid = []
+    seen = set()
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        for separator in ('\t', ';', ','):
+            if separator in line:
+                name, _, position = line.partition(separator)
+                break
+        else:
+            name, position = line, ''
+        name = name.strip().strip('"')
+        position = position.strip().strip('"') or "Not specified"
+
+        if name.lower() in ('navn', 'name', 'spiller', 'spiller navn'):
+            continue
+        if len(name) > 100 or len(position) > 50:
+            invalid.append(line)
+            continue
+        if name and name not in seen:
+            seen.add(name)
+            rows.append((name, position))
+    return rows, invalid
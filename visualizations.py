@@ -1,7 +1,9 @@
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import pandas as pd
+from instrumentation import instrument_class
 
+@instrument_class
 class Visualizer:
     def __init__(self):
         self.colors = {
@@ -18,6 +20,15 @@ class Visualizer:
         ]
         self.rating_order = ['D', 'C', 'B', 'A']
 
+    def _x_labels(self, dates, times):
+        """Format datetime64 dates and timedelta64 times as 'date\\ntime' axis labels"""
+        date_labels = pd.DatetimeIndex(dates).strftime('%Y-%m-%d')
+        time_labels = (pd.Timestamp(0) + pd.TimedeltaIndex(times)).strftime('%H:%M:%S')
+        return [
+            f"{date}\n{time}" if pd.notna(time) else date
+            for date, time in zip(date_labels, time_labels)
+        ]
+
     def plot_player_single_category(self, data, player_name, category):
         """Plot single category performance over time for a player"""
         if data.empty:
@@ -26,12 +37,7 @@ class Visualizer:
         fig = go.Figure()
 
         # Format x-axis labels
-        x_labels = []
-        for _, row in data.iterrows():
-            if pd.notna(row['Time']):
-                x_labels.append(f"{row['Date']}\n{row['Time']}")
-            else:
-                x_labels.append(str(row['Date']))
+        x_labels = self._x_labels(data['Date'], data['Time'])
 
         # Add letter grade regions
         regions = [
@@ -114,12 +120,7 @@ class Visualizer:
         fig = go.Figure()
 
         # Format x-axis labels
-        x_labels = []
-        for _, row in data.iterrows():
-            if pd.notna(row['Time']):
-                x_labels.append(f"{row['Date']}\n{row['Time']}")
-            else:
-                x_labels.append(str(row['Date']))
+        x_labels = self._x_labels(data['Date'], data['Time'])
 
         # Add letter grade regions
         regions = [
@@ -203,12 +204,7 @@ class Visualizer:
         fig = go.Figure()
 
         # Format x-axis labels
-        x_labels = []
-        for date, time in data.index:
-            if pd.notna(time):
-                x_labels.append(f"{date}\n{time}")
-            else:
-                x_labels.append(str(date))
+        x_labels = self._x_labels(data.index.get_level_values(0), data.index.get_level_values(1))
 
         # Add letter grade regions
         regions = [
@@ -291,12 +287,7 @@ class Visualizer:
         fig = go.Figure()
 
         # Format x-axis labels
-        x_labels = []
-        for date, time in data.index:
-            if pd.notna(time):
-                x_labels.append(f"{date}\n{time}")
-            else:
-                x_labels.append(str(date))
+        x_labels = self._x_labels(data.index.get_level_values(0), data.index.get_level_values(1))
 
         # Add letter grade regions
         regions = [
@@ -401,7 +392,7 @@ class Visualizer:
         # Track all x values to update region boundaries
         all_dates = set()
         for data in player_data_dict.values():
-            all_dates.update([str(date) for date in data['Date']])
+            all_dates.update(pd.DatetimeIndex(data['Date']).strftime('%Y-%m-%d'))
         all_dates = sorted(all_dates)
 
         if not all_dates:
@@ -429,12 +420,7 @@ class Visualizer:
             player_color = self.player_colors[i % len(self.player_colors)]
 
             for idx, category in enumerate(categories, 1):
-                x_labels = []
-                for _, row in data.iterrows():
-                    if pd.notna(row['Time']):
-                        x_labels.append(f"{row['Date']}\n{row['Time']}")
-                    else:
-                        x_labels.append(str(row['Date']))
+                x_labels = self._x_labels(data['Date'], data['Time'])
 
                 fig.add_trace(
                     go.Scatter(